@@ -0,0 +1,661 @@
+#!/usr/bin/env python3
+"""
+Reader of ANTAB files (the amplitude calibration files from the Field System, *.antabfs, and
+the combined {exp}.antab built with cat *.antabfs), shared by the ANTAB tools.
+
+The file is read as a whole: only the few lines that are not Tsys values (keywords, comments,
+'/') are located one by one, with a regular expression over the full text. All the numbers of
+the Tsys lines of each TSYS block (times included) are then converted at once and stored in a
+numpy structured array. A full session with many stations loads in a few milliseconds per
+station, instead of parsing every line and time (strptime) in Python.
+
+Every TSYS and GAIN block of the file is kept, in order, together with all the other lines
+(comments, blank lines, other keywords), so the file can be written back. The comments within the
+Tsys values are kept at their position (before a given row of the data).
+
+The Tsys lines are also written in bulk (write_tsys(), used by the ANTAB tools that generate
+them): the times and values of many rows are formatted at once as arrays of characters, and
+written in large blocks.
+
+Typical use:
+
+    antab_file = antab.read_antab('n17c3.antab')
+    for a_station in antab_file.stations.values():
+        print(a_station.name, a_station.gain, [len(b) for b in a_station.tsys])
+        times, tsys = a_station.tsys[0].times, a_station.tsys[0].values
+
+Version: 1.2
+Date: Oct 2026
+
+version 1.2 changes
+- Sessions crossing New Year: with the start of the observation (read_antab(..., start=...)), the
+  days of the year far before (after) the one of the start are read in the next (previous) year.
+
+version 1.1 changes
+- Bulk writer of Tsys lines (format_tsys(), write_tsys()): the values are formatted as arrays of
+  characters, and the files are written in blocks. TsysBlock/AntabFile.write() use it.
+"""
+
+import re
+import sys
+import time
+import warnings
+import argparse
+import numpy as np
+from numpy.lib import recfunctions
+import timeconv
+
+
+usage = "%(prog)s [-h] [--year YEAR] <antab file> [<antab file> ...]"
+description = """Reads ANTAB files and prints a summary of their stations and TSYS blocks.
+"""
+help_antabfiles = 'ANTAB files to read.'
+help_year = 'Year of the observation (the ANTAB times only have the day of the year).'
+
+# Days from the start of the observation beyond which a day of the year is taken in the next (or
+# previous) year, see wrap_year_times()
+YEAR_WRAP_DAYS = 180
+# Lines that are not Tsys values: anything not starting with a digit (the day of the year)
+_NONDATA_LINE = re.compile(r'^(?![ \t]*[0-9]).*$', re.M)
+# Entries of the INDEX keyword: 'R1|L1','R2|L2', ...
+_INDEX = re.compile(r"INDEX\s*=\s*(.*)", re.I | re.S)
+_INDEX_ENTRY = re.compile(r"'([^']*)'")
+# Bytes written at a time by write_tsys()
+WRITE_BUFFER = 16*1024*1024
+
+
+def _code(line):
+    """The line without comment and surrounding blanks."""
+    return line.split('!', 1)[0].strip()
+
+
+class GainBlock(object):
+    """A GAIN block of an ANTAB file.
+
+    Attributes
+    ----------
+      station : str
+            Name of the station.
+      lines : list of str
+            Lines of the block, as in the file (from the GAIN keyword to the closing '/').
+    """
+    def __init__(self, station, lines):
+        self.station = station
+        self.lines = lines
+
+    def write(self, antabfile):
+        """Writes the lines of the block to an (opened, binary) file."""
+        antabfile.write(''.join([a_line + '\n' for a_line in self.lines]).encode())
+
+
+class TsysBlock(object):
+    """A TSYS block of an ANTAB file.
+
+    Attributes
+    ----------
+      station : str
+            Name of the station.
+      header : list of str
+            Lines from the TSYS keyword to the '/' closing the header (with the INDEX keyword).
+      index : list of str
+            Entries of INDEX: the name of each Tsys column.
+      data : numpy structured array
+            One element per row, with the field 'time' (MJD in seconds, see timeconv.py) and
+            one float field per INDEX entry.
+      comments : list of (int, str)
+            Comment (or blank) lines within the data, with the row they precede (len(data) if
+            they are after the last row).
+      inline_comments : dict
+            Comments at the end of the data lines ('! ...'), by row.
+      footer : str or None
+            The line closing the data ('/'), or None if the block was not closed.
+      time_format : str
+            Format of the times in the file ('antab' for DOY hh:mm.mm, or 'antab_seconds').
+    """
+    def __init__(self, station, header, index, data, comments=None, inline_comments=None, footer='/',
+                 time_format='antab'):
+        self.station = station
+        self.header = header
+        self.index = index
+        self.data = data
+        self.comments = comments if comments is not None else []
+        self.inline_comments = inline_comments if inline_comments is not None else {}
+        self.footer = footer
+        self.time_format = time_format
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def times(self):
+        """Times of the rows (MJD in seconds)."""
+        return self.data['time']
+
+    @property
+    def values(self):
+        """(nrow, ncolumns) float array with the Tsys values (a view of data if possible)."""
+        return recfunctions.structured_to_unstructured(self.data[self.index])
+
+    def replace_data(self, times, values):
+        """Returns a new block with the same header and the given rows (e.g. resampled Tsys).
+        The comments within the data are placed before the first new row that is not earlier
+        than the row they preceded. The comments at the end of the data lines are not kept.
+
+        Inputs
+        ------
+          times : 1-D float array
+                Times of the new rows (MJD in seconds), sorted.
+          values : 2-D float array
+                (nrow, ncolumns) Tsys values, with one column per INDEX entry.
+        """
+        old_times = np.append(self.times, np.inf)
+        rows = np.searchsorted(times, old_times[[row for row, line in self.comments]])
+        comments = [(int(row), line) for row, (old_row, line) in zip(rows, self.comments)]
+        return TsysBlock(self.station, self.header, self.index, tsys_array(times, values, self.index),
+                         comments, None, self.footer, self.time_format)
+
+    def write(self, antabfile, decimals=1, width=0):
+        """Writes the block to an (opened, binary) file: header, Tsys values (with the times as in
+        time_format, and the values with the given decimals and minimum width, see write_tsys())
+        with the comments at their rows, and footer.
+        """
+        antabfile.write(''.join([a_line + '\n' for a_line in self.header]).encode())
+        times, values = self.times, self.values
+        # The rows are written in bulk between the comments
+        breaks = set([row for row, a_comment in self.comments] + list(self.inline_comments.keys()))
+        comments = {}
+        for row, a_comment in self.comments:
+            comments.setdefault(row, []).append(a_comment)
+        start = 0
+        for row in sorted(breaks | {len(self)}):
+            if row > start:
+                write_tsys(antabfile, times[start:row], values[start:row], self.time_format, decimals, width)
+            for a_comment in comments.get(row, []):
+                antabfile.write((a_comment + '\n').encode())
+            start = row
+            if row in self.inline_comments:
+                line = format_tsys(times[row:row+1], values[row:row+1], self.time_format, decimals, width)
+                antabfile.write(line[:-1] + (' ' + self.inline_comments[row] + '\n').encode())
+                start = row + 1
+        if self.footer is not None:
+            antabfile.write((self.footer + '\n').encode())
+
+
+class Station(object):
+    """GAIN and TSYS blocks of a station in an ANTAB file.
+
+    Attributes
+    ----------
+      name : str
+      gain : GainBlock or None
+            The last GAIN block of the station.
+      tsys : list of TsysBlock
+            Usually one, but a station can have several TSYS blocks.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.gain = None
+        self.tsys = []
+
+
+class AntabFile(object):
+    """Contents of an ANTAB file (see read_antab()).
+
+    Attributes
+    ----------
+      items : list
+            All the contents of the file, in order: GainBlock and TsysBlock objects, and str for
+            any other line (comments, blank lines, other keywords).
+      stations : dict
+            Station objects by name, in the order of the file.
+    """
+    def __init__(self):
+        self.items = []
+        self.stations = {}
+
+    def station(self, name):
+        """The Station object with that name (created if it is not there yet)."""
+        if name not in self.stations:
+            self.stations[name] = Station(name)
+        return self.stations[name]
+
+    def tsys_blocks(self):
+        """All the TSYS blocks, in the order of the file."""
+        return [an_item for an_item in self.items if isinstance(an_item, TsysBlock)]
+
+    def replace(self, block, new_block):
+        """Replaces a block by another one (e.g. with resampled data), in the items and in its station."""
+        self.items[self.items.index(block)] = new_block
+        a_station = self.stations[block.station]
+        if isinstance(block, TsysBlock):
+            a_station.tsys[a_station.tsys.index(block)] = new_block
+        else:
+            a_station.gain = new_block
+
+    def write(self, filename, decimals=1, width=0):
+        """Writes the ANTAB file. The Tsys values are written with the given decimals and minimum
+        width (see write_tsys())."""
+        with open(filename, 'wb') as antabfile:
+            lines = []
+            for an_item in self.items:
+                if isinstance(an_item, str):
+                    lines.append(an_item + '\n')
+                    continue
+                antabfile.write(''.join(lines).encode())
+                lines = []
+                if isinstance(an_item, TsysBlock):
+                    an_item.write(antabfile, decimals, width)
+                else:
+                    an_item.write(antabfile)
+            antabfile.write(''.join(lines).encode())
+
+
+def tsys_array(times, values, index):
+    """Structured array with the field 'time' (from times) and one field per INDEX entry (the
+    columns of the 2-D array values)."""
+    dtype = np.dtype([('time', np.float64)] + [(name, np.float64) for name in index])
+    data = np.empty(len(times), dtype=dtype)
+    data['time'] = times
+    for i, name in enumerate(index):
+        data[name] = values[:, i]
+    return data
+
+
+def _value_chars(values, decimals, width):
+    """Formats the values as ' {:W.Df}' (W = width, D = decimals).
+    Returns a (nrow, ncolumns*(F+1)) uint8 array with the characters, where all the values are
+    right-aligned to F, the largest of width and the length of the longest value, and a boolean
+    array of the same shape with the characters to keep (None if all of them), without the
+    padding that the values shorter than F do not have in ' {:W.Df}'.
+    The digits are computed with integer arithmetic for all values at once. The few values that
+    are too large or exactly halfway between two roundings (where Python rounds the binary value)
+    are formatted by Python, so the result is always the same as with str.format().
+    """
+    nrow, ncolumns = values.shape
+    scaled = np.abs(values)*10**decimals
+    finite = np.isfinite(scaled)
+    with np.errstate(invalid='ignore'):
+        special = finite & ((scaled >= 2**53) | (np.abs(scaled % 1 - 0.5) < 1e-6))
+    # Written as 'nan', 'inf' and '-inf'
+    not_finite = {'nan': np.isnan(values), 'inf': np.isposinf(values), '-inf': np.isneginf(values)}
+    special |= ~finite
+    units = np.round(np.where(special, 0, scaled)).astype(np.int64)
+    # The integer divisions are much faster in 32 bits (the usual Tsys values)
+    if (units.size == 0) or (units.max() < 2**31):
+        units = units.astype(np.int32)
+    negative = np.signbit(values) & ~special
+    integers = units // 10**decimals
+    ndigits = 1 + np.searchsorted(10**np.arange(1, 19, dtype=np.int64), integers, side='right')
+    lengths = negative + ndigits + (decimals + 1 if decimals > 0 else 0)
+    special &= finite
+    special_rows, special_columns = np.nonzero(special)
+    special_strings = ['{:.{}f}'.format(v, decimals) for v in values[special]]
+    lengths[special_rows, special_columns] = [len(a_str) for a_str in special_strings]
+    for a_str, mask in not_finite.items():
+        lengths[mask] = len(a_str)
+    field = max(width, int(lengths.max()) if lengths.size > 0 else 0)
+
+    # (nrow, ncolumns, field+1) characters: a space and the value right-aligned in the field
+    chars = np.full((nrow, ncolumns, field+1), ord(' '), dtype=np.uint8)
+    end = field + 1
+    if decimals > 0:
+        powers = 10**np.arange(decimals-1, -1, -1, dtype=units.dtype)
+        chars[:, :, end-decimals:] = (units[:, :, np.newaxis] // powers) % 10 + ord('0')
+        end -= decimals + 1
+        chars[:, :, end] = ord('.')
+    maxdigits = int(ndigits.max()) if ndigits.size > 0 else 1
+    powers = 10**np.arange(maxdigits-1, -1, -1, dtype=units.dtype)
+    digits = ((integers[:, :, np.newaxis] // powers) % 10 + ord('0')).astype(np.uint8)
+    # No leading zeros
+    digits[np.arange(maxdigits) < (maxdigits - ndigits)[:, :, np.newaxis]] = ord(' ')
+    chars[:, :, end-maxdigits:end] = digits
+    rows, columns = np.nonzero(negative)
+    chars[rows, columns, end - ndigits[rows, columns] - 1] = ord('-')
+    for a_str, mask in not_finite.items():
+        if mask.any():
+            chars[mask, 1:] = np.frombuffer(a_str.rjust(field).encode(), dtype=np.uint8)
+    for row, column, a_str in zip(special_rows, special_columns, special_strings):
+        chars[row, column, 1:] = np.frombuffer(a_str.rjust(field).encode(), dtype=np.uint8)
+    keep = None
+    if field > width:
+        padding = field - np.maximum(lengths, width)
+        keep = np.arange(field+1) > padding[:, :, np.newaxis]
+        keep[:, :, 0] = True
+        keep = keep.reshape(nrow, ncolumns*(field+1))
+    return chars.reshape(nrow, ncolumns*(field+1)), keep
+
+
+def format_tsys(times, values, time_format='antab', decimals=1, width=0):
+    """Returns the Tsys lines (as bytes, with the line ends) for the times and values, all
+    formatted at once. See write_tsys().
+    """
+    values = np.asarray(values, dtype=np.float64)
+    times = np.asarray(times)
+    if len(times) == 0:
+        return b''
+    if times.dtype.kind != 'M':
+        times = timeconv.mjds2datetime64(times)
+    time_chars = timeconv.format_time_chars(times, time_format)
+    value_chars, keep = _value_chars(values, decimals, width)
+    lines = np.hstack((time_chars, value_chars, np.full((len(times), 1), ord('\n'), dtype=np.uint8)))
+    if keep is not None:
+        # Lines of different lengths: the extra padding is removed
+        keep = np.hstack((np.ones(time_chars.shape, dtype=bool), keep, np.ones((len(times), 1), dtype=bool)))
+        return lines[keep].tobytes()
+    return np.ascontiguousarray(lines).tobytes()
+
+
+def write_tsys(antabfile, times, values, time_format='antab', decimals=1, width=0,
+               buffer_size=WRITE_BUFFER):
+    """Writes Tsys lines ('DOY hh:mm.mm value value ...') to an (opened, binary) file.
+    The lines are formatted in bulk (see _value_chars() and timeconv.format_time_chars()) and written
+    in blocks of about buffer_size bytes, so the memory used does not depend on the number of rows.
+
+    Inputs
+    ------
+      antabfile : file
+            File opened in binary mode.
+      times : 1-D array
+            Times of the rows, as MJD seconds or datetime64.
+      values : 2-D float array
+            (nrow, ncolumns) Tsys values (one column per INDEX entry).
+      time_format : str
+            'antab' (DOY hh:mm.mm) or 'antab_seconds' (DOY hh:mm:ss).
+      decimals, width : int
+            The values are written as ' {:width.decimalsf}'.format(value) (width is a minimum).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    line_size = 13 + values.shape[1]*(max(width, 6)+1)
+    step = max(1, buffer_size//line_size)
+    for start in range(0, len(times), step):
+        antabfile.write(format_tsys(times[start:start+step], values[start:start+step], time_format,
+                                    decimals, width))
+
+
+def _segments(text):
+    """Splits the text in runs of consecutive Tsys lines and single lines of any other kind.
+    Yields ('data', text of the lines, first line number) or ('line', line, line number).
+    """
+    pos, lineno = 0, 1
+    for match in _NONDATA_LINE.finditer(text):
+        if match.start() > pos:
+            # The lines between the previous non-data line and this one
+            data = text[pos:match.start()-1]
+            yield 'data', data, lineno
+            lineno += data.count('\n') + 1
+        yield 'line', match.group(), lineno
+        pos, lineno = match.end() + 1, lineno + 1
+    if pos < len(text):
+        yield 'data', text[pos:], lineno
+
+
+def _index_entries(header, lineno):
+    match = _INDEX.search(' '.join([_code(a_line) for a_line in header]))
+    if match is None:
+        raise ValueError('line {}: TSYS block without INDEX.'.format(lineno))
+    return [an_entry.strip() for an_entry in _INDEX_ENTRY.findall(match.group(1))]
+
+
+def _numeric_fields(text, nrow, ncolumns):
+    """All the numbers in the Tsys lines, as a (nrow, nfields) array: day of the year, hours,
+    minutes (and seconds) of the time, and the Tsys values. They are all converted at once (the
+    colons of the times are read as separators). None if the lines are not all in the same format.
+    """
+    ncolons = text.count(':')
+    if ncolons not in (nrow, 2*nrow):
+        return None
+    nfields = 2 + ncolons//nrow + ncolumns
+    with warnings.catch_warnings():
+        # Older numpy versions only warn if there are non-numeric values
+        warnings.simplefilter('error', DeprecationWarning)
+        try:
+            numbers = np.fromstring(text.replace(':', ' '), sep=' ')
+        except (ValueError, DeprecationWarning):
+            return None
+    if numbers.size != nrow*nfields:
+        return None
+    return numbers.reshape(nrow, nfields)
+
+
+def _year_days(year):
+    """Number of days of the year."""
+    return int((np.datetime64('{:04d}-01-01'.format(year+1), 'D') -
+                np.datetime64('{:04d}-01-01'.format(year), 'D')).astype(np.int64))
+
+
+def wrap_year_times(times, year, start):
+    """Times (MJD in seconds) read in the given year, moved to the year closest to start (the
+    start of the observation, MJD in seconds, in the same year). For the sessions crossing New
+    Year: the days of the year more than YEAR_WRAP_DAYS before the day of start are moved to the
+    next year (DOY 001 after DOY 365), and the ones more than YEAR_WRAP_DAYS after it to the
+    previous year (preob Tsys on DOY 365 for a session starting on January 1). The days close to
+    start (e.g. the evening before a session starting after midnight) are kept.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    year_start = np.datetime64('{:04d}-01-01'.format(year), 'D')
+    days = (timeconv.mjds2datetime64(times).astype('M8[D]') - year_start).astype(np.int64)
+    start_day = int((timeconv.mjds2datetime64(start).astype('M8[D]') - year_start).astype(np.int64))
+    in_year = (days >= 0) & (days < _year_days(year))
+    shifts = np.where(in_year & (days < start_day - YEAR_WRAP_DAYS), _year_days(year), 0) - \
+             np.where(in_year & (days > start_day + YEAR_WRAP_DAYS), _year_days(year - 1), 0)
+    if not np.any(shifts):
+        return times
+    return times + 86400.0*shifts
+
+
+def _doy_times(fields, year):
+    """Times (MJD in seconds) from the (nrow, 3 or 4) array of day of the year, hours and minutes
+    (decimal) or minutes and seconds. The same as timeconv.parse_times(), but from the numbers.
+    None if any of them is out of range.
+    """
+    days, hours, minutes = fields[:, 0], fields[:, 1], fields[:, 2]
+    seconds = fields[:, 3] if fields.shape[1] == 4 else np.zeros(len(fields))
+    year_start = np.datetime64('{:04d}-01-01'.format(year), 'us')
+    if not np.all((days == np.round(days)) & (days >= 1) & (days <= _year_days(year)) & (hours >= 0) & (hours < 24) &
+                  (minutes >= 0) & (minutes < 60) & (seconds >= 0) & (seconds < 61)):
+        return None
+    microseconds = np.round((3600.0*hours + 60.0*minutes + seconds)*1e6).astype(np.int64) + \
+                   (days.astype(np.int64) - 1)*86400000000 + \
+                   (year_start - timeconv.MJD_ORIGIN).astype(np.int64)
+    return microseconds/1e6
+
+
+def _parse_tsys(chunks, ncolumns, year):
+    """Parses the Tsys lines of a block (list of (text, first line number)) at once.
+    Returns the times (MJD in seconds), the (nrow, ncolumns) values, the comments at the end of
+    the lines (by row) and the format of the times.
+    """
+    text = '\n'.join([a_chunk for a_chunk, lineno in chunks])
+    inline_comments = {}
+    if '!' in text:
+        lines = text.split('\n')
+        for row, a_line in enumerate(lines):
+            if '!' in a_line:
+                lines[row], comment = a_line.split('!', 1)
+                inline_comments[row] = '!' + comment
+        text = '\n'.join(lines)
+
+    nrow = text.count('\n') + 1
+    fields = _numeric_fields(text, nrow, ncolumns)
+    if fields is not None:
+        ntime = fields.shape[1] - ncolumns
+        times = _doy_times(fields[:, :ntime], year)
+        if times is not None:
+            return times, fields[:, ntime:], inline_comments, 'antab' if ntime == 3 else 'antab_seconds'
+
+    # Slower path (times as strings), which also reports the wrong lines
+    tokens = text.split()
+    if len(tokens) != nrow*(ncolumns+2):
+        # Find the first wrong line to report it
+        for a_chunk, lineno in chunks:
+            for i, a_line in enumerate(a_chunk.split('\n')):
+                if len(_code(a_line).split()) != ncolumns+2:
+                    raise ValueError('line {}: expected the time and {} Tsys values (one per INDEX entry), '
+                                     'found: {}'.format(lineno+i, ncolumns, a_line.strip()))
+    tokens = np.array(tokens).reshape(nrow, ncolumns+2)
+    try:
+        times = timeconv.datetime642mjds(timeconv.parse_times(np.char.add(np.char.add(tokens[:, 0], ' '),
+                                                                          tokens[:, 1]), year))
+        values = tokens[:, 2:].astype(np.float64)
+    except ValueError as error:
+        raise ValueError('TSYS block starting at line {}: {}'.format(chunks[0][1], error))
+
+    time_format = 'antab' if tokens[0, 1].count(':') == 1 else 'antab_seconds'
+    return times, values, inline_comments, time_format
+
+
+def parse_antab(text, year=timeconv.DEFAULT_YEAR, start=None):
+    """Parses the contents of an ANTAB file. Returns an AntabFile.
+
+    Inputs
+    ------
+      text : str
+            Contents of the ANTAB file.
+      year : int
+            Year of the observation (the times of the ANTAB file only have the day of the year).
+      start : float, optional
+            Start of the observation (MJD in seconds, in the given year). If given, the times on
+            days far from the one of start are read in the next or previous year (see wrap_year_times()).
+
+    Example (run with python -m doctest antab.py): a GAIN block with the POLY continued on a line
+    starting with a digit, which is still closed by its '/'.
+
+    >>> antab_file = parse_antab('\\n'.join(["GAIN EF ELEV DPFU=1.0,1.0 POLY=0.98,6.3E-04,", " 7.4E-06 /",
+    ...                                      "TSYS EF FT=1.0 TIMEOFF=0", "INDEX= 'R1|L1'", "/",
+    ...                                      "117 09:00.88 51.6", "117 09:01.80 47.4", "/"]), 2017)
+    >>> antab_file.stations['EF'].gain.lines
+    ['GAIN EF ELEV DPFU=1.0,1.0 POLY=0.98,6.3E-04,', ' 7.4E-06 /']
+    >>> [len(a_block) for a_block in antab_file.stations['EF'].tsys]
+    [2]
+    """
+    antab_file = AntabFile()
+    text = text.replace('\r\n', '\n')
+    if text.endswith('\n'):
+        text = text[:-1]
+
+    # state: None (between blocks), 'gain', 'other' (any other keyword), 'header' (of a TSYS
+    # block) or 'tsys' (Tsys values)
+    state, lines, station, block = None, [], None, None
+    chunks, comments, nrow = [], [], 0
+
+    def close_tsys(footer):
+        times, values = np.zeros(0), np.zeros((0, len(block.index)))
+        inline_comments, time_format = {}, 'antab'
+        if len(chunks) > 0:
+            times, values, inline_comments, time_format = _parse_tsys(chunks, len(block.index), year)
+            if start is not None:
+                times = wrap_year_times(times, year, start)
+        block.data = tsys_array(times, values, block.index)
+        block.comments, block.inline_comments = list(comments), inline_comments
+        block.footer, block.time_format = footer, time_format
+
+    segments, pending = _segments(text), None
+    while True:
+        if pending is not None:
+            (kind, segment, lineno), pending = pending, None
+        else:
+            kind, segment, lineno = next(segments, (None, None, None))
+            if kind is None:
+                break
+        if (kind == 'data') and (state in ('gain', 'other', 'header')):
+            # Outside the TSYS data, the lines starting with a digit (e.g. the continuation of a
+            # POLY) are handled one by one as any other line, so a '/' still closes the block
+            segment, rest = (segment.split('\n', 1) + [None])[:2]
+            if rest is not None:
+                pending = ('data', rest, lineno + 1)
+            kind = 'line'
+        if kind == 'data':
+            if state == 'tsys':
+                if '/' in segment:
+                    raise ValueError('line {}: the TSYS data must be closed by a line with only '
+                                     '"/".'.format(lineno + segment[:segment.index('/')].count('\n')))
+                chunks.append((segment, lineno))
+                nrow += segment.count('\n') + 1
+            else:
+                antab_file.items += segment.split('\n')
+            continue
+
+        code = _code(segment)
+        keyword = code.split()[0].upper() if code != '' else ''
+        if (state == 'tsys') and (keyword in ('GAIN', 'TSYS')):
+            # Block not closed by '/'
+            close_tsys(None)
+            state = None
+
+        if state == 'tsys':
+            if code.startswith('/'):
+                close_tsys(segment)
+                state = None
+            elif code == '':
+                comments.append((nrow, segment))
+            else:
+                raise ValueError('line {}: unexpected line within the TSYS data: {}'.format(lineno, segment))
+        elif state in ('gain', 'other', 'header'):
+            lines.append(segment)
+            if '/' in code:
+                state = 'tsys' if state == 'header' else None
+        elif keyword in ('GAIN', 'TSYS'):
+            if len(code.split()) < 2:
+                raise ValueError('line {}: {} without station.'.format(lineno, keyword))
+            station = code.split()[1].upper()
+            lines = [segment]
+            if keyword == 'GAIN':
+                block = GainBlock(station, lines)
+                antab_file.station(station).gain = block
+                state = None if '/' in code else 'gain'
+            else:
+                block = TsysBlock(station, lines, None, None)
+                antab_file.station(station).tsys.append(block)
+                chunks, comments, nrow = [], [], 0
+                state = 'tsys' if '/' in code else 'header'
+            antab_file.items.append(block)
+        else:
+            antab_file.items.append(segment)
+            if (code != '') and ('/' not in code):
+                # A keyword that is not used here: kept as it is until its closing '/'
+                lines = antab_file.items
+                state = 'other'
+
+        if (state == 'tsys') and (block.index is None):
+            block.index = _index_entries(block.header, lineno)
+
+    if state == 'tsys':
+        close_tsys(None)
+    elif state in ('gain', 'header'):
+        raise ValueError('{} block of {} not closed by "/".'.format('GAIN' if state == 'gain' else 'TSYS',
+                         station))
+    return antab_file
+
+
+def read_antab(filename, year=timeconv.DEFAULT_YEAR, start=None):
+    """Reads an ANTAB file (with any number of stations and blocks). Returns an AntabFile.
+    year is the year of the observation (the times of the ANTAB file only have the day of the year),
+    and start its start time, for the sessions crossing New Year (see parse_antab()).
+    """
+    with open(filename, 'r') as antabfile:
+        return parse_antab(antabfile.read(), year, start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=description, prog='antab.py', usage=usage)
+    parser.add_argument('antabfiles', type=str, nargs='+', help=help_antabfiles)
+    parser.add_argument('--year', type=int, default=timeconv.DEFAULT_YEAR, help=help_year)
+    arguments = parser.parse_args()
+
+    for an_antabfile in arguments.antabfiles:
+        t0 = time.perf_counter()
+        try:
+            antab_file = read_antab(an_antabfile, arguments.year)
+        except ValueError as error:
+            sys.exit('{}: {}'.format(an_antabfile, error))
+        print('{} ({:.1f} ms):'.format(an_antabfile, (time.perf_counter()-t0)*1e3))
+        for a_station in antab_file.stations.values():
+            print('  {}: {}'.format(a_station.name, 'GAIN' if a_station.gain is not None else 'no GAIN'))
+            for a_block in a_station.tsys:
+                if len(a_block) == 0:
+                    print('      TSYS: {} columns, no data'.format(len(a_block.index)))
+                    continue
+                first, last = timeconv.format_times(timeconv.mjds2datetime64(a_block.times[[0, -1]]),
+                                                    'antab_seconds')
+                print('      TSYS: {} columns, {} rows from {} to {}'.format(len(a_block.index), len(a_block),
+                                                                          first, last))
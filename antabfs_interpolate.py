@@ -6,14 +6,56 @@ given ones. This will fill gaps when the time separation between Tsys measuremen
 
 IMPORTANT CONSIDERATIONS:
 Note that it interpolates data with a smooth function, avoiding outliers or zero values.
-However, it does not consider scan boundaries, so if Tsys are recorded in different sources
-it can introduce biases. Therefore, it assumes that the Tsys should not change quickly
-(e.g. no change of sources).
-
-Version: 2.0
-Date: Aug 2018
+However, by default it does not consider scan boundaries, so if Tsys are recorded in different
+sources it can introduce biases. Therefore, it assumes that the Tsys should not change quickly
+(e.g. no change of sources). With --schedule (the vex file of the experiment, optionally with
+its .lis file) the Tsys are fitted piecewise per scan (or per source, --piecewise source) and
+only written every int seconds within the scans of each station, not during slews and gaps.
+
+Several files (e.g. all the *.antabfs of a session) can be given at once: all their TSYS blocks
+are interpolated in parallel and the files are only written once all of them are done.
+
+By default each Tsys column is fitted with a smoothed linear spline. With --fit smooth, all the
+columns of a block are fitted at once (robust penalized least squares, with the variations
+shorter than --period seconds smoothed out), which is much faster for wideband setups with many
+Tsys columns.
+
+Version: 2.6
+Date: Oct 2026
 Written by Benito Marcote (marcote@jive.eu)
 
+version 2.6 changes
+- Schedule-aware resampling (--schedule, --lis, --piecewise): the scans of each station are read
+  from the vex file (schedule.py), the Tsys are fitted independently within each scan or source
+  and evaluated only within the scans. Much smaller files, and no smearing across source changes.
+  The sessions crossing New Year are supported with the schedule (the ANTAB days of the year far
+  from the one of the first scan are in the next or previous year). Tsys times that are not
+  sorted are reported as an error.
+
+version 2.5 changes
+- New fit (--fit smooth, --period): all the columns of a TSYS block are smoothed at once on their
+  shared time axis, with robust weights from the median/MAD of the residuals of each column and a
+  single banded solve. The linear spline per column (--fit spline) is still the default.
+
+version 2.4 changes
+- The output files are written with the bulk writer of antab.py: all the Tsys lines of a block
+  are formatted at once as arrays of characters (1-s resampling of long sessions).
+
+version 2.3 changes
+- Batch mode: any number of ANTAB files can be given. All the TSYS blocks (of all files) are
+  fitted and resampled by a pool of processes (--workers), and all the output files are written
+  only when every block is done (temporary files renamed at the end, so none is left half done).
+- A summary per station is printed: gaps in the original Tsys that have been filled and outliers
+  suppressed by the fit.
+
+version 2.2 changes
+- The ANTAB file is read with antab.py: all the TSYS blocks are interpolated, so it also works
+  with a combined antab file with many stations (cat *.antabfs). The GAIN blocks, the comments
+  (also the ones within the data, placed at the same time) and any other lines are kept.
+
+version 2.1 changes
+- All times are parsed and written at once with the shared time conversions from timeconv.py
+  (no strptime/strftime per line). Decimal minutes and seconds are no longer rounded when read.
 
 version 2.0 changes
 - (MAJOR) Now it does an actual interpolation of the data (linear spline with smoothing).
@@ -26,137 +68,467 @@ version 2.0 changes
 import sys
 import os
 import argparse
-import datetime as dt
+import warnings
+import multiprocessing
 import numpy as np
 from scipy import interpolate
-
-
-
-usage = "%(prog)s [-h] [-v] [-p] [-o OUTPUTFILE] [-tini STARTIME] [-tend ENDTIME] antabfile int"
-help_tini = 'Starttime of the Tsys measurements. In case you want to modify it from the original file. It will extrapolate the earliest Tsys original values. The format must be as DOY/HH:MM:SS.'
-help_tend = 'Ending time of the Tsys measurements. In case you want to modify it from the original file. It will extrapolate the latest Tsys original values. The format must be as DOY/HH:MM:SS.'
-help_plot = 'Produce plots (per column) with the original values and the interpolation.'
-
-parser = argparse.ArgumentParser(description=description, prog='antabfs_interpolate.py', usage=usage,
-                                formatter_class=argparse.RawTextHelpFormatter)
-parser.add_argument('antabfile', type=str, help='The antabfs file to be read.')
-parser.add_argument('int', type=float, help='The interval (in seconds) between the final Tsys measurements')
-parser.add_argument('-v', '--version', action='version', version='%(prog)s 2.0')
-parser.add_argument('-o', '--output', type=str, default=None, help='Output filename. By default same as antabfile.')
-parser.add_argument('-p', '--plot', default=False, action='store_true', help=help_plot)
-parser.add_argument('-tini', type=str, default=None, help=help_tini)
-parser.add_argument('-tend', type=str, default=None, help=help_tend)
-
-args = parser.parse_args()
-
-
-
-
-antab = open(args.antabfile, 'r+').readlines()
-
-# Reads the current antab file and loads the Tsys values and all the data
-antab_times = []
-antab_data = []
-indexes = []
-for aline in antab:
-    if aline[0].lstrip().isdigit():
-        # Then this line is a Tsys input
-        temp = aline.split()
-        # First column is DOY, second one is HH:MM.MM or HH:MM:SS
-        if temp[1].count(':') == 1:
-            temp2 = temp[1].split('.')
-            temp2[1] = '{:02.0f}'.format(60*float('0.'+temp2[1]))
-            temp[1] = ':'.join(temp2)
-        elif temp[1].count(':') == 2:
-            # Nothing to do
-            if temp[1].count('.') != 0:
-                temp[1] = temp[1].split('.')[0]
-            pass
-        else:
-            raise ValueError('Time format not supported: {}'.format(temp[1]))
-
-        antab_times.append(dt.datetime.strptime(' '.join(temp[0:2]), '%j %H:%M:%S').timestamp())
-        antab_data.append([float(i) for i in temp[2:]])
-    else:
-        if 'INDEX' in aline:
-            indexes = [i.replace("'", '').strip() for i in aline.split('=')[1].replace('/', '').replace('\n', '').split(',')]
-
-
-antab_data = np.array(antab_data)
-
-n_columns = antab_data.shape[1]
-
-assert n_columns == len(indexes)
-
-# For each column, do a spline fit, with the data weighted proportionally to the square of
-# their deviation from the median value.
-
-fits = [None]*n_columns
-for i in np.arange(n_columns):
-    weights = np.abs((antab_data[:,i] - np.median(antab_data[:,i]))/np.median(antab_data[:,i]))
+from scipy import linalg
+import timeconv
+import antab
+import schedule
+
+
+# Gaps: separations between Tsys measurements longer than this factor times the median one
+GAP_FACTOR = 2.0
+# Outliers: values further from the fit than these robust standard deviations (from the MAD of
+# the residuals of the column), and than this fraction of the median Tsys of the column
+OUTLIER_SIGMAS = 5.0
+OUTLIER_MIN_FRACTION = 0.01
+# Smoothing fit (--fit smooth): variations with periods shorter than this (seconds) are smoothed
+# out (half power), outliers are downweighted in ROBUST_ITERATIONS refits (Cauchy weights with
+# ROBUST_SIGMAS robust standard deviations of the residuals of each column)
+SMOOTH_PERIOD = 120.0
+ROBUST_SIGMAS = 2.385
+ROBUST_ITERATIONS = 3
+FITS = ('spline', 'smooth')
+
+
+def fit_column(times, values):
+    """Linear spline fit to the Tsys values of a column (see splrep), with the data weighted
+    proportionally to the square of their deviation from the median value.
+    """
+    weights = np.abs((values - np.median(values))/np.median(values))
     # For zero values, consider a value of 1e-3, which would imply an uncertainty in the weight of 0.1%
     # This is done to avoid division by zero in the interpolation
     weights[np.where(weights == 0.0)] = 1e-3
     # s = 1e4 looks optimal to remove large outliers in the ANTAB information
     # to be less drastic, you could use 1e3.
     # Lower values will produce peaks to outliers
-    fits[i] = interpolate.splrep(antab_times, antab_data[:,i], w=1/weights**2, k=1, s=1e4)
-
-
-
-
-tsys_timestamps = None
-tsys = None
-
-with open(args.antabfile+'.tmp', 'wt') as newfile:
-    # Write all the header
-    for aline in antab:
-        if not aline[0].isdigit():
-            newfile.write(aline)
+    with warnings.catch_warnings():
+        # With a few values (e.g. the ones of a scan, see interpolate_scans()) s cannot be reached and
+        # scipy warns on every fit. The fit of the last iteration is used anyway.
+        warnings.filterwarnings('ignore', message='The maximal number of iterations', category=RuntimeWarning)
+        return interpolate.splrep(times, values, w=1/weights**2, k=1, s=1e4)
+
+
+def fit_spline(times, values):
+    """Fits each column of the (nrow, ncolumns) Tsys values separately (see fit_column()).
+    Returns a function that evaluates all the fits at the given times (2-D array).
+    """
+    fits = [fit_column(times, values[:,i]) for i in range(values.shape[1])]
+
+    def evaluate(new_times):
+        if len(new_times) == 0:
+            return np.empty((0, len(fits)))
+        return np.column_stack([interpolate.splev(new_times, a_fit, der=0) for a_fit in fits])
+    return evaluate
+
+
+def _smoothing_band(steps, lam):
+    """Upper band (main diagonal, first and second superdiagonals) of the roughness penalty
+    lam*D'QD, where D are the second divided differences of the values at points separated by
+    steps and Q the length of each interval (the discrete integral of the second derivative).
+    """
+    h0, h1 = steps[:-1], steps[1:]
+    a, b, c = 2/(h0*(h0 + h1)), -2/(h0*h1), 2/(h1*(h0 + h1))
+    q = lam*(h0 + h1)/2
+    main = np.zeros(len(steps) + 1)
+    main[:-2] += q*a*a
+    main[1:-1] += q*b*b
+    main[2:] += q*c*c
+    first = np.zeros(len(steps))
+    first[:-1] += q*a*b
+    first[1:] += q*b*c
+    return main, first, q*a*c
+
+
+def _smooth(times, values, weights, lam):
+    """Penalized least squares smoothing of all the columns at once: minimizes, for each column,
+    sum(w*(y - f)**2) + roughness(f) (see _smoothing_band()). The systems of all columns share the
+    penalty and are stacked in a single banded (pentadiagonal) system, solved in one call.
+    """
+    n, ncolumns = values.shape
+    main, first, second = _smoothing_band(np.diff(times), lam)
+    band = np.zeros((3, n*ncolumns))
+    band[2] = (main + weights.T).ravel()
+    # No coupling between the last values of a column and the first ones of the next
+    band[1, 1:] = np.hstack((np.tile(first, (ncolumns, 1)), np.zeros((ncolumns, 1)))).ravel()[:-1]
+    band[0, 2:] = np.hstack((np.tile(second, (ncolumns, 1)), np.zeros((ncolumns, 2)))).ravel()[:-2]
+    smoothed = linalg.solveh_banded(band, (weights*values).T.ravel(), check_finite=False)
+    return smoothed.reshape(ncolumns, n).T
+
+
+def fit_smooth(times, values, period=SMOOTH_PERIOD):
+    """Robust smoothing fit of all the (nrow, ncolumns) Tsys values at once, on their shared
+    time axis. The values are fitted with a penalized least squares (a smoothing spline with
+    variations shorter than period seconds suppressed, see _smooth()), iteratively reweighted
+    with the median/MAD of the residuals of each column, so outliers barely contribute. Non
+    finite values (and columns with less than two) are ignored.
+    Returns a function that evaluates the fits at the given times (2-D array, linear between the
+    original times and extrapolated linearly, as the linear spline).
+    """
+    # Times in units of the usual separation, for a well conditioned system
+    step = max(np.median(np.diff(times)), 1e-3) if len(times) > 1 else 1.0
+    x = (times - times[0])/step
+    x[1:] = x[0] + np.cumsum(np.maximum(np.diff(x), 1e-3))
+    lam = (period/(2*np.pi*step))**4
+    finite = np.isfinite(values)
+    y = np.where(finite, values, 0.0)
+    # The columns without data are fitted as zeros (NaN would spread through the stacked system)
+    empty = finite.sum(axis=0) < 2
+    finite[:, empty] = True
+    weights = finite.astype(float)
+    median = np.median if finite.all() else np.nanmedian
+    scale = np.maximum(median(np.where(finite, np.abs(y), np.nan), axis=0), 1.0)
+    fitted = _smooth(x, y, weights, lam)
+    for i in range(ROBUST_ITERATIONS):
+        residuals = np.where(finite, y - fitted, np.nan)
+        scatter = 1.4826*median(np.abs(residuals - median(residuals, axis=0)), axis=0)
+        weights = 1/(1 + (residuals/(ROBUST_SIGMAS*np.maximum(scatter, 1e-6*scale)))**2)
+        weights[~finite] = 0.0
+        fitted = _smooth(x, y, weights, lam)
+    fitted[:, empty] = np.nan
+    slopes = np.diff(fitted, axis=0)/np.diff(x)[:, np.newaxis]
+
+    def evaluate(new_times):
+        new_x = np.interp(new_times, times, x)
+        # Outside the original times: linear extrapolation of the first/last two values
+        new_x = np.where(new_times < times[0], (new_times - times[0])/step, new_x)
+        new_x = np.where(new_times > times[-1], x[-1] + (new_times - times[-1])/step, new_x)
+        i = np.clip(np.searchsorted(x, new_x, side='right'), 1, len(x) - 1) - 1
+        tsys = slopes[i]
+        tsys *= (new_x - x[i])[:, np.newaxis]
+        tsys += fitted[i]
+        return tsys
+    return evaluate
+
+
+def block_summary(block, fitted, new_times):
+    """Gaps filled and outliers suppressed when interpolating a TSYS block.
+
+    Inputs
+    ------
+      block : antab.TsysBlock
+            The original block.
+      fitted : 2-D float array
+            Values of the fits at the times of the block.
+      new_times : 1-D float array
+            Times of the interpolated Tsys (MJD seconds).
+
+    Outputs
+    -------
+      summary : dict
+            rows (original rows), new_rows, gaps (number of gaps, see GAP_FACTOR), filled (new rows
+            within the gaps), values (original values) and outliers (original values that deviate
+            from the fit, see OUTLIER_SIGMAS).
+    """
+    times, values = block.times, block.values
+    steps = np.diff(times)
+    in_gap = steps > GAP_FACTOR*np.median(steps)
+    filled = np.searchsorted(new_times, times[1:][in_gap]) - \
+             np.searchsorted(new_times, times[:-1][in_gap], side='right')
+    residuals = values - fitted
+    scatter = 1.4826*np.median(np.abs(residuals - np.median(residuals, axis=0)), axis=0)
+    threshold = np.maximum(OUTLIER_SIGMAS*scatter, OUTLIER_MIN_FRACTION*np.abs(np.median(values, axis=0)))
+    return {'rows': len(times), 'new_rows': len(new_times), 'gaps': int(np.count_nonzero(in_gap)),
+            'filled': int(filled.sum()), 'values': values.size,
+            'outliers': int(np.count_nonzero(np.abs(residuals) > threshold))}
+
+
+def fit_values(times, values, fit='spline', period=SMOOTH_PERIOD):
+    """Fits the (nrow, ncolumns) Tsys values with fit_spline() or fit_smooth() (fit = 'spline' or
+    'smooth'). Returns the function that evaluates the fit."""
+    return fit_spline(times, values) if fit == 'spline' else fit_smooth(times, values, period)
+
+
+def scan_times(starts, ends, interval, tini=None, tend=None):
+    """Times every interval seconds within each scan (from its start to its end, both included if
+    possible), and optionally within tini-tend (MJD seconds).
+    Returns the times (MJD seconds) and the number of the scan of each one.
+    """
+    counts = np.floor((ends - starts)/interval).astype(int) + 1
+    scan = np.repeat(np.arange(len(starts)), counts)
+    steps = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    times = starts[scan] + steps*interval
+    selected = np.ones(len(times), dtype=bool)
+    if tini is not None:
+        selected &= times >= tini
+    if tend is not None:
+        selected &= times <= tend
+    return times[selected], scan[selected]
+
+
+def scan_segments(sources, piecewise='scan'):
+    """Segment (fitted independently) of each scan: every scan ('scan'), or each run of
+    consecutive scans on the same source ('source')."""
+    if piecewise == 'scan':
+        return np.arange(len(sources))
+    return np.cumsum(np.concatenate(([False], sources[1:] != sources[:-1])))
+
+
+def interpolate_scans(block, interval, scans, piecewise='scan', tini=None, tend=None, fit='spline',
+                      period=SMOOTH_PERIOD):
+    """Fits the Tsys values of a TSYS block piecewise, per scan or per source (see scan_segments()),
+    and evaluates the fits every interval seconds only within the scans.
+    The Tsys measured between two scans (e.g. before a scan starts) belong to the next one. Each
+    segment is fitted with its Tsys values only, and the fit is kept constant outside them. The
+    segments without any Tsys value take the fit of the whole block.
+    Only the scans from the one of the first Tsys value to the one of the last are considered,
+    unless tini/tend are given.
+
+    Inputs
+    ------
+      scans : tuple
+            (starts, ends, sources) of the scans of the station (see schedule.station_scans()).
+
+    Outputs
+    -------
+      tsys_timestamps : 1-D float array
+            Times of the new Tsys values (MJD seconds).
+      tsys : 2-D float array
+            New Tsys values.
+      fitted : 2-D float array
+            Values of the fits at the times of the block.
+    """
+    times, values = block.times, block.values
+    starts, ends, sources = scans
+    first, last = np.minimum(np.searchsorted(ends, times[[0, -1]]), len(ends) - 1)
+    in_block = slice(first if tini is None else 0, last + 1 if tend is None else len(ends))
+    starts, ends, sources = starts[in_block], ends[in_block], sources[in_block]
+    tsys_timestamps, scan = scan_times(starts, ends, interval, tini, tend)
+    segment = scan_segments(sources, piecewise)
+    nsegments = segment[-1] + 1
+    segment_ends = np.maximum.reduceat(ends, np.flatnonzero(np.diff(segment, prepend=-1)))
+    rows = np.searchsorted(np.minimum(np.searchsorted(segment_ends, times), nsegments - 1),
+                           np.arange(nsegments + 1))
+    new_rows = np.searchsorted(segment[scan], np.arange(nsegments + 1))
+
+    tsys = np.empty((len(tsys_timestamps), values.shape[1]))
+    fitted = np.empty(values.shape)
+    block_fit = None
+    for i in range(nsegments):
+        in_segment, new_in_segment = slice(rows[i], rows[i+1]), slice(new_rows[i], new_rows[i+1])
+        if rows[i+1] - rows[i] == 0:
+            if block_fit is None:
+                block_fit = fit_values(times, values, fit, period)
+            tsys[new_in_segment] = block_fit(tsys_timestamps[new_in_segment])
+        elif rows[i+1] - rows[i] == 1:
+            tsys[new_in_segment] = values[in_segment]
+            fitted[in_segment] = values[in_segment]
         else:
-            break
-
-    if args.tini is None:
-        tsys_times_ini = dt.datetime.fromtimestamp(antab_times[0])
+            evaluate = fit_values(times[in_segment], values[in_segment], fit, period)
+            tsys[new_in_segment] = evaluate(np.clip(tsys_timestamps[new_in_segment], times[rows[i]],
+                                                    times[rows[i+1]-1]))
+            fitted[in_segment] = evaluate(times[in_segment])
+    return tsys_timestamps, tsys, fitted
+
+
+def interpolate_block(block, interval, tini=None, tend=None, fit='spline', period=SMOOTH_PERIOD, scans=None,
+                      piecewise='scan'):
+    """Fits the Tsys values of each column of a TSYS block (antab.TsysBlock) and evaluates the fit
+    every interval seconds from tini to tend (MJD seconds; by default the first and last times of
+    the block). fit is 'spline' (each column separately, see fit_spline()) or 'smooth' (all the
+    columns at once, see fit_smooth(), with the given period).
+    If the scans of the station are given, the fit is done piecewise and only evaluated within
+    the scans (see interpolate_scans()).
+    Returns the new TsysBlock and its summary (see block_summary()).
+    """
+    times, values = block.times, block.values
+    unsorted = np.flatnonzero(np.diff(times) < 0)
+    if len(unsorted) > 0:
+        raise ValueError('The Tsys times of {} are not sorted (row {} of its TSYS block is earlier than the '
+                         'previous one). If the session crosses New Year, give its schedule (--schedule).'.format(
+                         block.station, unsorted[0] + 2))
+    if scans is not None:
+        tsys_timestamps, tsys, fitted = interpolate_scans(block, interval, scans, piecewise, tini, tend, fit,
+                                                          period)
     else:
-        tsys_times_ini = dt.datetime.strptime(args.tini, '%j/%H:%M:%S')
-
-    if args.tend is None:
-        tsys_times_end = dt.datetime.fromtimestamp(antab_times[-1])
+        evaluate = fit_values(times, values, fit, period)
+        tsys_times_ini = timeconv.mjds2datetime64(times[0] if tini is None else tini)
+        tsys_times_end = timeconv.mjds2datetime64(times[-1] if tend is None else tend)
+        tsys_times = np.arange(tsys_times_ini, tsys_times_end, timeconv.timedelta64(interval))
+        tsys_timestamps = timeconv.datetime642mjds(tsys_times)
+        tsys = evaluate(tsys_timestamps)
+        fitted = evaluate(times)
+
+    new_block = block.replace_data(tsys_timestamps, tsys)
+    new_block.time_format = 'antab_seconds'
+    return new_block, block_summary(block, fitted, tsys_timestamps)
+
+
+def _interpolate_task(task):
+    """Pool task: (file number, block number, block, interval, options of interpolate_block())."""
+    nfile, nblock, block, interval, options = task
+    return (nfile, nblock) + interpolate_block(block, interval, **options)
+
+
+def interpolate_files(antabfiles, outputs, interval, tini=None, tend=None, workers=1, fit='spline',
+                      period=SMOOTH_PERIOD, scans=None, piecewise='scan', year=timeconv.DEFAULT_YEAR, start=None):
+    """Interpolates all the TSYS blocks of the ANTAB files, with a pool of workers processes, and
+    the given fit (see interpolate_block()). If the scans of the schedule are given (list of
+    schedule.Scan), the Tsys values are fitted piecewise and only written within the scans of
+    each station, and the ANTAB files are read for the given year and start (of the schedule, see
+    antab.read_antab()).
+    The output files are only written when all the blocks have been interpolated: each one is
+    first written to a temporary file, and they are all renamed at the end.
+    Returns a list of (original block, new block, summary) for all the interpolated blocks.
+    """
+    antab_files = []
+    for an_antabfile in antabfiles:
+        try:
+            antab_files.append(antab.read_antab(an_antabfile, year, start))
+        except ValueError as error:
+            raise ValueError('{}: {}'.format(an_antabfile, error))
+    tasks = []
+    for nfile, antab_file in enumerate(antab_files):
+        for nblock, a_block in enumerate(antab_file.tsys_blocks()):
+            if len(a_block) < 2:
+                print('The TSYS block of {} in {} has less than two Tsys values. It is kept as it is.'.format(
+                      a_block.station, antabfiles[nfile]))
+                continue
+            options = {'tini': tini, 'tend': tend, 'fit': fit, 'period': period}
+            if scans is not None:
+                options['scans'] = schedule.station_scans(scans, a_block.station)
+                options['piecewise'] = piecewise
+                if len(options['scans'][0]) == 0:
+                    print('{} has no scans in the schedule. Its TSYS block in {} is kept as it is.'.format(
+                          a_block.station, antabfiles[nfile]))
+                    continue
+            tasks.append((nfile, nblock, a_block, interval, options))
+
+    if (workers > 1) and (len(tasks) > 1):
+        # The largest blocks first, so the slowest one does not start at the end
+        tasks.sort(key=lambda a_task: -a_task[2].values.size)
+        with multiprocessing.Pool(min(workers, len(tasks))) as pool:
+            results = pool.map(_interpolate_task, tasks, chunksize=1)
     else:
-        tsys_times_end = dt.datetime.strptime(args.tend, '%j/%H:%M:%S')
-
-    tsys_times = np.arange(tsys_times_ini, tsys_times_end, dt.timedelta(seconds=args.int))
-    tsys_timestamps = np.array([i.tolist().timestamp() for i in tsys_times])
-    plot_times = tsys_timestamps
-    tsys = np.empty((len(tsys_times), n_columns))
-    for acol in range(n_columns):
-        tsys[:,acol] = interpolate.splev(tsys_timestamps, fits[acol], der=0)
-
-    for a_time,a_entry in zip(tsys_timestamps, tsys):
-        temp = ['{:6.1f}'.format(i) for i in a_entry]
-        newfile.write('{} {}\n'.format(dt.datetime.fromtimestamp(a_time).strftime('%j %H:%M:%S'), ' '.join(temp)))
-
-    newfile.write('/\n')
-
-
-if args.output is None:
-    os.rename(args.antabfile+'.tmp', args.antabfile)
-    print('The antab file {} has been updated.'.format(args.antabfile))
-else:
-    os.rename(args.antabfile+'.tmp', args.output)
-    print('The antab file {} has been created.'.format(args.output))
-
-
-# Testing purposes: plot the original data and the final one
-if args.plot:
-    import matplotlib.pyplot as plt
-    for i in range(n_columns):
-        plt.figure()
-        plt.plot(antab_times, antab_data[:,i], 'oC0')
-        plt.plot(tsys_timestamps, tsys[:,i], '-C1')
-        plt.xlabel(r'Timestamp')
-        plt.ylabel(r'Tsys')
-        plt.title('Column: {}'.format(indexes[i]))
-
-    plt.show()
+        results = [_interpolate_task(a_task) for a_task in tasks]
+
+    interpolated = []
+    for nfile, nblock, new_block, summary in sorted(results, key=lambda a_result: a_result[:2]):
+        a_block = antab_files[nfile].tsys_blocks()[nblock]
+        antab_files[nfile].replace(a_block, new_block)
+        interpolated.append((a_block, new_block, summary))
+
+    # All files are written, and then renamed
+    try:
+        for antab_file, an_output in zip(antab_files, outputs):
+            antab_file.write(an_output+'.tmp', decimals=1, width=6)
+        for an_output in outputs:
+            os.replace(an_output+'.tmp', an_output)
+    finally:
+        for an_output in outputs:
+            if os.path.isfile(an_output+'.tmp'):
+                os.remove(an_output+'.tmp')
+
+    return interpolated
+
+
+def print_summary(interpolated):
+    """Prints the summary (see block_summary()) per station."""
+    stations = {}
+    for a_block, new_block, summary in interpolated:
+        if a_block.station not in stations:
+            stations[a_block.station] = dict.fromkeys(summary, 0)
+        for key in summary:
+            stations[a_block.station][key] += summary[key]
+
+    print('\nStation   Tsys rows  New rows   Gaps (new rows)   Outliers suppressed')
+    for a_station, summary in stations.items():
+        print('{:8}  {:9d}  {:8d}  {:5d} ({:7d})  {:8d} ({:.2f}%)'.format(a_station, summary['rows'],
+              summary['new_rows'], summary['gaps'], summary['filled'], summary['outliers'],
+              100.0*summary['outliers']/max(1, summary['values'])))
+    print('')
+
+
+usage = "%(prog)s [-h] [-v] [-p] [-o OUTPUTFILE] [-tini STARTIME] [-tend ENDTIME] [--workers N] [--fit {spline,smooth}] [--period PERIOD] [--schedule VEXFILE [--lis LISFILE] [--piecewise {scan,source}]] antabfile [antabfile ...] int"
+help_tini = 'Starttime of the Tsys measurements. In case you want to modify it from the original file. It will extrapolate the earliest Tsys original values. The format must be as DOY/HH:MM:SS.'
+help_tend = 'Ending time of the Tsys measurements. In case you want to modify it from the original file. It will extrapolate the latest Tsys original values. The format must be as DOY/HH:MM:SS.'
+help_plot = 'Produce plots (per column) with the original values and the interpolation.'
+help_workers = 'Number of processes interpolating the TSYS blocks (default: number of CPUs).'
+help_fit = 'Fit of the Tsys values: a linear spline per column (spline, default) or a robust ' \
+           'smoothing of all the columns at once (smooth, faster with many columns).'
+help_schedule = 'Vex file of the experiment: the Tsys are fitted piecewise and only written within the ' \
+                'scans of each station (every int seconds).'
+help_lis = 'With --schedule, only the scans in this .lis file (lines starting with +) are considered.'
+help_piecewise = 'With --schedule, the Tsys are fitted independently for each scan (default) or for ' \
+                 'each run of consecutive scans on the same source.'
+help_period = 'With --fit smooth, variations of the Tsys shorter than this period (in seconds) are ' \
+              'smoothed out (default: {} s).'.format(SMOOTH_PERIOD)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=description, prog='antabfs_interpolate.py', usage=usage,
+                                    formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('antabfiles', type=str, nargs='+', metavar='antabfile',
+                        help='The antabfs file(s) to be read (e.g. all the files of a session).')
+    parser.add_argument('int', type=float, help='The interval (in seconds) between the final Tsys measurements '
+                                                '(within the scans with --schedule)')
+    parser.add_argument('-v', '--version', action='version', version='%(prog)s 2.6')
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help='Output filename (only with one antabfile). By default same as antabfile.')
+    parser.add_argument('-p', '--plot', default=False, action='store_true', help=help_plot)
+    parser.add_argument('-tini', type=str, default=None, help=help_tini)
+    parser.add_argument('-tend', type=str, default=None, help=help_tend)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help=help_workers)
+    parser.add_argument('--fit', type=str, default='spline', choices=FITS, help=help_fit)
+    parser.add_argument('--period', type=float, default=SMOOTH_PERIOD, help=help_period)
+    parser.add_argument('--schedule', type=str, default=None, metavar='VEXFILE', help=help_schedule)
+    parser.add_argument('--lis', type=str, default=None, metavar='LISFILE', help=help_lis)
+    parser.add_argument('--piecewise', type=str, default='scan', choices=('scan', 'source'), help=help_piecewise)
+
+    args = parser.parse_args()
+
+    if (args.output is not None) and (len(args.antabfiles) > 1):
+        parser.error('-o/--output can only be used with one antabfile')
+    if args.period <= 0.0:
+        parser.error('--period must be positive')
+    if args.int <= 0.0:
+        parser.error('The interval must be positive')
+    if (args.lis is not None) and (args.schedule is None):
+        parser.error('--lis can only be used with --schedule')
+
+    scans, year, start = None, timeconv.DEFAULT_YEAR, None
+    if args.schedule is not None:
+        try:
+            scans = schedule.read_vex(args.schedule, args.lis)
+        except (ValueError, IndexError, OSError) as error:
+            sys.exit('{}: {}\nNo antab file has been modified.'.format(args.schedule, error))
+        if len(scans) == 0:
+            sys.exit('{} has no scans.\nNo antab file has been modified.'.format(args.schedule))
+        year, start = schedule.schedule_year(scans), scans[0].start
+
+    outputs = args.antabfiles if args.output is None else [args.output]
+    tini = timeconv.datetime642mjds(timeconv.parse_times(args.tini, year)) if args.tini is not None else None
+    tend = timeconv.datetime642mjds(timeconv.parse_times(args.tend, year)) if args.tend is not None else None
+    if start is not None:
+        tini = float(antab.wrap_year_times(tini, year, start)) if tini is not None else None
+        tend = float(antab.wrap_year_times(tend, year, start)) if tend is not None else None
+
+    try:
+        interpolated = interpolate_files(args.antabfiles, outputs, args.int, tini, tend, max(1, args.workers),
+                                         args.fit, args.period, scans, args.piecewise, year, start)
+    except ValueError as error:
+        sys.exit('{}\nNo antab file has been modified.'.format(error))
+    print_summary(interpolated)
+
+    for an_antabfile, an_output in zip(args.antabfiles, outputs):
+        if an_output == an_antabfile:
+            print('The antab file {} has been updated.'.format(an_output))
+        else:
+            print('The antab file {} has been created.'.format(an_output))
+
+
+    # Testing purposes: plot the original data and the final one
+    if args.plot:
+        import matplotlib.pyplot as plt
+        for a_block, new_block, summary in interpolated:
+            for i in range(len(a_block.index)):
+                plt.figure()
+                plt.plot(a_block.times, a_block.values[:,i], 'oC0')
+                plt.plot(new_block.times, new_block.values[:,i], '-C1')
+                plt.xlabel(r'Time (MJD seconds)')
+                plt.ylabel(r'Tsys')
+                plt.title('{} column: {}'.format(a_block.station, a_block.index[i]))
+
+        plt.show()
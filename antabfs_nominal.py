@@ -5,10 +5,15 @@ It takes the nominal SEFD values from the sefd_values.txt table and generates an
 these values. Gains will be set to 1/SEFD, and all Tsys to 1.0.
 Note that it will overwrite any existing ANTAB file in the current path.
  
-Version: 4.3
-Date: Sep 2018
+Version: 4.5
+Date: Oct 2026
 Author: Benito Marcote (marcote@jive.eu) & Jay Blanchard (blanchard@jive.eu)
 
+version 4.5 changes
+- The Tsys lines are written in bulk with antab.write_tsys() (long sessions with short intervals).
+version 4.4 changes
+- All the Tsys times are computed and formatted at once with the shared time conversions from
+  timeconv.py. The start time can also contain seconds (HH:MM:SS).
 version 4.3 changes
 - Fixed issue when giving SEFD, not ignores that antenna may not be in status table
 version 4.2 changes
@@ -27,12 +32,13 @@ version 2.0 changes
 import os
 import sys
 import argparse
-import datetime as dt
-from math import floor
+import numpy as np
 from collections import defaultdict
+import timeconv
+import antab
 
 
-__version__ = 4.2
+__version__ = 4.5
 help_str = """Writes a nominal SEFD ANTAB file. Gain will be set to 1/SEFD, and all Tsys to 1.0.
 It will overwrite any previous antab file in the current path.
 antabfs_nominal.py uses the SEFD information from sefd_values.txt to compute the nominal values.
@@ -42,7 +48,7 @@ Creates (or overwrites) a file called <experiment><antenna>.antabfs, where <expe
 parser = argparse.ArgumentParser(description=help_str, prog='antabfs_nominal.py')
 parser.add_argument('antenna', type=str, default=None, help='Antenna name (two-letters syntax, except for Jb1 Jb2 Ro7 Ro3)')
 parser.add_argument('experiment', type=str, default=None, help='Experiment name')
-parser.add_argument('start', type=str, default=None, help='Start time (DOY/HH:MM, YYYY/DOY/HH:MM or YYYY/MM/DD/HH:MM)')
+parser.add_argument('start', type=str, default=None, help='Start time (DOY/HH:MM, YYYY/DOY/HH:MM or YYYY/MM/DD/HH:MM, minutes can have decimals)')
 parser.add_argument('-v', '--version', action='version', version='%(prog)s {}'.format(__version__))
 parser.add_argument('-b', '--band', type=str, default=None, help='Observed band (in cm). REQUIRED unless SEFD provided')
 parser.add_argument('-d', '--duration', type=float, default=24, help='Duration of the experiment (in hours). Default: 24 h')
@@ -53,8 +59,6 @@ parser.add_argument('-sb', '--subbands', type=int, default=8, help='Number of su
 
 args = parser.parse_args()
 
-i_already_warn_about_seconds = False
-
 
 def read_sefd_table(tablename=os.path.dirname(__file__)+'/sefd_values.txt'):
     sefd_table = open(tablename, 'r')
@@ -117,51 +121,21 @@ INDEX = {indexes}
                        version=__version__, freqrange=','.join([str(i) for i in freqrange]))
 
 
-def hm2hhmmss(hhmm):
-    """Takes a time in str format HH:MM.MM and returns int(hh), int(mm), float(ss)"""
-    try:
-        hour, minute = hhmm.split(':')
-    except ValueError:
-        if not i_already_warn_about_seconds:
-            print('WARNING: only HH:MM are read. Seconds or other smaller numbers are going to be ignored.')
-            i_already_warn_about_seconds = True
-
-        hour, minute, *others = hhmm.split(':')
-
-    minute = float(minute)
-    second = int((minute-floor(minute))*60)
-    return int(hour), int(floor(minute)), second
-
-
 def date2datetime(date):
-    """Convert the given date to DOY, HH, MM.
+    """Convert the given date to datetime64.
     Inputs:
       date : str
-        Date in format DOY/HH:MM, YYYY/DOY/HH:MM or YYYY/MM/DD:HH:MM
+        Date in format DOY/HH:MM, YYYY/DOY/HH:MM or YYYY/MM/DD/HH:MM
     """
-    if date.count('/') == 1:
-        # Uses a fake year
-        doy, hhmm = date.split('/')
-        return dt.datetime(1969, 1, 1, *hm2hhmmss(hhmm)) + dt.timedelta(int(doy)-1)
-    elif date.count('/') == 2:
-        year, doy, hhmm = date.split('/')
-        return dt.datetime(int(year), 1, 1, *hm2hhmmss(hhmm)) + dt.timedelta(int(doy)-1)
-    elif date.count('/') == 3:
-        year, month, day, hhmm = date.split('/')
-        return dt.datetime(int(year), int(month), int(day), *hm2hhmmss(hhmm))
-    else:
-        print('ERROR: date must have the following format: DOY/HH:MM, YYYY/DOY/HH:MM or YYYY/MM/DD:HH:MM')
+    try:
+        # Uses a fake year if only the DOY is given
+        return timeconv.parse_times(date, year=1969)
+    except ValueError:
+        print('ERROR: date must have the following format: DOY/HH:MM, YYYY/DOY/HH:MM or YYYY/MM/DD/HH:MM')
         raise SyntaxError
 
 
 
-def date2string(datetime):
-    """Return a string with the date in the correct ANTAB format
-    """
-    return '{} {:02d}:{:05.2f}'.format(datetime.strftime('%j'), datetime.hour, datetime.minute+datetime.second/60.)
-
-
-
 #currently asks for inputs, might change this in future to read from vex...
 if args.experiment == None:
     args.experiment = raw_input("Input experiment name: ")
@@ -206,19 +180,18 @@ if not (args.freqrange[0] < 30*1000/float(args.band) < args.freqrange[1]):
 sefd_info = read_sefd_table()
 
 start_time = date2datetime(args.start)
-end_time = start_time + dt.timedelta(args.duration/24.)
-a_time = date2datetime(args.start)
+end_time = start_time + timeconv.timedelta64(args.duration*3600.)
+tsys_times = np.arange(start_time, end_time, timeconv.timedelta64(args.interval*60.))
 
 # Creating the ANTAB file
-antab_file = open('{}{}.antabfs'.format(args.experiment.lower(), args.antenna.lower()[:2]), 'wt')
-antab_file.write(get_header(args.antenna.lower(), 1./read_sefd_values(sefd_info, args.antenna.lower(), args.band),
-                            args.freqrange)+'\n')
+antab_file = open('{}{}.antabfs'.format(args.experiment.lower(), args.antenna.lower()[:2]), 'wb')
+antab_file.write((get_header(args.antenna.lower(), 1./read_sefd_values(sefd_info, args.antenna.lower(), args.band),
+                             args.freqrange)+'\n').encode())
 
-while a_time < end_time:
-   antab_file.write('{}{}\n'.format(date2string(a_time), ' 1.0'*args.subbands))
-   a_time = a_time + dt.timedelta(args.interval/(60*24.))
+# All the Tsys lines are formatted in bulk
+antab.write_tsys(antab_file, tsys_times, np.ones((len(tsys_times), args.subbands)), 'antab', decimals=1)
 
-antab_file.write('/\n') # antab expects trailing /
+antab_file.write(b'/\n') # antab expects trailing /
 antab_file.close()
 
 print('File {}{}.antabfs created successfully.'.format(args.experiment.lower(), args.antenna.lower()[:2]))
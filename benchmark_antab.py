@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the fits of antabfs_interpolate.py (fit_spline(), one linear spline per column, and
+fit_smooth(), all the columns at once) on synthetic TSYS blocks.
+
+The blocks are reproducible (fixed random seed): irregular Tsys times every 15-25 s, smooth Tsys
+curves with Gaussian noise and 1% of outliers, with the given numbers of rows and columns. Each
+fit is evaluated every interval seconds along the block, as in antabfs_interpolate.py. The best
+time of several executions is reported for each fit, together with the median deviation of the
+fit from the noiseless Tsys curves, so the speed and the quality of both fits can be compared.
+
+The results can be appended as JSON lines to a file (--results), together with the git commit of
+the tools and the versions of python and numpy, as in benchmark_tools.py.
+
+Usage: benchmark_antab.py [options]
+Options:
+    --rows N                  Number of Tsys values per column (default: 2000).
+    --columns LIST            Numbers of Tsys columns to test (default: 32,64).
+    --interval SECONDS        Interval of the evaluated Tsys (default: 1).
+    --period SECONDS          Period of the smooth fit (default: 120).
+    --repeat N                Number of executions for each case (default: 3).
+    --seed N                  Random seed of the synthetic blocks (default: 5).
+    --results FILE            File where the results are appended (JSON lines).
+
+Version: 1.0
+Date: Oct 2026
+Written by Benito Marcote (marcote@jive.eu)
+"""
+
+import json
+import time
+import argparse
+import platform
+import datetime as dt
+import numpy as np
+import antabfs_interpolate
+import benchmark_tools
+
+
+__version__ = 1.0
+
+FITS = {'spline': lambda times, values, period: antabfs_interpolate.fit_spline(times, values),
+        'smooth': antabfs_interpolate.fit_smooth}
+
+
+usage = "%(prog)s [-h] [--rows N] [--columns LIST] [--interval SECONDS] [--repeat N] [--seed N] [--results FILE]"
+description = """Benchmarks the Tsys fits of antabfs_interpolate.py (spline and smooth) on synthetic
+TSYS blocks with many columns.
+"""
+help_rows = 'Number of Tsys values per column of the synthetic blocks (default: 2000).'
+help_columns = 'Comma-separated list of numbers of Tsys columns (default: 32,64).'
+help_interval = 'Interval of the evaluated Tsys values, in seconds (default: 1).'
+help_period = 'Period of fit_smooth(), in seconds (default: {}).'.format(antabfs_interpolate.SMOOTH_PERIOD)
+help_repeat = 'Number of executions of each fit (the best time is reported, default: 3).'
+help_seed = 'Random seed of the synthetic blocks (default: 5).'
+help_results = 'File where the results are appended as JSON lines (default: not stored).'
+
+
+def synthetic_block(nrow, ncolumns, seed=5):
+    """Returns the times (MJD seconds), noisy Tsys values (nrow, ncolumns) and a function giving
+    the noiseless Tsys at any time, of a synthetic TSYS block."""
+    rng = np.random.default_rng(seed)
+    times = 5e9 + np.cumsum(rng.uniform(15.0, 25.0, nrow))
+    phases = np.arange(ncolumns)
+
+    def true_tsys(at_times):
+        rows = np.interp(at_times, times, np.arange(nrow))
+        return 60.0 + 10.0*np.sin(rows[:, None]/300.0 + phases)
+
+    values = true_tsys(times) + rng.normal(0.0, 1.0, (nrow, ncolumns))
+    outliers = rng.random((nrow, ncolumns)) < 0.01
+    values[outliers] *= 5.0
+    return times, values, true_tsys
+
+
+def benchmark(nrow, columns, interval=1.0, period=antabfs_interpolate.SMOOTH_PERIOD, repeat=3, seed=5):
+    """Times all fits for all numbers of columns. Returns a list of results (dicts)."""
+    results = []
+    for ncolumns in columns:
+        times, values, true_tsys = synthetic_block(nrow, ncolumns, seed)
+        new_times = np.arange(times[0], times[-1], interval)
+        truth = true_tsys(new_times)
+        for fit, fit_function in FITS.items():
+            elapsed = []
+            for i in range(repeat):
+                t0 = time.perf_counter()
+                tsys = fit_function(times, values, period)(new_times)
+                elapsed.append(time.perf_counter() - t0)
+            deviation = float(np.median(np.abs(tsys - truth)))
+            results.append({'fit': fit, 'nrow': nrow, 'ncolumns': ncolumns, 'interval': interval,
+                            'period': period, 'seed': seed, 'seconds': round(min(elapsed), 4),
+                            'values_per_s': round(tsys.size/min(elapsed), 1),
+                            'median_deviation': round(deviation, 4)})
+            print('{:>8} {:6d} rows {:4d} columns {:9.3f} s {:14.0f} values/s {:8.3f} K'.format(fit, nrow,
+                  ncolumns, min(elapsed), tsys.size/min(elapsed), deviation))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=description, prog='benchmark_antab.py', usage=usage)
+    parser.add_argument('--rows', type=int, default=2000, help=help_rows)
+    parser.add_argument('--columns', type=str, default='32,64', help=help_columns)
+    parser.add_argument('--interval', type=float, default=1.0, help=help_interval)
+    parser.add_argument('--period', type=float, default=antabfs_interpolate.SMOOTH_PERIOD, help=help_period)
+    parser.add_argument('--repeat', type=int, default=3, help=help_repeat)
+    parser.add_argument('--seed', type=int, default=5, help=help_seed)
+    parser.add_argument('--results', type=str, default=None, help=help_results)
+    parser.add_argument('--version', action='version', version='%(prog)s {}'.format(__version__))
+    arguments = parser.parse_args()
+
+    if arguments.rows < 2:
+        parser.error('--rows must be at least 2')
+    if (arguments.interval <= 0.0) or (arguments.period <= 0.0):
+        parser.error('--interval and --period must be positive')
+    try:
+        columns = [int(i) for i in arguments.columns.split(',')]
+    except ValueError:
+        parser.error('Wrong --columns: {}'.format(arguments.columns))
+
+    print('{:>8} {:>11} {:>12} {:>11} {:>23} {:>10}'.format('fit', 'rows', 'columns', 'time', 'speed',
+          '|fit-true|'))
+    results = benchmark(arguments.rows, columns, arguments.interval, arguments.period, max(1, arguments.repeat),
+                        arguments.seed)
+    if arguments.results is not None:
+        info = {'date': dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'commit': benchmark_tools.git_commit(),
+                'host': platform.node(), 'python': platform.python_version(), 'numpy': np.__version__}
+        with open(arguments.results, 'a') as resultsf:
+            for a_result in results:
+                resultsf.write(json.dumps(dict(info, **a_result)) + '\n')
+        print('\nResults appended to {}.'.format(arguments.results))
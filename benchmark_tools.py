@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the tools that modify the MS (flag_weights.py, polswap.py, invert_subband.py,
+scale1bit.py, ysfocus.py) on synthetic Measurement Sets created with make_test_ms.py.
+
+For each tool and chunk size, a fresh copy of the synthetic MS is corrected by running the
+tool as a separate process. The wall time and the peak memory (RSS) of the process are
+measured, and the throughput is reported as rows/s and MB/s of the full MS (i.e. the rows
+and the size of the data columns of the MS divided by the time, so the numbers of tools that
+only touch part of the data can be compared between versions).
+
+Every result is appended as a JSON line to a results file, together with the MS parameters,
+the git commit of the tools and the versions of python and numpy, so different runs can be
+compared over time (--report). It works offline, only creating files in the work directory.
+
+Usage: benchmark_tools.py [options]
+Options:
+    --workdir DIR             Directory for the synthetic MSs and the results.
+    --tools LIST              Tools to benchmark (default: all).
+    --chunksizes LIST         Chunk sizes to test (default: 1000,5000,20000).
+    --repeat N                Number of executions for each case (default: 1).
+    --report                  Only show the results stored in the results file.
+    (plus the options of make_test_ms.py to define the synthetic MS)
+
+Version: 1.0
+Date: Oct 2026
+Written by Benito Marcote (marcote@jive.eu)
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import argparse
+import platform
+import subprocess
+import datetime as dt
+import numpy as np
+from pyrap import tables as pt
+import make_test_ms
+
+
+__version__ = 1.0
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Arguments for each tool (the antennas are taken from the list of stations of the MS), and
+# whether they accept --chunksize
+TOOLS = {'flag_weights': (lambda msdata, ants: [msdata, '0.5', '--no-journal'], True),
+         'polswap': (lambda msdata, ants: [msdata, ants[0]], True),
+         'invert_subband': (lambda msdata, ants: [msdata, ants[1 % len(ants)]], True),
+         'scale1bit': (lambda msdata, ants: [msdata, ants[2 % len(ants)], '--stream'], True),
+         'ysfocus': (lambda msdata, ants: [msdata], False)}
+
+DATA_COLUMNS = ('DATA', 'FLAG', 'WEIGHT', 'WEIGHT_SPECTRUM', 'SIGMA')
+
+
+usage = "%(prog)s [-h] [--workdir DIR] [--tools LIST] [--chunksizes LIST] [--repeat N] [--report] [MS options]"
+description = """Benchmarks the tools that modify the MS on synthetic Measurement Sets.
+
+Reports rows/s, MB/s and peak memory for each tool and chunk size, and stores the results
+(JSON lines) so different versions can be compared.
+"""
+help_workdir = 'Directory where the synthetic MSs and the results are stored (default: ./ms_benchmarks).'
+help_results = 'File where the results are appended (default: WORKDIR/results.jsonl).'
+help_tools = 'Comma-separated list of tools to benchmark (default: {}).'.format(','.join(TOOLS))
+help_chunksizes = 'Comma-separated list of chunk sizes, in rows (default: 1000,5000,20000).'
+help_repeat = 'Number of executions for each tool and chunk size (default: 1).'
+help_report = 'Only print a summary of the results stored in the results file.'
+
+
+def git_commit():
+    """Returns the current git commit of the tools, or None if it cannot be determined."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=TOOLS_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def synthetic_ms(workdir, config):
+    """Returns the name of the synthetic MS with the given make_test_ms.make_ms() parameters,
+    creating it if it does not exist yet in workdir (so it is reused by following runs).
+    """
+    key = hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:10]
+    msdata = os.path.join(workdir, 'synthetic_{}.ms'.format(key))
+    if not os.path.isdir(msdata):
+        print('Creating {}...'.format(msdata))
+        make_test_ms.make_ms(msdata + '.tmp', **config)
+        os.rename(msdata + '.tmp', msdata)
+    return msdata
+
+
+def data_size(msdata):
+    """Returns the number of rows and the size (in bytes) of the data columns of the MS."""
+    with pt.table(msdata, readonly=True, ack=False) as ms:
+        nbytes = 0
+        for a_col in DATA_COLUMNS:
+            if a_col in ms.colnames():
+                cell = ms.getcell(a_col, 0)
+                nbytes += np.asarray(cell).nbytes*len(ms)
+        return len(ms), nbytes
+
+
+# Runs a tool and writes its peak RSS (VmHWM) to a file. Unlike ru_maxrss, VmHWM only counts the
+# memory used after the exec, and not the one of the parent process at the time of the fork.
+_WRAPPER = """
+import os, sys, runpy
+rssfile, sys.argv = sys.argv[1], sys.argv[2:]
+sys.path.insert(0, os.path.dirname(sys.argv[0]))
+try:
+    runpy.run_path(sys.argv[0], run_name='__main__')
+finally:
+    with open('/proc/self/status') as status, open(rssfile, 'w') as out:
+        out.write([a_line.split()[1] for a_line in status if a_line.startswith('VmHWM')][0])
+"""
+
+
+def run_tool(tool, arguments):
+    """Runs the tool in a new process. Returns the wall time (s), peak RSS (MB) and exit code."""
+    with tempfile.TemporaryFile() as errors, tempfile.NamedTemporaryFile('r') as rssfile:
+        command = [sys.executable, '-c', _WRAPPER, rssfile.name, os.path.join(TOOLS_DIR, tool + '.py')]
+        t0 = time.perf_counter()
+        process = subprocess.Popen(command + arguments, stdout=subprocess.DEVNULL, stderr=errors)
+        pid, status, rusage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - t0
+        process.returncode = os.waitstatus_to_exitcode(status)
+        errors.seek(0)
+        error = errors.read().decode()
+        peak_rss = rssfile.read().strip()
+    if process.returncode != 0:
+        print('\n{} {} failed:\n{}'.format(tool, ' '.join(arguments), error))
+    # Both VmHWM and ru_maxrss (only used if /proc is not available) are in kB in Linux
+    return elapsed, (float(peak_rss) if peak_rss else rusage.ru_maxrss)/1024.0, process.returncode
+
+
+def benchmark(msdata, tools, chunksizes, repeat=1):
+    """Runs all tools for all chunk sizes on copies of msdata. Returns a list of results (dicts)."""
+    nrow, nbytes = data_size(msdata)
+    with pt.table(msdata + '/ANTENNA', readonly=True, ack=False) as ms_ant:
+        antennas = list(ms_ant.getcol('NAME'))
+
+    results = []
+    workms = msdata[:-3] + '_work.ms'
+    for tool in tools:
+        get_arguments, has_chunksize = TOOLS[tool]
+        for chunksize in (chunksizes if has_chunksize else [None]):
+            for i in range(repeat):
+                if os.path.isdir(workms):
+                    shutil.rmtree(workms)
+                # The tools modify the MS, so each execution starts from a fresh copy
+                shutil.copytree(msdata, workms)
+                arguments = get_arguments(workms, antennas)
+                if chunksize is not None:
+                    arguments += ['--chunksize', str(chunksize)]
+                elapsed, peak_rss, returncode = run_tool(tool, arguments)
+                results.append({'tool': tool, 'chunksize': chunksize, 'seconds': round(elapsed, 4),
+                                'rows_per_s': round(nrow/elapsed, 1), 'mb_per_s': round(nbytes/1e6/elapsed, 2),
+                                'peak_rss_mb': round(peak_rss, 1), 'returncode': returncode,
+                                'nrow': nrow, 'mbytes': round(nbytes/1e6, 2)})
+                print('{:>15} {:>8} {:9.2f} s {:12.0f} rows/s {:9.1f} MB/s {:9.1f} MB'.format(tool,
+                      str(chunksize), elapsed, nrow/elapsed, nbytes/1e6/elapsed, peak_rss))
+
+    if os.path.isdir(workms):
+        shutil.rmtree(workms)
+    return results
+
+
+def report(resultsfile):
+    """Prints the best time of each tool and chunk size for each commit and MS configuration."""
+    best = {}
+    with open(resultsfile, 'r') as results:
+        for a_line in results:
+            a_result = json.loads(a_line)
+            if a_result['returncode'] != 0:
+                continue
+            key = (json.dumps(a_result['config'], sort_keys=True), a_result['tool'], str(a_result['chunksize']))
+            runs = best.setdefault(key, {})
+            commit = '{} ({})'.format(a_result['commit'], a_result['date'][:10])
+            if (commit not in runs) or (a_result['seconds'] < runs[commit]['seconds']):
+                runs[commit] = a_result
+
+    last_config = None
+    for (config, tool, chunksize), runs in sorted(best.items()):
+        if config != last_config:
+            print('\nMS: {}'.format(config))
+            print('{:>15} {:>8} {:>24} {:>9} {:>12} {:>9} {:>9}'.format('tool', 'chunk', 'commit', 'time (s)',
+                  'rows/s', 'MB/s', 'RSS (MB)'))
+            last_config = config
+        for commit, a_result in sorted(runs.items(), key=lambda a_run: a_run[1]['date']):
+            print('{:>15} {:>8} {:>24} {:9.2f} {:12.0f} {:9.1f} {:9.1f}'.format(tool, chunksize, commit,
+                  a_result['seconds'], a_result['rows_per_s'], a_result['mb_per_s'], a_result['peak_rss_mb']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=description, prog='benchmark_tools.py', usage=usage)
+    parser.add_argument('--workdir', type=str, default='ms_benchmarks', help=help_workdir)
+    parser.add_argument('--results', type=str, default=None, help=help_results)
+    parser.add_argument('--tools', type=str, default=','.join(TOOLS), help=help_tools)
+    parser.add_argument('--chunksizes', type=str, default='1000,5000,20000', help=help_chunksizes)
+    parser.add_argument('--repeat', type=int, default=1, help=help_repeat)
+    parser.add_argument('--report', default=False, action='store_true', help=help_report)
+    # Parameters of the synthetic MS
+    parser.add_argument('--stations', type=str, default=make_test_ms.DEFAULT_STATIONS, help=make_test_ms.help_stations)
+    parser.add_argument('--subbands', type=int, default=8, help=make_test_ms.help_subbands)
+    parser.add_argument('--channels', type=int, default=32, help=make_test_ms.help_channels)
+    parser.add_argument('--pols', type=int, default=4, choices=(1, 2, 4), help=make_test_ms.help_pols)
+    parser.add_argument('--inttime', type=float, default=2.0, help=make_test_ms.help_inttime)
+    parser.add_argument('--duration', type=float, default=600.0, help=make_test_ms.help_duration)
+    parser.add_argument('--weight-spectrum', default=False, action='store_true', help=make_test_ms.help_spectrum)
+    parser.add_argument('--storage', type=str, default='standard', choices=('standard', 'tiled'),
+                        help=make_test_ms.help_storage)
+    parser.add_argument('--version', action='version', version='%(prog)s {}'.format(__version__))
+    arguments = parser.parse_args()
+
+    resultsfile = arguments.results if arguments.results is not None else \
+                  os.path.join(arguments.workdir, 'results.jsonl')
+    if arguments.report:
+        report(resultsfile)
+        sys.exit(0)
+
+    tools = arguments.tools.replace(' ', '').split(',')
+    for a_tool in tools:
+        if a_tool not in TOOLS:
+            parser.error('Unknown tool {} (available: {}).'.format(a_tool, ', '.join(TOOLS)))
+
+    config = {'stations': arguments.stations.replace(' ', '').split(','), 'nspw': arguments.subbands,
+              'nchan': arguments.channels, 'npol': arguments.pols, 'inttime': arguments.inttime,
+              'duration': arguments.duration, 'weight_spectrum': arguments.weight_spectrum,
+              'storage': arguments.storage}
+    os.makedirs(arguments.workdir, exist_ok=True)
+    msdata = synthetic_ms(arguments.workdir, config)
+
+    info = {'date': dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 'commit': git_commit(),
+            'host': platform.node(), 'python': platform.python_version(), 'numpy': np.__version__,
+            'config': config}
+    results = benchmark(msdata, tools, [int(i) for i in arguments.chunksizes.split(',')], arguments.repeat)
+    with open(resultsfile, 'a') as resultsf:
+        for a_result in results:
+            resultsf.write(json.dumps(dict(info, **a_result)) + '\n')
+
+    print('\nResults appended to {}.'.format(resultsfile))
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Checkpoints for the tools that rewrite a Measurement Set in place, so an interrupted execution
+can be resumed (--resume) instead of restoring the MS and starting again.
+
+While a tool runs, a small sidecar file next to the MS (<msdata>.checkpoint) records:
+- a header line (JSON) with the tool, its parameters and the number of rows of the MS,
+- 'W startrow nrow' before a chunk is written to the MS,
+- 'C startrow nrow' once the chunk is written and the MS flushed: the rows are committed.
+
+The file is removed when the tool finishes, and also when it stops before recording any row (e.g.
+wrong inputs), as the MS has not been modified. If it is still there, the previous execution was
+interrupted and the MS is partly modified: running the same tool with the same parameters and
+--resume processes only the rows that were not committed. Running it again without --resume is
+refused (the committed rows would be modified twice). Each row is processed independently by
+all the tools, so the chunks do not need to be the same in both executions.
+
+If the tool fails, is interrupted (Ctrl-C) or terminated (SIGTERM), the chunks already computed
+are written and committed before it stops. Only if the process is killed (SIGKILL, out of
+memory) while writing a chunk, the rows of that chunk may be partly modified. They can be
+processed again if the operation is idempotent (flagging); otherwise (e.g. a polarization swap,
+which would be undone) --resume is refused for them. The MS and the checkpoint are not synced to
+disk, so a crash of the machine itself is not covered.
+
+Typical use:
+
+    with checkpoint.Checkpoint(msdata, 'polswap', params, len(ms), resume=arguments.resume) as ckpt:
+        with msstream.ChunkStreamer(ms, columns, chunks=chunks, checkpoint=ckpt) as stream:
+            ...
+
+Version: 1.0
+Date: Oct 2026
+"""
+
+import os
+import json
+import bisect
+import signal
+import threading
+import datetime as dt
+
+help_resume = 'Resume an interrupted execution (with the same parameters): only the rows that ' \
+              'were not committed yet are processed.'
+
+
+def checkpoint_name(msdata):
+    return msdata.rstrip('/') + '.checkpoint'
+
+
+def add_resume_argument(parser):
+    """Adds the --resume option to an argparse parser."""
+    parser.add_argument('--resume', default=False, action='store_true', help=help_resume)
+
+
+def _merge(ranges):
+    """Sorted and merged list of [start, end) ranges."""
+    merged = []
+    for start, end in sorted(ranges):
+        if (len(merged) > 0) and (start <= merged[-1][1]):
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _subtract(ranges, other):
+    """The parts of the (merged) [start, end) ranges that are not in the (merged) other ones."""
+    remaining = []
+    for start, end in ranges:
+        for o_start, o_end in other:
+            if (o_end <= start) or (o_start >= end):
+                continue
+            if o_start > start:
+                remaining.append([start, o_start])
+            start = max(start, o_end)
+        if start < end:
+            remaining.append([start, end])
+    return remaining
+
+
+def _terminate(signum, frame):
+    # SIGTERM stops the tool as Ctrl-C does, so the pending chunks are written and committed
+    raise SystemExit('Terminated (signal {}).'.format(signum))
+
+
+class Checkpoint(object):
+    """Checkpoint of an in-place rewrite of a MS.
+
+    Inputs
+    ------
+      msdata : str
+            Name of the MS.
+      tool : str
+            Name of the tool (stored in the header).
+      params : dict
+            Parameters that define the operation (JSON serializable). A resumed execution must
+            have the same ones.
+      nrow : int
+            Number of rows of the MS.
+      resume : bool
+            Continue the interrupted execution recorded in the checkpoint file, if any.
+      idempotent : bool
+            The operation gives the same result if applied twice to a row (e.g. flagging), so the
+            rows that were being written when the previous execution was killed can be processed
+            again.
+
+    Raises ValueError if there is a checkpoint file and resume is False, if it was written by
+    another tool, with other parameters or for a different number of rows, or if it has rows that
+    may be partly modified and the operation is not idempotent.
+    """
+    def __init__(self, msdata, tool, params, nrow, resume=False, idempotent=False):
+        self.filename = checkpoint_name(msdata)
+        self.committed = []
+        # Whether the file records any row (written or committed), i.e. the MS may be modified
+        self._recorded = False
+        self._lock = threading.RLock()
+        header = {'tool': tool, 'params': json.loads(json.dumps(params)), 'nrow': int(nrow)}
+        if os.path.isfile(self.filename):
+            if not resume:
+                raise ValueError('{} exists: a previous execution was interrupted and the MS is partly '
+                                 'modified. Use --resume to continue it.'.format(self.filename))
+            previous, self.committed, uncertain = read_checkpoint(msdata)
+            self._recorded = (len(self.committed) > 0) or (len(uncertain) > 0)
+            for key in ('tool', 'params', 'nrow'):
+                if previous.get(key) != header[key]:
+                    raise ValueError('The interrupted execution in {} was run with {} = {} (now {}). It can only '
+                                     'be resumed with the same parameters.'.format(self.filename, key,
+                                     previous.get(key), header[key]))
+            if (len(uncertain) > 0) and (not idempotent):
+                raise ValueError('The interrupted execution was killed while writing the rows {} (of {}), which '
+                                 'may be partly modified: they cannot be processed again safely. Restore them '
+                                 'from a backup.'.format(', '.join(['{}-{}'.format(start, end-1)
+                                 for start, end in uncertain]), self.filename))
+            self._file = open(self.filename, 'a')
+        else:
+            self._file = open(self.filename, 'w')
+            header['date'] = dt.datetime.now().strftime('%Y/%m/%d %H:%M:%S')
+            self._file.write(json.dumps(header) + '\n')
+            self._file.flush()
+        self._previous_handler = None
+        if threading.current_thread() is threading.main_thread():
+            self._previous_handler = signal.signal(signal.SIGTERM, _terminate)
+
+    @property
+    def rows_committed(self):
+        """Number of rows committed by the interrupted execution(s)."""
+        return sum([end - start for start, end in self.committed])
+
+    def pending(self, chunks):
+        """Returns the (startrow, nrow) chunks without the rows that are already committed
+        (chunks partly committed are reduced to the remaining rows)."""
+        starts = [start for start, end in self.committed]
+        remaining = []
+        for startrow, nrow in chunks:
+            start, end = startrow, startrow + nrow
+            i = max(0, bisect.bisect_right(starts, start) - 1)
+            while (start < end) and (i < len(self.committed)):
+                c_start, c_end = self.committed[i]
+                if c_start >= end:
+                    break
+                if c_end > start:
+                    if c_start > start:
+                        remaining.append((start, c_start - start))
+                    start = c_end
+                i += 1
+            if start < end:
+                remaining.append((start, end - start))
+        return remaining
+
+    def writing(self, startrow, nrow):
+        """To be called before writing the rows to the MS."""
+        self._write('W', startrow, nrow)
+
+    def done(self, startrow, nrow, flush=None):
+        """Commits the rows, once they are processed and written to the MS. flush is called before
+        (to flush the MS), so only rows that are in the MS files are recorded."""
+        with self._lock:
+            if flush is not None:
+                flush()
+            self._write('C', startrow, nrow)
+
+    def _write(self, kind, startrow, nrow):
+        with self._lock:
+            self._file.write('{} {} {}\n'.format(kind, int(startrow), int(nrow)))
+            self._file.flush()
+            self._recorded = True
+
+    def close(self, completed=True):
+        """Closes the checkpoint. If the execution completed, or no row has been recorded (the MS
+        has not been modified), the file is removed."""
+        if self._previous_handler is not None:
+            signal.signal(signal.SIGTERM, self._previous_handler)
+            self._previous_handler = None
+        self._file.close()
+        if completed or (not self._recorded):
+            os.remove(self.filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(completed=exc_type is None)
+        return False
+
+
+def read_checkpoint(msdata):
+    """Reads the checkpoint file of the MS. Returns its header, the committed ranges of rows and
+    the ones that were being written but are not committed (merged lists of [start, end)).
+    An incomplete last line (interrupted write) is ignored.
+    """
+    with open(checkpoint_name(msdata), 'r') as cfile:
+        header = json.loads(cfile.readline())
+        ranges = {'W': [], 'C': []}
+        for a_line in cfile:
+            values = a_line.split()
+            if (len(values) == 3) and (values[0] in ranges) and a_line.endswith('\n'):
+                ranges[values[0]].append([int(values[1]), int(values[1]) + int(values[2])])
+    committed = _merge(ranges['C'])
+    return header, committed, _subtract(_merge(ranges['W']), committed)
@@ -1,17 +1,66 @@
 #!/usr/bin/env python3
 """
 Flag visibilities with weights below the provided threshold.
+Other flagging criteria can be applied in the same pass over the data.
 
-Usage: flag_weights.py msdata threshold
+Usage: flag_weights.py [-v] [--workers N] [criteria] msdata [threshold]
+       flag_weights.py msdata --sweep [THRESHOLDS]
+       flag_weights.py msdata --restore
 Options:
     msdata : str          MS data set containing the data to be flagged.
     threshold : float     Visibilities with a weight below the specified
                           value will be flagged. Must be positive.
+    --workers N : int     Number of processes computing the flags (default: 1).
+    --zeros               Also flag data with zero amplitude or NaN values.
+    --edges PERCENT       Also flag this percentage of channels at each subband edge.
+    --timerange ANTENNA,STARTTIME,ENDTIME
+                          Also flag all data from the antenna in the timerange
+                          (can be repeated).
+    --autocorr            Also flag all autocorrelations.
+    --restore             Undo the flags set by the last execution.
+    --resume              Resume an interrupted execution (same criteria).
+    --sweep [THRESHOLDS]  Do not flag. Reports the data that would be flagged for
+                          each threshold (comma-separated list), per antenna and
+                          subband, and suggests a threshold. All of them are
+                          computed from a single histogram of the weights.
 
-Version: 3.1
-Date: Mar 2020
+Version: 4.0
+Date: Oct 2026
 Written by Benito Marcote (marcote@jive.eu)
 
+version 4.0 changes (Oct 2026)
+- Flagging engine: besides the weight threshold, visibilities with zero/NaN data, band edges,
+  antenna timeranges and autocorrelations can be flagged in the same single pass over the
+  data. The number of visibilities matching each criteria is reported.
+- FLAG_ROW is kept consistent with FLAG (set for completely flagged rows, and unset on --restore).
+- --chunksize option (number of rows read at a time).
+- --max-memory option. The chunk size is computed from the size of the rows (within that
+  memory budget), aligned to the tiles of the data columns, and the table cache is sized to
+  one chunk.
+- --profile and --cprofile options (time, bytes and rows per phase and column, peak memory).
+- If the MS has an up-to-date row index (see rowindex.py), the --timerange and --autocorr rows
+  are taken from it, so ANTENNA1/ANTENNA2/TIME are not read. The index is kept up to date.
+- The rows already flagged are committed (after each chunk) to a checkpoint next to the MS
+  (see checkpoint.py), and the new --resume option continues an interrupted execution from it.
+version 3.6 changes (Oct 2026)
+- The new flags are recorded in a compact journal next to the MS (<msdata>.flagjournal), and
+  the new --restore option undoes the last execution from it (see flagjournal.py).
+version 3.5 changes (Oct 2026)
+- Only the rows with new flags are written back (as runs of consecutive rows), and chunks
+  without new flags are not written at all. WEIGHT is broadcast over the channels instead
+  of transposing the full FLAG array.
+version 3.4 changes (Oct 2026)
+- New --sweep option: reads the weights only once to build a histogram (total, per antenna and
+  per subband), and reports from it the flagged data for any number of thresholds together
+  with a suggested threshold (knee). The histogram is saved next to the MS and reused while
+  the MS does not change.
+version 3.3 changes (Oct 2026)
+- New --workers option: the flags are computed by N processes that receive the chunks through
+  shared memory, while the main process does all the reading/writing of the MS.
+- Code arranged in functions. The Python 2.7 (optparse) compatibility has been removed.
+version 3.2 changes (Oct 2026)
+- Uses the shared chunk streaming from msstream.py: the next chunk is read and the
+  previous one written in the background while the current one is computed.
 version 3.1 changes (Mar 2020)
 - Progress bar added.
 version 3.0 changes (Apr 2019)
@@ -35,109 +84,757 @@ version 1.1 changes
 
 """
 
-from pyrap import tables as pt
-import numpy as np
+import os
 import sys
+import time
+import argparse
+import queue
+import traceback
+import multiprocessing
+import numpy as np
+from pyrap import tables as pt
+import msstream
+import timeconv
+import flagjournal
+import checkpoint
+import rowindex
 
-__version__ = 3.0
+__version__ = 4.0
+# Seconds between the checks that the workers of flag_parallel() are still alive
+WORKER_POLL = 5.0
 help_msdata = 'Measurement set containing the data to be corrected.'
-help_threshold = 'Visibilities with a weight below this value will be flagged. Must be positive.'
+help_threshold = 'Visibilities with a weight below this value will be flagged. Must be positive. '\
+                 'It can be omitted if any other flagging criteria is given.'
+help_zeros = 'Also flag visibilities with zero amplitude or NaN values in DATA.'
+help_edges = 'Also flag the given percentage of channels at each edge of all subbands.'
+help_timerange = 'Also flag all data from an antenna within a timerange, given as ANTENNA,STARTTIME,ENDTIME '\
+                 'in AIPS format (YYYY/MM/DD/hh:mm:ss or YYYY/DOY/hh:mm:ss). It can be used several times.'
+help_autocorr = 'Also flag all autocorrelations.'
+help_chunksize = 'Number of rows read at a time (default: ~4 MB of data, see --max-memory). It is rounded ' \
+                 'down to whole tiles of the data columns.'
 help_v = 'Only checks the visibilities to flag (do not flag the data).'
+help_workers = 'Number of processes computing the flags (default: 1). The MS is only read and written '\
+               'by the main process, the chunks are passed to the workers through shared memory.'
+help_sweep = 'Do not flag the data. Instead, report the percentage of data that would be flagged for each of '\
+             'the given thresholds (comma-separated, by default from 0.05 to 0.95 in steps of 0.05), '\
+             'and suggest a threshold. The weights are only read once.'
+help_bins = 'Number of bins in the weight histogram used by --sweep (default: 1000). Thresholds are rounded '\
+            'to the closest bin edge.'
+help_maxweight = 'Maximum weight considered in the histogram used by --sweep (default: 1.0). '\
+                 'Larger weights are counted together.'
+help_rescan = 'Read the weights again even if a histogram from the same MS is available.'
+help_restore = 'Undo the flags set by the last execution of flag_weights.py, as recorded in the flag journal '\
+               '(<msdata>.flagjournal). It can be repeated to undo previous executions.'
+help_nojournal = 'Do not record the new flags in the flag journal (they cannot be restored afterwards).'
+
+usage = "%(prog)s [-h] [-v] [--workers N] [--no-journal] [--resume] [--zeros] [--edges PERCENT] [--autocorr]\n"\
+        "       [--timerange ANTENNA,STARTTIME,ENDTIME] <measurement set> [<weight threshold>]\n"\
+        "       %(prog)s <measurement set> --sweep [THRESHOLDS]\n       %(prog)s <measurement set> --restore"
+description="""Flag visibilities with weights below the provided threshold.
+
+Other flagging criteria (zero/NaN data, band edges, antenna timeranges and autocorrelations)
+can be applied in the same pass over the data.
+"""
+
+percent = lambda x, y: (float(x)/float(y))*100.0
+
+
+class WeightThreshold(object):
+    """Visibilities with a weight (WEIGHT or WEIGHT_SPECTRUM) below the threshold."""
+    def __init__(self, weightcol, threshold):
+        self.weightcol = weightcol
+        self.threshold = threshold
+        self.columns = [weightcol]
+        self.name = 'weight < {}'.format(threshold)
+
+    def __call__(self, data, startrow=0):
+        weights = data[self.weightcol]
+        if weights.ndim == 2:
+            # WEIGHT applies to all channels
+            weights = weights[:, np.newaxis, :]
+        return weights < self.threshold
+
+
+class ZeroData(object):
+    """Visibilities with zero amplitude or NaN/inf values in DATA."""
+    columns = ['DATA']
+    name = 'zero/NaN data'
+
+    def __call__(self, data, startrow=0):
+        return np.logical_or(data['DATA'] == 0, np.logical_not(np.isfinite(data['DATA'])))
+
+
+class BandEdges(object):
+    """The first and last percentage of channels of each subband."""
+    columns = []
+
+    def __init__(self, percent):
+        self.percent = percent
+        self.name = 'band edges ({}%)'.format(percent)
+
+    def __call__(self, data, startrow=0):
+        nchan = data['FLAG'].shape[1]
+        nedge = int(round(nchan*self.percent/100.0))
+        edges = np.zeros((1, nchan, 1), dtype=bool)
+        edges[:, :nedge] = True
+        edges[:, nchan-nedge:] = True
+        return edges
+
+
+class AntennaTimeRange(object):
+    """All visibilities from the baselines of an antenna within a timerange (MJD seconds)."""
+    columns = ['ANTENNA1', 'ANTENNA2', 'TIME']
+
+    def __init__(self, antenna_number, antenna_name, start, end):
+        self.antenna_number = antenna_number
+        self.start = start
+        self.end = end
+        self.name = '{} timerange'.format(antenna_name)
+
+    def __call__(self, data, startrow=0):
+        rows = ((data['ANTENNA1'] == self.antenna_number) | (data['ANTENNA2'] == self.antenna_number)) & \
+               (data['TIME'] > self.start) & (data['TIME'] < self.end)
+        return rows[:, np.newaxis, np.newaxis]
+
+
+class Autocorrelations(object):
+    """All visibilities from autocorrelations."""
+    columns = ['ANTENNA1', 'ANTENNA2']
+    name = 'autocorrelations'
+
+    def __call__(self, data, startrow=0):
+        return (data['ANTENNA1'] == data['ANTENNA2'])[:, np.newaxis, np.newaxis]
+
+
+class IndexedRows(object):
+    """All visibilities from the rows selected in the row index of the MS (see rowindex.py).
+    It replaces AntennaTimeRange and Autocorrelations when the index is available: the rows
+    are known in advance, so no column needs to be read to evaluate it.
+    """
+    columns = []
+
+    def __init__(self, name, index, **conditions):
+        self.name = name
+        self.rows = np.zeros(index.nrow, dtype=bool)
+        self.rows[index.rows(**conditions)] = True
+
+    def __call__(self, data, startrow=0):
+        return self.rows[startrow:startrow+len(data['FLAG'])][:, np.newaxis, np.newaxis]
+
+
+def needed_columns(ms, weightcol, predicates):
+    """Columns that need to be read to apply the predicates (and to compute the statistics)."""
+    columns = ['FLAG', weightcol]
+    for a_predicate in predicates:
+        columns += [a_col for a_col in a_predicate.columns if a_col not in columns]
+    if 'FLAG_ROW' in ms.colnames():
+        columns.append('FLAG_ROW')
+    return columns
+
+
+def flag_chunk(data, weightcol, predicates, startrow=0):
+    """Flags (in place) the visibilities of a chunk that match any of the predicates.
+
+    Inputs
+    ------
+      data : dict
+            {column: array} for the chunk, with at least FLAG (nrow, nfreq, npol), the weights
+            column and all the columns required by the predicates. If FLAG_ROW is present,
+            it is also updated (set for the rows that get completely flagged).
+      weightcol : str
+            WEIGHT (nrow, npol) or WEIGHT_SPECTRUM (nrow, nfreq, npol), used for the statistics.
+      predicates : list
+            Callables that take data and startrow and return a boolean array (broadcastable to the
+            shape of FLAG) with the visibilities to flag. All of them are evaluated in the same pass.
+      startrow : int
+            Row number of the first row of the chunk in the MS.
+
+    Outputs
+    -------
+      counts : 1-D array (int)
+            Number of visibilities in the chunk, flagged before, flagged after, flagged
+            after with non-zero weights and, for each predicate, the non-flagged visibilities
+            that match it (a visibility can match several predicates).
+      runs : 2-D array (int)
+            (offset, nrow) of the runs of consecutive rows where new flags have been set
+            (only those need to be written back).
+      to_flag : 3-D bool array
+            The flags set in this execution (nrow, nfreq, npol).
+    """
+    flags = data['FLAG']
+    weights = data[weightcol]
+    if weights.ndim == 2:
+        weights = weights[:, np.newaxis, :]
+
+    counts = np.zeros(4+len(predicates), dtype=np.int64)
+    counts[0] = flags.size
+    # count how much data is already flagged
+    counts[1] = np.count_nonzero(flags)
+    # new flags only, and join them with the existing ones
+    not_flagged = np.logical_not(flags)
+    to_flag = np.zeros_like(flags)
+    for i, a_predicate in enumerate(predicates):
+        matches = np.logical_and(a_predicate(data, startrow), not_flagged)
+        counts[4+i] = np.count_nonzero(matches)
+        np.logical_or(to_flag, matches, out=to_flag)
+
+    counts[2] = counts[1] + np.count_nonzero(to_flag)
+    np.logical_or(flags, to_flag, out=flags)
+    # Total of nonzero flags (in this and previous runs)
+    counts[3] = np.count_nonzero(np.logical_and(flags, weights > 0))
+    new_rows = np.any(to_flag, axis=(1, 2))
+    if 'FLAG_ROW' in data:
+        # Only for the rows with new flags (the only ones written back)
+        data['FLAG_ROW'][new_rows] |= np.all(flags[new_rows], axis=(1, 2))
+
+    return counts, msstream.row_runs(new_rows), to_flag
+
+
+def flag_serial(ms, weightcol, predicates, write=True, chunksize=None, journal=None, max_memory=None,
+                checkpoint=None):
+    """Flags the MS in a single process. Returns the summed counts from flag_chunk() and the
+    number of rows written. If a flagjournal.FlagJournal is given, the new flags are recorded on it.
+    The chunk size is chosen by msstream.chunk_plan() (from max_memory if chunksize is not given).
+    If a checkpoint.Checkpoint is given, only its pending rows are processed, and the written
+    ones are committed on it.
+    """
+    counts = np.zeros(4+len(predicates), dtype=np.int64)
+    columns = needed_columns(ms, weightcol, predicates)
+    chunksize, align = msstream.chunk_plan(ms, columns, chunksize, max_memory)
+    written = [a_col for a_col in ('FLAG', 'FLAG_ROW') if a_col in columns]
+    # Chunks are read in advance and written back in the background while the next ones are computed
+    with msstream.ChunkStreamer(ms, columns, chunksize=chunksize, checkpoint=checkpoint) as stream:
+        for chunk in stream:
+            chunk_counts, runs, to_flag = flag_chunk(chunk.data, weightcol, predicates, chunk.startrow)
+            counts += chunk_counts
+            if journal is not None:
+                # The journal is always ahead of the MS
+                journal.add(chunk.startrow, flagjournal.encode_runs(to_flag, runs))
+            if write:
+                # Only the rows with new flags are written
+                stream.write(chunk, {a_col: chunk[a_col] for a_col in written}, runs=runs)
+
+    return counts, stream.rows_written
+
+
+def _flag_worker(names, layout, nslots, chunksize, weightcol, predicates, journaling, tasks, results):
+    """Worker process: computes the flags of the chunks placed in the shared memory slots.
+
+    It receives (slot, startrow, nrow) from tasks and replies (slot, counts, runs, journal records)
+    in results. If it fails, it replies (None, traceback) and stops.
+    """
+    slots = msstream.SharedChunkSlots(layout, nslots, chunksize, names=names, create=False)
+    try:
+        for slot, startrow, nrow in iter(tasks.get, None):
+            counts, runs, to_flag = flag_chunk(slots.arrays(slot, nrow), weightcol, predicates, startrow)
+            # The (compressed) journal records are also computed in parallel
+            records = flagjournal.encode_runs(to_flag, runs) if journaling else None
+            results.put((slot, counts, runs, records))
+    except Exception:
+        results.put((None, traceback.format_exc()))
+    finally:
+        slots.close()
+
+
+def _get_result(results, workers):
+    """Next result of the workers of flag_parallel(). Raises RuntimeError if a worker failed (with
+    its traceback) or died without replying (e.g. killed), instead of waiting forever."""
+    while True:
+        try:
+            result = results.get(timeout=WORKER_POLL)
+        except queue.Empty:
+            dead = [a_worker for a_worker in workers if a_worker.exitcode is not None]
+            if len(dead) > 0:
+                raise RuntimeError('A flagging worker process died unexpectedly (exit code {}).'.format(
+                                   dead[0].exitcode))
+            continue
+        if result[0] is None:
+            raise RuntimeError('A flagging worker process failed:\n{}'.format(result[1]))
+        return result
+
+
+def flag_parallel(ms, weightcol, predicates, nworkers, write=True, chunksize=None, journal=None,
+                  max_memory=None, checkpoint=None):
+    """Flags the MS computing the flags in nworkers processes.
 
-try:
-    usage = "%(prog)s [-h] <measurement set> <weight threshold>"
-    description="""Flag visibilities with weights below the provided threshold.
+    The main process owns the table: it reads each chunk directly into a free shared memory slot,
+    passes the slot to the workers and writes the flags back once they are done. Only the slot
+    number, the counts, the runs of modified rows and the (compressed) journal records are sent
+    between processes (the predicates are only sent once, when the workers start).
+    Returns the summed counts from flag_chunk(), identical to the ones from flag_serial(), and the
+    number of rows written. The checkpoint is used as in flag_serial().
     """
-    import argparse
+    columns = needed_columns(ms, weightcol, predicates)
+    written_cols = [a_col for a_col in ('FLAG', 'FLAG_ROW') if a_col in columns]
+    layout = msstream.column_layout(ms, columns)
+    # Two slots per worker so none of them waits while the main process does the I/O
+    nslots = 2*nworkers
+    chunksize, align = msstream.chunk_plan(ms, columns, chunksize, max_memory, nchunks=nslots+1)
+    slots = msstream.SharedChunkSlots(layout, nslots, chunksize)
+    tasks, results = multiprocessing.Queue(), multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_flag_worker, args=(slots.names, layout, nslots,
+                                       chunksize, weightcol, predicates, journal is not None, tasks,
+                                       results), daemon=True)
+               for i in range(nworkers)]
+    counts = np.zeros(4+len(predicates), dtype=np.int64)
+    rows_written = 0
+    try:
+        for a_worker in workers:
+            a_worker.start()
+
+        profiler = msstream.active_profiler()
+        if profiler is not None:
+            profiler.describe_storage(ms, columns)
+
+        free_slots = list(range(nslots))
+        in_flight = {}
+        written = [0]
+
+        def collect_one():
+            t0 = time.perf_counter()
+            slot, chunk_counts, runs, records = _get_result(results, workers)
+            if profiler is not None:
+                # Waiting for the workers
+                profiler.add('wait', None, time.perf_counter()-t0)
+            startrow, nrow = in_flight.pop(slot)
+            if journal is not None:
+                journal.add(startrow, records)
+            if write:
+                # Only the rows with new flags are written
+                arrays = slots.arrays(slot, nrow)
+                nwritten = sum([n for offset, n in runs])
+                if (checkpoint is not None) and (nwritten > 0):
+                    checkpoint.writing(startrow, nrow)
+                for a_col in written_cols:
+                    t0 = time.perf_counter()
+                    for offset, n in runs:
+                        ms.putcol(a_col, arrays[a_col][offset:offset+n], startrow=startrow+offset, nrow=n)
+                    if profiler is not None:
+                        profiler.add('write', a_col, time.perf_counter()-t0,
+                                     arrays[a_col][:1].nbytes*nwritten, nwritten)
+                written[0] += nwritten
+            free_slots.append(slot)
+            if checkpoint is not None:
+                checkpoint.done(startrow, nrow, ms.flush if (write and len(runs) > 0) else None)
+            return chunk_counts
+
+        chunks = msstream.chunkert(0, len(ms), chunksize)
+        if checkpoint is not None:
+            chunks = checkpoint.pending(chunks)
+        for (startrow, nrow) in chunks:
+            msstream.cli_progress_bar(startrow, len(ms))
+            if len(free_slots) == 0:
+                counts += collect_one()
+
+            slot = free_slots.pop()
+            for a_col, an_array in slots.arrays(slot, nrow).items():
+                t0 = time.perf_counter()
+                ms.getcolnp(a_col, an_array, startrow=startrow, nrow=nrow)
+                if profiler is not None:
+                    profiler.add('read', a_col, time.perf_counter()-t0, an_array.nbytes, nrow)
+
+            in_flight[slot] = (startrow, nrow)
+            tasks.put((slot, startrow, nrow))
+
+        while len(in_flight) > 0:
+            counts += collect_one()
+
+        rows_written = written[0]
+
+        msstream.cli_progress_bar(1, 1)
+        sys.stdout.write('\n')
+    finally:
+        for a_worker in workers:
+            tasks.put(None)
+        for a_worker in workers:
+            if a_worker.is_alive():
+                a_worker.join(timeout=WORKER_POLL)
+            # Failed or stuck (e.g. after an error in the main process, with tasks still queued)
+            if a_worker.is_alive():
+                a_worker.terminate()
+                a_worker.join()
+        slots.unlink()
+
+    return counts, rows_written
+
+
+def restore_flags(ms, msdata):
+    """Undoes the last execution recorded in the flag journal of the MS: the flags it set are
+    cleared again, and the version is removed from the journal. Returns the header of the
+    restored version and the number of visibilities unflagged.
+    """
+    versions = flagjournal.read_versions(msdata)
+    if len(versions) == 0:
+        raise ValueError('The flag journal of {} is empty.'.format(msdata))
+
+    header = versions[-1]['header']
+    cellshape = tuple(header['cellshape'])
+    if (header['nrow'] != len(ms)) or (cellshape != tuple(msstream.column_layout(ms, ['FLAG'])['FLAG'][0])):
+        raise ValueError('The flag journal does not correspond to the current shape of {}.'.format(msdata))
+
+    records = versions[-1]['records']
+    columns = ['FLAG', 'FLAG_ROW'] if 'FLAG_ROW' in ms.colnames() else ['FLAG']
+    unflagged = 0
+    with msstream.ChunkStreamer(ms, columns, chunks=[(r[0], r[1]) for r in records]) as stream:
+        for chunk in stream:
+            mask = flagjournal.decode_record(records[chunk.index][2], chunk.nrow, cellshape)
+            flags = chunk['FLAG']
+            unflagged += np.count_nonzero(flags & mask)
+            flags &= ~mask
+            if 'FLAG_ROW' in chunk:
+                # Rows with restored flags are not completely flagged anymore
+                chunk['FLAG_ROW'][np.any(mask, axis=(1, 2))] = False
+            stream.write(chunk, {a_col: chunk[a_col] for a_col in columns})
+
+    flagjournal.drop_last_version(msdata, versions)
+    return header, unflagged
+
+
+class WeightHistogram(object):
+    """Histogram of the weights of the non-flagged visibilities of a MS.
+
+    Visibilities are counted in nbins bins of the same width between 0 and maxweight, plus one
+    extra bin with all the weights above maxweight. Counts are kept for the whole MS ('all'), per
+    antenna ('antenna', where each baseline counts for both antennas) and per subband
+    ('subband', spectral window). For each group it also stores the total number of visibilities,
+    the ones already flagged (all and with non-zero weights) and the non-flagged ones with zero
+    weight.
+
+    As the thresholds apply as weight < threshold, the data flagged by a threshold that matches
+    a bin edge is exact. Other thresholds are rounded to the closest edge.
+    """
+    groups = ('all', 'antenna', 'subband')
+    counters = ('total', 'flagged', 'flagged_nonzero', 'zero')
+
+    def __init__(self, nbins, maxweight, ngroups, names=None):
+        self.nbins = nbins
+        self.maxweight = maxweight
+        self.names = names if names is not None else {g: [str(i) for i in range(ngroups[g])]
+                                                      for g in self.groups}
+        self.hist = {g: np.zeros((ngroups[g], nbins+1)) for g in self.groups}
+        self.counts = {g: {c: np.zeros(ngroups[g]) for c in self.counters} for g in self.groups}
+
+    @property
+    def edges(self):
+        return np.linspace(0.0, self.maxweight, self.nbins+1)
+
+    def add_chunk(self, flags, weights, keys):
+        """Adds a chunk of data to the histogram.
+
+        Inputs
+        ------
+          flags : 3-D array-like
+                FLAG values of the chunk (nrow, nfreq, npol).
+          weights : 2-D or 3-D array-like
+                WEIGHT (nrow, npol) or WEIGHT_SPECTRUM (nrow, nfreq, npol) of the chunk.
+          keys : dict
+                {group: list of 1-D int arrays (nrow,)} with the group index of each row.
+                Negative values are ignored (e.g. ANTENNA2 of autocorrelations).
+        """
+        weights = np.nan_to_num(weights)
+        if weights.ndim == 2:
+            # One WEIGHT value for all channels: count the non-flagged channels for each one
+            nvis = np.count_nonzero(~flags, axis=1)
+            vis_per_row = flags.shape[1]*flags.shape[2]
+        else:
+            nvis = ~flags
+            vis_per_row = flags.shape[1]*flags.shape[2]
+
+        bins = np.clip((weights*(self.nbins/self.maxweight)).astype(np.int64), 0, self.nbins)
+        # Everything that does not depend on the group is reduced per row first
+        rows_flagged = np.count_nonzero(flags, axis=(1, 2))
+        if weights.ndim == 2:
+            rows_flagged_nonzero = np.sum((flags.shape[1] - nvis)*(weights > 0), axis=1)
+        else:
+            rows_flagged_nonzero = np.count_nonzero(flags & (weights > 0), axis=(1, 2))
+        rows_zero = np.sum(nvis*(weights <= 0), axis=tuple(range(1, weights.ndim)))
+        rowshape = (-1,) + (1,)*(weights.ndim-1)
+        for a_group in self.groups:
+            ngroup = self.hist[a_group].shape[0]
+            for a_key in keys[a_group]:
+                valid = a_key >= 0
+                key_bins = np.reshape(a_key, rowshape)*(self.nbins+1) + bins
+                self.hist[a_group] += np.bincount(key_bins[valid].ravel(),
+                                                  weights=np.asarray(nvis[valid], dtype=float).ravel(),
+                                                  minlength=ngroup*(self.nbins+1)
+                                                  ).reshape((ngroup, self.nbins+1))
+                for a_counter, values in zip(self.counters, (np.full(len(a_key), vis_per_row),
+                                             rows_flagged, rows_flagged_nonzero, rows_zero)):
+                    self.counts[a_group][a_counter] += np.bincount(a_key[valid], weights=values[valid],
+                                                                   minlength=ngroup)
+
+    def threshold_index(self, threshold):
+        """Index of the bin edge closest to the threshold."""
+        return int(np.clip(np.round(threshold*self.nbins/self.maxweight), 0, self.nbins))
+
+    def flagged(self, threshold, group='all'):
+        """Returns the fraction of visibilities (per element of the group) that would be flagged with
+        the given threshold (all of them and the ones with non-zero weights), and the ones flagged
+        in this run.
+        """
+        k = self.threshold_index(threshold)
+        c = self.counts[group]
+        total = np.maximum(c['total'], 1)
+        new = np.sum(self.hist[group][:, :k], axis=1)
+        new_zero = c['zero'] if k > 0 else 0.0
+        return (c['flagged'] + new)/total, (c['flagged_nonzero'] + new - new_zero)/total, new/total
+
+    def knee(self):
+        """Suggests a threshold: the bin edge where the total flagged fraction is furthest below the
+        straight line joining its values at zero and at maxweight. That is, the point just before
+        the curve starts to rise because the bulk of good data is being flagged.
+        """
+        cumulative = np.concatenate(([0.0], np.cumsum(self.hist['all'][0, :-1])))
+        if cumulative[-1] == 0:
+            return self.maxweight
+        x = np.linspace(0.0, 1.0, self.nbins+1)
+        return self.edges[np.argmax(x - cumulative/cumulative[-1])]
+
+    def save(self, filename, **metadata):
+        arrays = {'nbins': self.nbins, 'maxweight': self.maxweight}
+        for a_group in self.groups:
+            arrays['hist_'+a_group] = self.hist[a_group]
+            arrays['names_'+a_group] = np.array(self.names[a_group])
+            for a_counter in self.counters:
+                arrays['{}_{}'.format(a_counter, a_group)] = self.counts[a_group][a_counter]
+        arrays.update({'meta_'+k: v for k, v in metadata.items()})
+        # np.savez adds .npz if it is not already there
+        with open(filename, 'wb') as histfile:
+            np.savez(histfile, **arrays)
+
+    @classmethod
+    def load(cls, filename):
+        """Returns the histogram and a dict with the metadata stored with it."""
+        with np.load(filename) as arrays:
+            names = {g: [str(n) for n in arrays['names_'+g]] for g in cls.groups}
+            hist = cls(int(arrays['nbins']), float(arrays['maxweight']),
+                       {g: len(names[g]) for g in cls.groups}, names)
+            for a_group in cls.groups:
+                hist.hist[a_group] = arrays['hist_'+a_group]
+                for a_counter in cls.counters:
+                    hist.counts[a_group][a_counter] = arrays['{}_{}'.format(a_counter, a_group)]
+            metadata = {k[5:]: arrays[k].item() for k in arrays.files if k.startswith('meta_')}
+        return hist, metadata
+
+
+def weight_histogram(ms, weightcol, nbins=1000, maxweight=1.0, chunksize=None, max_memory=None):
+    """Reads once the flags and weights of the MS and returns its WeightHistogram."""
+    with pt.table(ms.getkeyword('ANTENNA'), readonly=True, ack=False) as ms_ant:
+        antennas = list(ms_ant.getcol('NAME'))
+    with pt.table(ms.getkeyword('DATA_DESCRIPTION'), readonly=True, ack=False) as ms_dd:
+        ddid2spw = ms_dd.getcol('SPECTRAL_WINDOW_ID')
+    subbands = [str(i+1) for i in range(max(ddid2spw)+1)]
+    hist = WeightHistogram(nbins, maxweight, {'all': 1, 'antenna': len(antennas), 'subband': len(subbands)},
+                           {'all': ['all'], 'antenna': antennas, 'subband': subbands})
+    columns = ['FLAG', weightcol, 'ANTENNA1', 'ANTENNA2', 'DATA_DESC_ID']
+    chunksize, align = msstream.chunk_plan(ms, columns, chunksize, max_memory)
+    with msstream.ChunkStreamer(ms, columns, chunksize=chunksize) as stream:
+        for chunk in stream:
+            ant1, ant2 = chunk['ANTENNA1'], chunk['ANTENNA2']
+            keys = {'all': [np.zeros_like(ant1)],
+                    # autocorrelations only count once
+                    'antenna': [ant1, np.where(ant1 != ant2, ant2, -1)],
+                    'subband': [ddid2spw[chunk['DATA_DESC_ID']]]}
+            hist.add_chunk(chunk['FLAG'], chunk[weightcol], keys)
+
+    return hist
+
+
+def print_sweep(hist, thresholds):
+    """Prints the percentage of flagged data for each threshold, in total, per antenna and subband."""
+    print("\nThreshold  Flagged (%)  Non-zero weights flagged (%)  To flag in this execution (%)")
+    for a_threshold in thresholds:
+        flagged, flagged_nonzero, new = [100*f[0] for f in hist.flagged(a_threshold)]
+        print("{0:9.3f}  {1:11.2f}  {2:28.2f}  {3:29.2f}".format(a_threshold, flagged, flagged_nonzero, new))
+
+    for a_group, title in (('antenna', 'Antenna'), ('subband', 'Subband')):
+        print("\nFlagged data (%) per {}:".format(title.lower()))
+        print("{:>8} ".format(title) + ' '.join(['{:>7.3f}'.format(t) for t in thresholds]))
+        flagged = np.array([hist.flagged(t, a_group)[0] for t in thresholds]).T
+        for a_name, a_total, a_row in zip(hist.names[a_group], hist.counts[a_group]['total'], flagged):
+            if a_total > 0:
+                print("{:>8} ".format(a_name) + ' '.join(['{:7.2f}'.format(100*f) for f in a_row]))
+
+    knee = hist.knee()
+    print("\nSuggested threshold: {:.3f} ({:.2f}% of the data flagged).".format(knee, 100*hist.flagged(knee)[0][0]))
+
+
+if __name__ == '__main__':
     parser = argparse.ArgumentParser(description=description, prog='flag_weights.py', usage=usage)
     parser.add_argument('msdata', type=str, help=help_msdata)
-    parser.add_argument('threshold', type=float, help=help_threshold)
+    parser.add_argument('threshold', type=float, nargs='?', default=None, help=help_threshold)
     parser.add_argument('--version', action='version', version='%(prog)s {}'.format(__version__))
     parser.add_argument("-v", "--verbose", default=True, action="store_false" , help=help_v)
+    parser.add_argument('--workers', type=int, default=1, help=help_workers)
+    parser.add_argument('--sweep', type=str, nargs='?', default=None, const='', metavar='THRESHOLDS',
+                        help=help_sweep)
+    parser.add_argument('--bins', type=int, default=1000, help=help_bins)
+    parser.add_argument('--max-weight', type=float, default=1.0, help=help_maxweight)
+    parser.add_argument('--rescan', default=False, action='store_true', help=help_rescan)
+    parser.add_argument('--restore', default=False, action='store_true', help=help_restore)
+    parser.add_argument('--no-journal', default=False, action='store_true', help=help_nojournal)
+    checkpoint.add_resume_argument(parser)
+    parser.add_argument('--zeros', default=False, action='store_true', help=help_zeros)
+    parser.add_argument('--edges', type=float, default=None, metavar='PERCENT', help=help_edges)
+    parser.add_argument('--timerange', type=str, default=[], action='append',
+                        metavar='ANTENNA,STARTTIME,ENDTIME', help=help_timerange)
+    parser.add_argument('--autocorr', default=False, action='store_true', help=help_autocorr)
+    parser.add_argument('--chunksize', type=int, default=None, help=help_chunksize)
+    msstream.add_memory_argument(parser)
+    msstream.add_profile_arguments(parser)
     arguments = parser.parse_args()
-    #print('The arguments ', arguments)
     verbose = arguments.verbose
     msdata = arguments.msdata[:-1] if arguments.msdata[-1]=='/' else arguments.msdata
     threshold = arguments.threshold
-except ImportError:
-    usage = "%prog [-h] [-v] <measurement set> <weight threshold>"
-    description="""Flag visibilities with weights below the provided threshold.
-    """
-    # Compatibility with Python 2.7 in eee
-    import optparse
-    parser = optparse.OptionParser(usage=usage, description=description, prog='flag_weights.py', version='%prog 1.3')
-    parser.add_option("-v", action="store_false", dest="verbose", default=True, help=help_v)
-    theparser = parser.parse_args()
-    verbose = theparser[0].verbose
-    arguments = theparser[1]
-    #arguments = parser.parse_args()[1]
-    if len(arguments) != 2:
-        print('Two arguments must be provided: flag_weights.py [-h] [-v] <measurement set> <weight threshold>')
-        print('Use -h to get help.')
-        sys.exit(1)
-
-    msdata = arguments[0][:-1] if arguments[0][-1]=='/' else arguments[0]
-    threshold = float(arguments[1])
-
-
-assert threshold > 0.0
-
-def chunkert(f, l, cs, verbose=True):
-    while f<l:
-        n = min(cs, l-f)
-        yield (f, n)
-        f = f + n
-
-def cli_progress_bar(current_val, end_val, bar_length=40):
-        percent = current_val/end_val
-        hashes = '#'*int(round(percent*bar_length))
-        spaces = ' '*(bar_length-len(hashes))
-        sys.stdout.write("\rProgress: [{0}] {1}%".format(hashes+spaces, int(round(percent*100))))
-        sys.stdout.flush()
+    profiler = msstream.start_profiler(arguments, msdata, 'flag_weights')
 
-percent = lambda x, y: (float(x)/float(y))*100.0
+    if arguments.sweep is not None:
+        if arguments.sweep == '':
+            thresholds = np.arange(1, 20)*0.05*arguments.max_weight
+        else:
+            thresholds = [float(t) for t in arguments.sweep.split(',')]
 
+        histfile = msdata + '.weighthist.npz'
+        hist = None
+        if os.path.isfile(histfile) and not arguments.rescan:
+            hist, metadata = WeightHistogram.load(histfile)
+            if (metadata.get('mtime') != msstream.table_mtime(msdata)) or (hist.nbins != arguments.bins) or \
+               (hist.maxweight != arguments.max_weight):
+                hist = None
+            else:
+                print('Using the weight histogram from {}.'.format(histfile))
 
-with pt.table(msdata, readonly=False, ack=False) as ms:
-    total_number = 0
-    flagged_before, flagged_after = (0, 0)
-    flagged_nonzero, flagged_nonzero_before, flagged_nonzero_after = (0, 0, 0)
-    # WEIGHT: (nrow, npol)
-    # WEIGHT_SPECTRUM: (nrow, npol, nfreq)
-    # flags[weight < threshold] = True
-    weightcol = 'WEIGHT_SPECTRUM' if 'WEIGHT_SPECTRUM' in ms.colnames() else 'WEIGHT'
-    transpose = (lambda x:x) if weightcol == 'WEIGHT_SPECTRUM' else (lambda x: x.transpose((1, 0, 2)))
-    for (start, nrow) in chunkert(0, len(ms), 5000):
-        cli_progress_bar(start, len(ms), bar_length=40)
-        # shape: (nrow, npol, nfreq)
-        flags = transpose(ms.getcol("FLAG", startrow=start, nrow=nrow))
-        total_number += np.product(flags.shape)
-        # count how much data is already flagged
-        flagged_before += np.sum(flags)
-        # extract weights and compute new flags based on threshold
-        weights = ms.getcol(weightcol, startrow=start, nrow=nrow)
-        # how many non-zero did we flag
-        flagged_nonzero_before = np.logical_and(flags, weights > 0)
-        # join with existing flags and count again
-        flags = np.logical_or(flags, weights < threshold)
-        flagged_after += np.sum(flags)
-        flagged_nonzero_after = np.logical_and(flags, weights > 0)
-        # Saving the total of nonzero flags (in this and previous runs)
-        # flagged_nonzero += np.sum(np.logical_xor(flagged_nonzero_before, flagged_nonzero_after))
-        flagged_nonzero += np.sum(flagged_nonzero_after)
-        # one thing left to do: write the updated flags to disk
-        #flags = ms.putcol("FLAG", flags.transpose((1, 0 , 2)), startrow=start, nrow=nrow)
-        if verbose:
-            flags = ms.putcol("FLAG", transpose(flags), startrow=start, nrow=nrow)
+        if hist is None:
+            with pt.table(msdata, readonly=True, ack=False) as ms:
+                weightcol = 'WEIGHT_SPECTRUM' if 'WEIGHT_SPECTRUM' in ms.colnames() else 'WEIGHT'
+                hist = weight_histogram(ms, weightcol, arguments.bins, arguments.max_weight,
+                                        chunksize=arguments.chunksize, max_memory=arguments.max_memory)
+
+            hist.save(histfile, mtime=msstream.table_mtime(msdata))
+
+        print_sweep(hist, thresholds)
+        print('\nFlags have not been applied.')
+        if profiler is not None:
+            profiler.stop()
+        sys.exit(0)
+
+    if arguments.restore:
+        with pt.table(msdata, readonly=False, ack=False) as ms:
+            index = rowindex.load_index(ms)
+            header, unflagged = restore_flags(ms, msdata)
+            rowindex.update_index(ms, index)
+        if os.path.isfile(checkpoint.checkpoint_name(msdata)):
+            # The interrupted execution has been undone: there is nothing to resume anymore
+            os.remove(checkpoint.checkpoint_name(msdata))
 
-    print("\nGot {0:11} visibilities".format(total_number))
-    print("Got {0:11} visibilities to flag using threshold {1}\n".format(flagged_after-flagged_before,
-                                                                                  threshold))
-    print("{0:.2f}% total vis. flagged ({2:.2f}% to flag in this execution).\n{1:.2f}% data with non-zero weights flagged.\n".format(percent(flagged_after, total_number), percent(flagged_nonzero, total_number), percent(flagged_after-flagged_before, total_number)))
-    ms.close()
+        print('\nRestored the flags from the execution of {} ({}).'.format(header['date'],
+              ', '.join(['{}={}'.format(k, v) for k, v in header['params'].items()])))
+        print('{} visibilities unflagged.'.format(unflagged))
+        if profiler is not None:
+            profiler.stop()
+        sys.exit(0)
 
-if verbose:
-    print('Done.')
-else:
-    print('Flags have not been applied.')
+    if (threshold is None) and (not (arguments.zeros or arguments.autocorr)) and \
+       (arguments.edges is None) and (len(arguments.timerange) == 0):
+        parser.error('the weight threshold is required (unless --sweep, --restore or other flagging '
+                     'criteria are used)')
+
+    assert (threshold is None) or (threshold > 0.0)
+    assert (arguments.edges is None) or (0.0 < arguments.edges < 50.0)
+    assert arguments.workers > 0
+
+    with pt.table(msdata, readonly=False, ack=False) as ms:
+        # FLAG: (nrow, nfreq, npol)
+        # WEIGHT: (nrow, npol)
+        # WEIGHT_SPECTRUM: (nrow, nfreq, npol)
+        # flags[weight < threshold] = True
+        weightcol = 'WEIGHT_SPECTRUM' if 'WEIGHT_SPECTRUM' in ms.colnames() else 'WEIGHT'
+        index = rowindex.load_index(ms)
+        # All criteria are evaluated in the same pass over the data
+        predicates = []
+        if threshold is not None:
+            predicates.append(WeightThreshold(weightcol, threshold))
+        if arguments.zeros:
+            predicates.append(ZeroData())
+        if arguments.edges is not None:
+            predicates.append(BandEdges(arguments.edges))
+        if len(arguments.timerange) > 0:
+            with pt.table(ms.getkeyword('ANTENNA'), readonly=True, ack=False) as ms_ant:
+                antennas = [i.upper() for i in ms_ant.getcol('NAME')]
+            for a_timerange in arguments.timerange:
+                antenna, starttime, endtime = [a.strip() for a in a_timerange.split(',')]
+                a_window = (antennas.index(antenna.upper()), timeconv.atime2mjds(starttime),
+                            timeconv.atime2mjds(endtime))
+                if index is not None:
+                    predicates.append(IndexedRows('{} timerange'.format(antenna), index, windows=[a_window]))
+                else:
+                    predicates.append(AntennaTimeRange(a_window[0], antenna, a_window[1], a_window[2]))
+        if arguments.autocorr:
+            if index is not None:
+                predicates.append(IndexedRows('autocorrelations', index, autocorr=True))
+            else:
+                predicates.append(Autocorrelations())
+
+        params = {'flagged': [p.name for p in predicates], 'weightcol': weightcol}
+        ckpt = None
+        if verbose:
+            try:
+                # Flagging a row twice gives the same flags
+                ckpt = checkpoint.Checkpoint(msdata, 'flag_weights', params, len(ms), resume=arguments.resume,
+                                             idempotent=True)
+            except ValueError as e:
+                parser.error(str(e))
+            if ckpt.rows_committed > 0:
+                print('Resuming the interrupted execution: {} of {} rows were already flagged (the counts '
+                      'below only include the remaining rows).'.format(ckpt.rows_committed, len(ms)))
+        journal = None
+        if verbose and not arguments.no_journal:
+            # A resumed execution continues the interrupted version of the journal
+            journal = flagjournal.FlagJournal(msdata, len(ms), msstream.column_layout(ms, ['FLAG'])['FLAG'][0],
+                                              params, resume=arguments.resume)
+        try:
+            if arguments.workers > 1:
+                counts, rows_written = flag_parallel(ms, weightcol, predicates, arguments.workers, write=verbose,
+                                                     chunksize=arguments.chunksize, journal=journal,
+                                                     max_memory=arguments.max_memory, checkpoint=ckpt)
+            else:
+                counts, rows_written = flag_serial(ms, weightcol, predicates, write=verbose,
+                                                   chunksize=arguments.chunksize, journal=journal,
+                                                   max_memory=arguments.max_memory, checkpoint=ckpt)
+        except BaseException:
+            if ckpt is not None:
+                ckpt.close(completed=False)
+            if journal is not None:
+                # The version is continued if the execution is resumed
+                journal.close(completed=ckpt is None)
+            raise
+        if journal is not None:
+            journal.close()
+        if ckpt is not None:
+            ckpt.close()
+        rowindex.update_index(ms, index)
+
+        total_number, flagged_before, flagged_after, flagged_nonzero = counts[:4]
+        print("\nGot {0:11} visibilities".format(total_number))
+        if (threshold is not None) and (len(predicates) == 1):
+            print("Got {0:11} visibilities to flag using threshold {1}\n".format(flagged_after-flagged_before,
+                                                                                          threshold))
+        else:
+            print("Got {0:11} visibilities to flag:".format(flagged_after-flagged_before))
+            for a_predicate, a_count in zip(predicates, counts[4:]):
+                print("    {0:11} from {1}".format(a_count, a_predicate.name))
+            print("(visibilities can match several criteria)\n")
+        print("{0:.2f}% total vis. flagged ({2:.2f}% to flag in this execution).\n{1:.2f}% data with non-zero weights flagged.\n".format(percent(flagged_after, total_number), percent(flagged_nonzero, total_number), percent(flagged_after-flagged_before, total_number)))
+        if verbose:
+            print("FLAG written for {0} of {1} rows ({2:.2f}%).\n".format(rows_written, len(ms),
+                                                                        percent(rows_written, len(ms))))
+        if journal is not None:
+            print("New flags recorded in {0} ({1:.1f} kB). Use --restore to undo them.\n".format(
+                  journal.filename, journal.nbytes/1024.))
 
+    if profiler is not None:
+        profiler.stop()
+    if verbose:
+        print('Done.')
+    else:
+        print('Flags have not been applied.')
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Compact journal of the flags set by flag_weights.py, so they can be undone without keeping
+a copy of the FLAG column.
+
+The journal is a sidecar file next to the MS (<msdata>.flagjournal). Every execution that
+flags data appends a new version to it, with only the flags that were newly set:
+- rows are stored as run-length encoded lists of consecutive rows containing new flags
+  (rows without new flags do not take any space),
+- the (nrow, nfreq, npol) mask of new flags of the rows in those runs is bit-packed (one bit
+  per visibility) and deflate-compressed, which collapses the long runs of equal bits.
+There is one record per processed chunk.
+
+Restoring a version clears those flags again (flags that were already set before are never
+in the journal, so they are kept), and removes the version from the journal.
+
+File layout:
+    MAGIC
+    for each version:
+        header line (JSON, with the MS shape and the parameters used)
+        records: startrow, nrow, nbytes (3 x int64) + nbytes of compressed runs and mask
+        end of version: startrow = -1
+
+Version: 1.1
+Date: Oct 2026
+
+version 1.1 changes
+- An interrupted version can be left open (close(completed=False)) and continued (resume=True),
+  for the executions resumed with flag_weights.py --resume and repair_ms.py --resume.
+"""
+
+import os
+import json
+import zlib
+import struct
+import datetime as dt
+import numpy as np
+
+
+MAGIC = b'EVNFLAGJOURNAL 1\n'
+_RECORD = struct.Struct('<qqq')
+
+
+def journal_name(msdata):
+    return msdata + '.flagjournal'
+
+
+def _runs_mask(runs, nrow):
+    """Boolean mask of nrow rows that is True within the given (offset, length) runs."""
+    steps = np.zeros(nrow+1, dtype=np.int64)
+    np.add.at(steps, runs[:,0], 1)
+    np.add.at(steps, runs[:,0]+runs[:,1], -1)
+    return np.cumsum(steps[:-1]) > 0
+
+
+def encode_runs(mask, runs):
+    """Returns the journal records for the given runs of rows of a chunk (one record covering
+    all runs, or none if there are no runs).
+
+    Inputs
+    ------
+      mask : 3-D bool array
+            New flags of the chunk, with shape (nrow, nfreq, npol).
+      runs : 2-D array-like
+            (offset, nrow) of the runs of rows with new flags (see msstream.row_runs()).
+
+    Outputs
+    -------
+      records : list of (offset, nrow, bytes)
+            offset and nrow are the rows spanned by the runs. The compressed bytes contain the
+            runs themselves followed by the bit-packed mask of the rows in the runs.
+    """
+    runs = np.asarray(runs, dtype=np.int64).reshape((-1, 2))
+    if len(runs) == 0:
+        return []
+    first = runs[0,0]
+    span = runs[-1,0] + runs[-1,1] - first
+    runs = runs - [first, 0]
+    bits = np.packbits(mask[first:first+span][_runs_mask(runs, span)], axis=None)
+    payload = struct.pack('<q', len(runs)) + runs.astype('<i8').tobytes() + bits.tobytes()
+    return [(int(first), int(span), zlib.compress(payload))]
+
+
+def decode_record(payload, nrow, cellshape):
+    """Returns the (nrow, nfreq, npol) bool mask stored in a record."""
+    payload = zlib.decompress(payload)
+    nruns = struct.unpack_from('<q', payload)[0]
+    runs = np.frombuffer(payload, dtype='<i8', count=2*nruns, offset=8).reshape((nruns, 2))
+    rows = _runs_mask(runs, nrow)
+    mask = np.zeros((nrow,) + tuple(cellshape), dtype=bool)
+    nbits = np.count_nonzero(rows)*int(np.prod(cellshape))
+    bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8, offset=8+16*nruns), count=nbits)
+    mask[rows] = bits.astype(bool).reshape((-1,) + tuple(cellshape))
+    return mask
+
+
+class FlagJournal(object):
+    """Appends a new version to the flag journal of a MS.
+
+    Inputs
+    ------
+      msdata : str
+            Name of the MS.
+      nrow : int
+            Number of rows of the MS.
+      cellshape : tuple
+            Shape of each FLAG cell (nfreq, npol).
+      params : dict
+            Parameters of the execution, stored in the header of the version.
+      resume : bool
+            If the last version was interrupted, continue it instead of adding a new version
+            (so restoring it undoes both executions).
+    """
+    def __init__(self, msdata, nrow, cellshape, params, resume=False):
+        self.filename = journal_name(msdata)
+        self.cellshape = tuple(int(i) for i in cellshape)
+        self.nbytes = 0
+        if os.path.isfile(self.filename) and os.path.getsize(self.filename) > 0:
+            versions = read_versions(msdata)
+            self._file = open(self.filename, 'r+b')
+            if (len(versions) > 0) and (not versions[-1]['complete']):
+                # A previous execution was interrupted: drop any partial record after its last valid one
+                self._file.truncate(versions[-1]['end'])
+                self._file.seek(versions[-1]['end'])
+                if resume:
+                    return
+                # and close its version
+                self._file.write(_RECORD.pack(-1, 0, 0))
+            else:
+                self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open(self.filename, 'wb')
+            self._file.write(MAGIC)
+
+        header = {'nrow': int(nrow), 'cellshape': self.cellshape,
+                  'date': dt.datetime.now().strftime('%Y/%m/%d %H:%M:%S'), 'params': params}
+        self._file.write((json.dumps(header)+'\n').encode())
+
+    def add(self, startrow, records):
+        """Adds the records (from encode_runs()) of a chunk starting at startrow."""
+        for offset, nrow, payload in records:
+            self._file.write(_RECORD.pack(startrow+offset, nrow, len(payload)))
+            self._file.write(payload)
+            self.nbytes += _RECORD.size + len(payload)
+        # The journal must always be ahead of the flags written in the MS
+        self._file.flush()
+
+    def close(self, completed=True):
+        """Closes the journal. If the execution did not complete, its version is left open so a
+        resumed execution can continue it."""
+        if completed:
+            self._file.write(_RECORD.pack(-1, 0, 0))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def read_versions(msdata):
+    """Reads the journal of the MS. Returns a list with, for each version, a dict with the
+    header, the file offset where it starts and its records as (startrow, nrow, payload).
+    A version interrupted before its end is also returned (all its records are valid), with
+    'complete' set to False and 'end' set to the offset after its last valid record.
+    """
+    versions = []
+    with open(journal_name(msdata), 'rb') as jfile:
+        if jfile.read(len(MAGIC)) != MAGIC:
+            raise ValueError('{} is not a flag journal.'.format(journal_name(msdata)))
+        while True:
+            offset = jfile.tell()
+            line = jfile.readline()
+            if len(line) == 0:
+                break
+            version = {'offset': offset, 'header': json.loads(line.decode()), 'records': [],
+                       'complete': False, 'end': jfile.tell()}
+            versions.append(version)
+            while True:
+                record = jfile.read(_RECORD.size)
+                if len(record) < _RECORD.size:
+                    return versions
+                startrow, nrow, nbytes = _RECORD.unpack(record)
+                if startrow < 0:
+                    version['complete'] = True
+                    break
+                payload = jfile.read(nbytes)
+                if len(payload) < nbytes:
+                    return versions
+                version['records'].append((startrow, nrow, payload))
+                version['end'] = jfile.tell()
+
+    return versions
+
+
+def drop_last_version(msdata, versions):
+    """Removes the last version from the journal (and the journal if it was the only one)."""
+    if len(versions) <= 1:
+        os.remove(journal_name(msdata))
+    else:
+        with open(journal_name(msdata), 'r+b') as jfile:
+            jfile.truncate(versions[-1]['offset'])
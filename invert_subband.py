@@ -2,31 +2,77 @@
 """
 Invert the subband for specified antennas.
 
-Usage: test_invert_subband.py msdata antennas [-sb SUBBANDS]
+Usage: invert_subband.py msdata antenna [-t1 STARTTIME] [-t2 ENDTIME] [-sb SUBBANDS] [--metadata] [--resume]
+       invert_subband.py msdata --materialize [--resume]
 Options:
-    msdata : str          MS data set containing the data to be swapged.
-    antennas : str        Antenna or list of antennas that require to be
-                          swapped. Use the two-letter name (e.g. Ef, Mc,
-                          or Jb2). In case of more than one station, please
-                          use either string 'Ef, Mc' or a non-spaced str:
-                          Ef,Mc,Ys.
-
-Version: 1.0
-Date: Nov 2018
+    msdata : str          MS data set containing the data to be inverted.
+    antenna : str         Antenna that requires to be inverted. Use the
+                          two-letter name (e.g. Ef, Mc, or Jb2).
+    -sb SUBBANDS : str    Subbands to invert, as a comma-separated list
+                          starting at 1 (as in AIPS), e.g. 1,2,5.
+                          By default all subbands.
+    --metadata            Relabel the data instead of moving them: a
+                          SPECTRAL_WINDOW row with the channels in reverse order
+                          (and a DATA_DESCRIPTION row using it) is added for each
+                          subband, and only the DATA_DESC_ID of the affected rows
+                          is rewritten.
+    --materialize         Reverse the channels of all the data relabeled with
+                          --metadata, and point them back to the original
+                          spectral windows.
+    --resume              Continue an interrupted execution (same parameters):
+                          only the rows not committed yet are processed.
+
+Version: 1.5
+Date: Oct 2026
 Written by Benito Marcote (marcote@jive.eu)
+
+version 1.5 changes (Oct 2026)
+- --resume option: the committed rows are recorded in a checkpoint next to the MS while it is
+  modified, and an interrupted execution continues from there (see checkpoint.py).
+- Times parsed with the shared time conversions from timeconv.py.
+- The rows to modify are taken from the row index of the MS if it is up to date (see rowindex.py),
+  instead of scanning ANTENNA1/ANTENNA2/TIME. The index is kept up to date.
+- Metadata-only mode (--metadata): the affected rows point to new SPECTRAL_WINDOW/DATA_DESCRIPTION
+  rows with reversed CHAN_FREQ, CHAN_WIDTH, EFFECTIVE_BW and RESOLUTION (and swapped NET_SIDEBAND
+  and mirrored REF_FREQUENCY), instead of reversing the data columns. Existing rows are reused
+  (inverting again goes back to the original DATA_DESC_ID).
+- --materialize reverses afterwards the data of the relabeled rows and restores their original
+  DATA_DESC_ID, for the tools that need the data in the original spectral windows.
+
+version 1.4 changes (Oct 2026)
+- --max-memory option. The chunk size is computed from the size of the rows (within that
+  memory budget), and the chunks are aligned to the tiles of the data columns.
+- --profile and --cprofile options (time, bytes and rows per phase and column, peak memory).
+
+version 1.3 changes (Oct 2026)
+- Only the given subbands can be inverted (-sb). They are mapped to the DATA_DESC_IDs that
+  use those spectral windows, and only those rows are read and written.
+- Channels reversed in place on views of the runs of consecutive rows (no copies of the
+  selected rows through fancy indexing).
+- --chunksize option (number of rows read at a time).
+
+version 1.2 changes (Oct 2026)
+- Only the rows with the antenna in the timerange are read and written (resolved first with
+  a TaQL query), instead of scanning the full MS. Times compared directly as MJD seconds.
+- The inversion can be imported (invert_subband() function) from other scripts.
+version 1.1 changes (Oct 2026)
+- Uses the shared chunk streaming from msstream.py (read-ahead and background writing).
+- Fixed the main loop (it iterated over undefined polarization changes). Rows containing the
+  antenna are now inverted once along the channel axis, and WEIGHT/SIGMA are left untouched.
 """
 
-import sys
-import copy
-import time
 import argparse
 from enum import IntEnum
-import datetime as dt
 import numpy as np
 from pyrap import tables as pt
+import msstream
+import timeconv
+import rowindex
+import checkpoint
 
 
-usage = "%(prog)s [-h] [-v] [-t1 STARTTIME] [-t2 ENDTIME]  <measurement set>  <antenna>"
+usage = "%(prog)s [-h] [-v] [-t1 STARTTIME] [-t2 ENDTIME] [-sb SUBBANDS] [--metadata] [--resume]  <measurement set>  <antenna>\n"\
+        "       %(prog)s [-h] [-v] --materialize [--resume]  <measurement set>"
 description="""Invert the subband for specified antennas.
 
 Fixes the problem when a subband is flipped (increasing frequency instead of decreasing along the
@@ -38,31 +84,12 @@ help_t1 = 'Start time of the data that need to be corrected. By default the begi
           +'In Aips format: YYYY/MM/DD/hh:mm:ss or YYYY/DOY/hh:mm:ss'
 help_t2 = 'Ending time of the data that need to be corrected. By default the ending of the observation.'\
           +'In Aips format: YYYY/MM/DD/hh:mm:ss or YYYY/DOY/hh:mm:ss'
-
-parser = argparse.ArgumentParser(description=description, prog='polswap.py', usage=usage)
-parser.add_argument('msdata', type=str, help=help_msdata)
-parser.add_argument('antenna', type=str, help=help_antenna)
-parser.add_argument('-t1', '--starttime', default=None, type=str, help=help_t1)
-parser.add_argument('-t2', '--endtime', default=None, type=str, help=help_t2)
-parser.add_argument('-v', '--version', action='version', version='%(prog)s 1.0')
-
-arguments = parser.parse_args()
-
-msdata = arguments.msdata[:-1] if arguments.msdata[-1]=='/' else arguments.msdata
-
-def cli_progress_bar(current_val, end_val, bar_length=40):
-        percent = current_val/end_val
-        hashes = '#'*int(round(percent*bar_length))
-        spaces = ' '*(bar_length-len(hashes))
-        sys.stdout.write("\rProgress: [{0}] {1}%".format(hashes+spaces, int(round(percent*100))))
-        sys.stdout.flush()
-
-
-def chunkert(f, l, cs, verbose=True):
-    while f<l:
-        n = min(cs, l-f)
-        yield (f, n)
-        f = f + n
+help_sb = 'Subbands to invert, as a comma-separated list (first subband is 1). By default all of them.'
+help_metadata = 'Do not modify the data: add SPECTRAL_WINDOW rows with the channels in reverse order '\
+                +'(and DATA_DESCRIPTION rows using them) and only change the DATA_DESC_ID of the affected rows.'
+help_materialize = 'Reorder the channels of the data relabeled before with --metadata, so they use the '\
+                   +'original spectral windows again (no antenna is given).'
+help_chunksize = 'Number of rows read at a time (default: ~4 MB of data, see --max-memory).'
 
 
 class Stokes(IntEnum):
@@ -104,68 +131,319 @@ class Stokes(IntEnum):
 
 
 
-def atime2datetime(atime):
-    """Converts a string with the form YYYY/MM/DD/hh:mm:ss or YYYY/DOY/hh:mm:ss to MJD"""
-    if atime.count('/') == 3:
-        # Format: YYYY/MM/DD/hh:mm:ss
-        return dt.datetime.strptime(atime, '%Y/%m/%d/%H:%M:%S')
-    if atime.count('/') == 2:
-        # Format: YYYY/DOY/hh:mm:ss
-        return dt.datetime.strptime(atime, '%Y/%j/%H:%M:%S')
-    else:
-        raise ValueError('Date format must be YYYY/MM/DD/hh:mm:ss or YYYY/DOY/hh:mm:ss')
+def rows_to_invert(chunk_data, antenna_number, starttime, endtime, ddids=None):
+    """Rows of the chunk containing the antenna (as ANTENNA1 or ANTENNA2) within the timerange
+    (MJD seconds, exclusive) and, if ddids is given, with those DATA_DESC_IDs."""
+    rows = ((chunk_data['ANTENNA1'] == antenna_number) | (chunk_data['ANTENNA2'] == antenna_number)) & \
+           (chunk_data['TIME'] > starttime) & (chunk_data['TIME'] < endtime)
+    if ddids is not None:
+        rows &= np.isin(chunk_data['DATA_DESC_ID'], ddids)
+    return rows
 
 
+def reverse_channels(ms_col, runs):
+    """Reverses in place the channel axis (axis 1) of the given runs of rows of ms_col.
 
-with pt.table(msdata, readonly=False, ack=False) as ms:
-    # Get CORR_TYPE, the polarization entries in the data
-    changes = None
+    Each run is a view of the array, and the two halves of the band are swapped through
+    reversed (strided) views, so only half a run is buffered at a time.
+    """
+    nchan = ms_col.shape[1]
+    half = nchan//2
+    for offset, n in runs:
+        rows = ms_col[offset:offset+n]
+        low = rows[:, :half].copy()
+        rows[:, :half] = rows[:, :nchan-half-1:-1]
+        rows[:, nchan-half:] = low[:, ::-1]
+
+
+def channel_columns(ms):
+    """Columns of the MS with a channel axis, which are the ones inverted."""
+    # shapes of DATA, FLOAT_DATA, FLAG, SIGMA_SPECTRUM, WEIGHT_SPECTRUM: (nrow, nfreq, npol)
+    # WEIGHT and SIGMA (nrow, npol) do not have a channel axis, so they are not modified.
+    columns = ('DATA', 'FLOAT_DATA', 'FLAG', 'SIGMA_SPECTRUM', 'WEIGHT_SPECTRUM')
+    return [a_col for a_col in columns if a_col in ms.colnames()]
+
+
+def flipped_spws(ms):
+    """Returns {spw: original spw} for the SPECTRAL_WINDOW rows added by invert_subband_metadata(),
+    i.e. the rows with the channels of an earlier row in reverse order.
+    """
+    with pt.table(ms.getkeyword('SPECTRAL_WINDOW'), readonly=True, ack=False) as ms_spw:
+        freqs = [ms_spw.getcell('CHAN_FREQ', i) for i in range(len(ms_spw))]
+    flipped = {}
+    for i in range(len(freqs)):
+        for j in range(i):
+            if (len(freqs[i]) > 1) and np.array_equal(freqs[i], freqs[j][::-1]):
+                flipped[i] = j
+                break
+    return flipped
+
+
+def resolve_selection(ms, antenna, starttime=None, endtime=None, subbands=None):
+    """Resolves the antenna, timerange (AIPS format) and subbands (first is 1) to invert.
+
+    Outputs
+    -------
+      antenna_number : int
+            Row of the antenna in the ANTENNA table.
+      starttime, endtime : float
+            Timerange in MJD seconds. By default the beginning and end of the observation.
+      ddids : list of int
+            DATA_DESC_IDs of the subbands (including their flipped copies, see flipped_spws()),
+            or None for all.
+      where : str
+            TaQL condition selecting the rows to invert.
+    """
     with pt.table(ms.getkeyword('ANTENNA'), readonly=True, ack=False) as ms_ant:
-        antenna_number = [i.upper() for i in ms_ant.getcol('NAME')].index(arguments.antenna.upper())
+        antenna_names = [i.upper() for i in ms_ant.getcol('NAME')]
+    if antenna.upper() not in antenna_names:
+        raise ValueError('Antenna {} not found in the MS (antennas: {}).'.format(antenna, ', '.join(antenna_names)))
+    antenna_number = antenna_names.index(antenna.upper())
 
     with pt.table(ms.getkeyword('OBSERVATION'), readonly=True, ack=False) as ms_obs:
-        time_range = (dt.datetime(1858, 11, 17, 0, 0, 2) + \
-                     ms_obs.getcol('TIME_RANGE')*dt.timedelta(seconds=1))[0]
+        time_range = ms_obs.getcol('TIME_RANGE')[0]
+
+    # Get the timerange to apply the inversion (MJD seconds)
+    starttime = timeconv.atime2mjds(starttime) if starttime is not None else time_range[0] - 1.0
+    endtime = timeconv.atime2mjds(endtime) if endtime is not None else time_range[1] + 1.0
+
+    where = msstream.antenna_time_condition([(antenna_number, starttime, endtime)])
+    ddids = None
+    if subbands is not None:
+        spws = [i-1 for i in subbands]
+        spws += [a_spw for a_spw, original in flipped_spws(ms).items() if original in spws]
+        ddids = [int(i) for i in msstream.subband_ddids(ms, [i+1 for i in spws])]
+        where += ' && DATA_DESC_ID IN [{}]'.format(','.join([str(i) for i in ddids]))
+    return antenna_number, float(starttime), float(endtime), ddids, where
 
-    # Get the timerange to apply to polswap
-    if arguments.starttime is not None:
-        datetimes_start = atime2datetime(arguments.starttime)
-    else:
-        datetimes_start = time_range[0] - dt.timedelta(seconds=1)
 
-    if arguments.endtime is not None:
-        datetimes_end = atime2datetime(arguments.endtime)
+def invert_subband(ms, antenna, starttime=None, endtime=None, subbands=None, chunksize=None,
+                   max_memory=None, checkpoint=None):
+    """Inverts the channel order of the subbands for the baselines of an antenna in the given timerange.
+
+    Inputs
+    ------
+      ms : pyrap.tables.table
+            The MS, opened with readonly=False.
+      antenna : str
+            Name of the antenna as it appears in the MS (case insensitive).
+      starttime, endtime : str
+            Timerange to invert, in AIPS format (YYYY/MM/DD/hh:mm:ss or YYYY/DOY/hh:mm:ss).
+            By default the beginning and end of the observation.
+      subbands : list of int
+            Subbands to invert (first subband is 1). By default all of them.
+      chunksize : int (optional)
+            Number of rows to process at a time. By default computed from max_memory.
+      max_memory : float (optional)
+            Memory budget in MB (see msstream.chunk_plan()).
+      checkpoint : checkpoint.Checkpoint (optional)
+            Only the rows not committed in it are processed, and the processed ones are committed.
+
+    Outputs
+    -------
+      nrows : int
+            Number of rows that have been modified.
+    """
+    antenna_number, starttime, endtime, ddids, where = resolve_selection(ms, antenna, starttime, endtime,
+                                                                         subbands)
+    columns = channel_columns(ms)
+    print('\nThe following columns will be modified: {}.\n'.format(', '.join(columns)))
+
+    # Only the chunks around the affected rows are read, aligned to the tiles of the columns
+    keycolumns = ('ANTENNA1', 'ANTENNA2', 'TIME', 'DATA_DESC_ID')
+    chunksize, align = msstream.chunk_plan(ms, list(keycolumns) + columns, chunksize, max_memory)
+    index = rowindex.load_index(ms)
+    rows = rowindex.select_rows(ms, index, where, windows=[(antenna_number, starttime, endtime)], ddids=ddids)
+    print('{} rows to modify ({:.2f}% of the MS).'.format(len(rows), 100.0*len(rows)/max(1, len(ms))))
+    with msstream.ChunkStreamer(ms, columns, chunks=msstream.rows_to_chunks(rows, chunksize, align=align),
+                                keycolumns=keycolumns, checkpoint=checkpoint) as stream:
+        for chunk in stream:
+            runs = msstream.row_runs(rows_to_invert(chunk.data, antenna_number, starttime, endtime, ddids))
+            for a_col in columns:
+                if len(chunk[a_col].shape) != 3:
+                    raise ValueError('Unexpected dimensions for {} column.'.format(a_col))
+                reverse_channels(chunk[a_col], runs)
+
+            # Only the modified rows are written
+            stream.write(chunk, {a_col: chunk[a_col] for a_col in columns}, runs=runs)
+
+    rowindex.update_index(ms, index)
+    return stream.rows_written
+
+
+def flipped_sideband(sideband, sidebands):
+    """Net sideband of a window with the channels in reverse order. Both conventions found in MSs
+    are supported: 1 (USB) / -1 (LSB), or 1 (USB) / 2 (LSB) if any row of the table (sidebands)
+    uses 2. Other values (0, unknown) are kept."""
+    if 2 in sidebands:
+        return {1: 2, 2: 1}.get(sideband, sideband)
+    return -sideband if sideband in (1, -1) else sideband
+
+
+def flipped_window_values(ms_spw, spw):
+    """Values of the channel columns of a SPECTRAL_WINDOW row with the channels in reverse order
+    (the widths change sign, as the frequencies go in the opposite direction). NET_SIDEBAND is
+    swapped, and REF_FREQUENCY is mirrored around the centre of the band, so it refers to the same
+    edge of the band as in the original row (e.g. the first channel). Flipping twice gives the
+    original values back, so find_or_add_row() reuses the original row when inverting again."""
+    values = {}
+    for a_col in ('CHAN_FREQ', 'CHAN_WIDTH', 'EFFECTIVE_BW', 'RESOLUTION'):
+        if a_col in ms_spw.colnames():
+            values[a_col] = ms_spw.getcell(a_col, spw)[::-1]
+    if 'CHAN_WIDTH' in values:
+        values['CHAN_WIDTH'] = -values['CHAN_WIDTH']
+    if ('REF_FREQUENCY' in ms_spw.colnames()) and ('CHAN_FREQ' in values):
+        freqs = values['CHAN_FREQ']
+        values['REF_FREQUENCY'] = (freqs[0] + freqs[-1]) - ms_spw.getcell('REF_FREQUENCY', spw)
+    if 'NET_SIDEBAND' in ms_spw.colnames():
+        values['NET_SIDEBAND'] = flipped_sideband(ms_spw.getcell('NET_SIDEBAND', spw),
+                                                  set(ms_spw.getcol('NET_SIDEBAND').tolist()))
+    return values
+
+
+def invert_subband_metadata(ms, antenna, starttime=None, endtime=None, subbands=None, chunksize=None,
+                            max_memory=None, checkpoint=None):
+    """Inverts the subbands for the baselines of an antenna in the given timerange by only relabeling
+    the data: a SPECTRAL_WINDOW row with the channels in reverse order (and a DATA_DESCRIPTION row
+    pointing to it) is added for each affected subband, or reused if it already exists, and the
+    DATA_DESC_ID of the affected rows is changed. The data columns are not read or written
+    (see materialize_flips() to reorder them afterwards).
+
+    The inputs and outputs are the same as in invert_subband().
+    """
+    antenna_number, starttime, endtime, ddids, where = resolve_selection(ms, antenna, starttime, endtime,
+                                                                         subbands)
+    index = rowindex.load_index(ms)
+    if index is not None:
+        rows = index.rows(windows=[(antenna_number, starttime, endtime)], ddids=ddids)
+        used_ddids = np.unique(index.ddid[rows])
     else:
-        datetimes_end = time_range[1] + dt.timedelta(seconds=1)
+        query = ms.query(query=where, columns='DATA_DESC_ID')
+        try:
+            rows = np.asarray(query.rownumbers(ms), dtype=np.int64)
+            used_ddids = np.unique(query.getcol('DATA_DESC_ID')) if len(rows) > 0 else []
+        finally:
+            query.close()
+    print('{} rows to modify ({:.2f}% of the MS).'.format(len(rows), 100.0*len(rows)/max(1, len(ms))))
+
+    with pt.table(ms.getkeyword('DATA_DESCRIPTION'), readonly=False, ack=False) as ms_dd, \
+         pt.table(ms.getkeyword('SPECTRAL_WINDOW'), readonly=False, ack=False) as ms_spw:
+        ddid_map = np.arange(len(ms_dd))
+        for ddid in used_ddids:
+            ddid = int(ddid)
+            spw, pol = ms_dd.getcell('SPECTRAL_WINDOW_ID', ddid), ms_dd.getcell('POLARIZATION_ID', ddid)
+            new_spw = msstream.find_or_add_row(ms_spw, flipped_window_values(ms_spw, spw), spw)
+            ddid_map[ddid] = msstream.find_or_add_row(ms_dd, {'SPECTRAL_WINDOW_ID': new_spw,
+                                                              'POLARIZATION_ID': pol}, ddid)
+            print('DATA_DESC_ID {} -> {} (spectral window {} -> {}).'.format(ddid, ddid_map[ddid], spw, new_spw))
+
+    # Only DATA_DESC_ID is written
+    keycolumns = ['ANTENNA1', 'ANTENNA2', 'TIME']
+    chunksize, align = msstream.chunk_plan(ms, keycolumns + ['DATA_DESC_ID'], chunksize, max_memory)
+    chunks = msstream.rows_to_chunks(rows, chunksize, align=align)
+    with msstream.ChunkStreamer(ms, ['DATA_DESC_ID'], chunks=chunks, keycolumns=keycolumns,
+                                checkpoint=checkpoint) as stream:
+        for chunk in stream:
+            to_invert = rows_to_invert(chunk.data, antenna_number, starttime, endtime, ddids)
+            chunk['DATA_DESC_ID'][to_invert] = ddid_map[chunk['DATA_DESC_ID'][to_invert]]
+            stream.write(chunk, {'DATA_DESC_ID': chunk['DATA_DESC_ID']}, runs=msstream.row_runs(to_invert))
+
+    if index is not None:
+        rowindex.update_index(ms, index, rows, ddid_map[index.ddid[rows]])
+    return stream.rows_written
 
 
+def materialize_flips(ms, chunksize=None, max_memory=None, checkpoint=None):
+    """Reorders the data of the rows relabeled by invert_subband_metadata(): the channels of all the
+    rows using a flipped spectral window (see flipped_spws()) are reversed, and the rows point back
+    to the DATA_DESCRIPTION with the original spectral window. Returns the number of rows modified.
+    If a checkpoint.Checkpoint is given, only the rows not committed in it are processed.
+    """
+    flipped = flipped_spws(ms)
+    with pt.table(ms.getkeyword('DATA_DESCRIPTION'), readonly=False, ack=False) as ms_dd:
+        ddid_map = np.arange(len(ms_dd))
+        for ddid in range(len(ms_dd)):
+            spw, pol = ms_dd.getcell('SPECTRAL_WINDOW_ID', ddid), ms_dd.getcell('POLARIZATION_ID', ddid)
+            if spw in flipped:
+                ddid_map[ddid] = msstream.find_or_add_row(ms_dd, {'SPECTRAL_WINDOW_ID': flipped[spw],
+                                                                  'POLARIZATION_ID': pol}, ddid)
+    ddids = np.flatnonzero(ddid_map != np.arange(len(ddid_map)))
+    if len(ddids) == 0:
+        print('No flipped spectral windows in use.')
+        return 0
 
-    columns = ('DATA', 'FLOAT_DATA', 'FLAG', 'SIGMA_SPECTRUM', 'WEIGHT_SPECTRUM',
-               'WEIGHT', 'SIGMA')
-    # shapes of DATA, FLOAT_DATA, FLAG, SIGMA_SPECTRUM, WEIGHT_SPECTRUM: (nrow, npol, nfreq)
-    # shapes of WEIGHT, SIGMA: (nrow, npol)
-    columns = [a_col for a_col in columns if a_col in ms.colnames()]
+    columns = channel_columns(ms)
     print('\nThe following columns will be modified: {}.\n'.format(', '.join(columns)))
+    index = rowindex.load_index(ms)
+    rows = rowindex.select_rows(ms, index, 'DATA_DESC_ID IN [{}]'.format(','.join([str(i) for i in ddids])),
+                                ddids=ddids)
+    print('{} rows to modify ({:.2f}% of the MS).'.format(len(rows), 100.0*len(rows)/max(1, len(ms))))
+    chunksize, align = msstream.chunk_plan(ms, ['DATA_DESC_ID'] + columns, chunksize, max_memory)
+    with msstream.ChunkStreamer(ms, columns, chunks=msstream.rows_to_chunks(rows, chunksize, align=align),
+                                keycolumns=['DATA_DESC_ID'], checkpoint=checkpoint) as stream:
+        for chunk in stream:
+            to_invert = np.isin(chunk['DATA_DESC_ID'], ddids)
+            runs = msstream.row_runs(to_invert)
+            for a_col in columns:
+                reverse_channels(chunk[a_col], runs)
+            chunk['DATA_DESC_ID'][to_invert] = ddid_map[chunk['DATA_DESC_ID'][to_invert]]
+            stream.write(chunk, {a_col: chunk[a_col] for a_col in columns + ['DATA_DESC_ID']}, runs=runs)
+
+    if index is not None:
+        rowindex.update_index(ms, index, rows, ddid_map[index.ddid[rows]])
+    return stream.rows_written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=description, prog='invert_subband.py', usage=usage)
+    parser.add_argument('msdata', type=str, help=help_msdata)
+    parser.add_argument('antenna', type=str, nargs='?', default=None, help=help_antenna)
+    parser.add_argument('-t1', '--starttime', default=None, type=str, help=help_t1)
+    parser.add_argument('-t2', '--endtime', default=None, type=str, help=help_t2)
+    parser.add_argument('-sb', '--subbands', default=None, type=str, help=help_sb)
+    parser.add_argument('--metadata', default=False, action='store_true', help=help_metadata)
+    parser.add_argument('--materialize', default=False, action='store_true', help=help_materialize)
+    parser.add_argument('--chunksize', default=None, type=int, help=help_chunksize)
+    msstream.add_memory_argument(parser)
+    msstream.add_profile_arguments(parser)
+    checkpoint.add_resume_argument(parser)
+    parser.add_argument('-v', '--version', action='version', version='%(prog)s 1.0')
+
+    arguments = parser.parse_args()
+
+    msdata = arguments.msdata[:-1] if arguments.msdata[-1]=='/' else arguments.msdata
+    if (arguments.antenna is None) != arguments.materialize:
+        parser.error('an antenna is required (unless --materialize is used, which takes none)')
 
-    for (start, nrow) in chunkert(0, len(ms), 5000):
-        cli_progress_bar(start, len(ms), bar_length=40)
-        for changei, antpos in zip(changes, ('ANTENNA1','ANTENNA2')):
-            ants = ms.getcol(antpos, startrow=start, nrow=nrow)
-            datetimes = dt.datetime(1858, 11, 17, 0, 0, 2) + \
-                        ms.getcol('TIME', startrow=start, nrow=nrow)*dt.timedelta(seconds=1)
-            cond = np.where((ants == antenna_number) & (datetimes > datetimes_start) & (datetimes < datetimes_end))
-            if len(cond[0]) > 0:
-                for a_col in columns:
-                    ms_col = ms.getcol(a_col, startrow=start, nrow=nrow)
-                    if len(ms_col.shape) == 3:
-                        ms_col[cond,] = ms_col[cond,][:,::-1,:]
-                    elif len(ms_col.shape) == 2:
-                        ms_col[cond,] = ms_col[cond,][:,::-1]
-                    else:
-                        raise ValueError('Unexpected dimensions for {} column.'.format(a_col))
+    profiler = msstream.start_profiler(arguments, msdata, 'invert_subband')
 
-                    ms.putcol(a_col, ms_col, startrow=start, nrow=nrow)
+    with pt.table(msdata, readonly=False, ack=False) as ms:
+        subbands = None
+        if arguments.subbands is not None:
+            subbands = [int(i) for i in arguments.subbands.replace(' ', '').split(',')]
+        params = {'antenna': arguments.antenna, 'starttime': arguments.starttime, 'endtime': arguments.endtime,
+                  'subbands': subbands, 'metadata': arguments.metadata, 'materialize': arguments.materialize}
+        try:
+            # The inputs are checked before the checkpoint is created
+            if not arguments.materialize:
+                resolve_selection(ms, arguments.antenna, arguments.starttime, arguments.endtime, subbands)
+            ckpt = checkpoint.Checkpoint(msdata, 'invert_subband', params, len(ms), resume=arguments.resume)
+        except ValueError as e:
+            parser.error(str(e))
 
+        with ckpt:
+            if ckpt.rows_committed > 0:
+                print('Resuming the interrupted execution ({} rows already done).'.format(ckpt.rows_committed))
+            if arguments.materialize:
+                materialize_flips(ms, arguments.chunksize, arguments.max_memory, ckpt)
+            elif arguments.metadata:
+                invert_subband_metadata(ms, arguments.antenna, arguments.starttime, arguments.endtime, subbands,
+                                        arguments.chunksize, arguments.max_memory, ckpt)
+            else:
+                invert_subband(ms, arguments.antenna, arguments.starttime, arguments.endtime, subbands,
+                               arguments.chunksize, arguments.max_memory, ckpt)
 
-print('\n{} modified correctly.'.format(msdata))
+    if profiler is not None:
+        profiler.stop()
 
+    print('\n{} modified correctly.'.format(msdata))
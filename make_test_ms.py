@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Creates a synthetic Measurement Set with the shape of a typical EVN experiment, to test and
+benchmark the tools that modify the MS (flag_weights.py, polswap.py, invert_subband.py,
+scale1bit.py, ysfocus.py) without real data. It only needs python-casacore and numpy.
+
+The data are random, but the layout is realistic: rows ordered by time, subband and baseline,
+several scans, and weights close to 1 with some periods of low weights for each antenna
+(so flag_weights.py has something to flag).
+
+Usage: make_test_ms.py [options] msdata
+Options:
+    msdata : str              Name of the MS to create.
+    --stations Ef,Mc,...      Stations (two-letter names). Default: 10 EVN stations.
+    --subbands N              Number of subbands (default: 8).
+    --channels N              Number of channels per subband (default: 32).
+    --pols N                  Number of polarization products: 1, 2 or 4 (default: 4).
+    --inttime S               Integration time in seconds (default: 2).
+    --duration S              Total time on source, in seconds (default: 600).
+    --scan-length S           Length of each scan, in seconds (default: 300).
+    --weight-spectrum         Also create the WEIGHT_SPECTRUM column.
+    --storage MANAGER         standard or tiled (default: standard).
+
+Version: 1.0
+Date: Oct 2026
+Written by Benito Marcote (marcote@jive.eu)
+"""
+
+import os
+import sys
+import argparse
+import numpy as np
+from pyrap import tables as pt
+import msstream
+import timeconv
+
+
+__version__ = 1.0
+
+# Station (full name) and mount for the antennas, as they appear in EVN MSs
+STATIONS = {'EF': ('EFLSBERG', 'ALT-AZ'), 'WB': ('WSTRBORK', 'EQUATORIAL'), 'JB': ('JODRELL1', 'ALT-AZ'),
+            'JB2': ('JODRELL2', 'ALT-AZ'), 'MC': ('MEDICINA', 'ALT-AZ'), 'NT': ('NOTO', 'ALT-AZ'),
+            'ON': ('ONSALA85', 'ALT-AZ'), 'O8': ('ONSALA60', 'ALT-AZ'), 'TR': ('TORUN', 'ALT-AZ'),
+            'YS': ('YEBES40M', 'ALT-AZ'), 'HH': ('HART', 'ALT-AZ'), 'SV': ('SVETLOE', 'ALT-AZ'),
+            'ZC': ('ZELENCHK', 'ALT-AZ'), 'BD': ('BADARY', 'ALT-AZ'), 'UR': ('URUMQI', 'ALT-AZ'),
+            'T6': ('TIANMA65', 'ALT-AZ'), 'SR': ('SARDINIA', 'ALT-AZ'), 'IR': ('IRBENE', 'ALT-AZ'),
+            'HO': ('HOBART', 'X_YEW'), 'KM': ('KUNMING', 'ALT-AZ'), 'CM': ('CAMBRIDG', 'ALT-AZ')}
+DEFAULT_STATIONS = 'Ef,Wb,Jb,Mc,Nt,On,Tr,Ys,Hh,Sv'
+
+# CORR_TYPE (circular pols) and CORR_PRODUCT for the different number of polarizations
+POLARIZATIONS = {1: ([5], [[0, 0]]), 2: ([5, 8], [[0, 0], [1, 1]]),
+                 4: ([5, 6, 7, 8], [[0, 0], [0, 1], [1, 0], [1, 1]])}
+
+# Approximate number of rows written at a time (memory does not grow with the MS size)
+ROWS_PER_WRITE = 20000
+
+
+usage = "%(prog)s [-h] [options] <measurement set>"
+description = """Creates a synthetic Measurement Set with the shape of a typical EVN experiment.
+
+The data are random, but the layout (rows, subbands, scans, weights) is realistic, so it can be
+used to test and benchmark the tools that modify the MS.
+"""
+help_msdata = 'Name of the MS to create.'
+help_stations = 'Comma-separated list of stations (default: {}).'.format(DEFAULT_STATIONS)
+help_subbands = 'Number of subbands (default: 8).'
+help_channels = 'Number of channels per subband (default: 32).'
+help_pols = 'Number of polarization products: 1, 2 or 4 (default: 4).'
+help_inttime = 'Integration time, in seconds (default: 2).'
+help_duration = 'Total time on source, in seconds (default: 600).'
+help_scanlength = 'Length of each scan, in seconds (default: 300). There is a 30-s gap between scans.'
+help_spectrum = 'Also create the WEIGHT_SPECTRUM column.'
+help_storage = 'Storage manager for the data columns: standard (StandardStMan) or tiled ' \
+               '(TiledShapeStMan). Default: standard.'
+help_start = 'Start time, in AIPS format (default: 2026/01/01/12:00:00).'
+help_lowweights = 'Fraction of the integrations with low weights, for each antenna (default: 0.02).'
+help_noautocorr = 'Do not include the autocorrelations.'
+help_seed = 'Seed for the random numbers (default: 0).'
+
+
+def table_description(nchan, npol, weight_spectrum=False, storage='standard'):
+    """Returns the description and data manager info of the data columns of the main table."""
+    columns = ['DATA', 'FLAG'] + (['WEIGHT_SPECTRUM'] if weight_spectrum else [])
+    coldescs = [pt.makearrcoldesc('DATA', 0j, shape=[nchan, npol], valuetype='complex'),
+                pt.makearrcoldesc('FLAG', False, shape=[nchan, npol], valuetype='boolean')]
+    if weight_spectrum:
+        coldescs.append(pt.makearrcoldesc('WEIGHT_SPECTRUM', 0.0, shape=[nchan, npol], valuetype='float'))
+
+    dminfo = {}
+    if storage == 'tiled':
+        # Tiles of ~64k visibilities, containing all channels and polarizations of each row
+        tileshape = np.array([npol, nchan, max(1, 65536//(npol*nchan))], dtype=np.int32)
+        for i, a_col in enumerate(columns):
+            dminfo['*{}'.format(i+1)] = {'TYPE': 'TiledShapeStMan', 'NAME': 'Tiled{}'.format(a_col),
+                                         'SPEC': {'DEFAULTTILESHAPE': tileshape}, 'COLUMNS': [a_col]}
+    elif storage != 'standard':
+        raise ValueError('Unknown storage manager {} (standard or tiled expected).'.format(storage))
+
+    return pt.maketabdesc(coldescs), dminfo
+
+
+def fill_subtables(ms, stations, nspw, nchan, npol, time_range, reffreq=4.926e9, bandwidth=16e6):
+    """Writes the ANTENNA, POLARIZATION, SPECTRAL_WINDOW, DATA_DESCRIPTION, FIELD and OBSERVATION rows."""
+    with pt.table(ms.getkeyword('ANTENNA'), readonly=False, ack=False) as ms_ant:
+        ms_ant.addrows(len(stations))
+        ms_ant.putcol('NAME', [a_station.upper() for a_station in stations])
+        ms_ant.putcol('STATION', [STATIONS.get(a_station.upper(), (a_station.upper(),))[0]
+                                  for a_station in stations])
+        ms_ant.putcol('MOUNT', [STATIONS.get(a_station.upper(), (None, 'ALT-AZ'))[1] for a_station in stations])
+        ms_ant.putcol('TYPE', ['GROUND-BASED']*len(stations))
+        ms_ant.putcol('DISH_DIAMETER', np.full(len(stations), 32.0))
+
+    with pt.table(ms.getkeyword('POLARIZATION'), readonly=False, ack=False) as ms_pol:
+        corr_type, corr_product = POLARIZATIONS[npol]
+        ms_pol.addrows(1)
+        ms_pol.putcell('NUM_CORR', 0, npol)
+        ms_pol.putcell('CORR_TYPE', 0, np.array(corr_type, dtype=np.int32))
+        ms_pol.putcell('CORR_PRODUCT', 0, np.array(corr_product, dtype=np.int32))
+
+    with pt.table(ms.getkeyword('SPECTRAL_WINDOW'), readonly=False, ack=False) as ms_spw:
+        ms_spw.addrows(nspw)
+        chanwidth = bandwidth/nchan
+        for i in range(nspw):
+            ms_spw.putcell('NUM_CHAN', i, nchan)
+            ms_spw.putcell('CHAN_FREQ', i, reffreq + i*bandwidth + np.arange(nchan)*chanwidth)
+            for a_col in ('CHAN_WIDTH', 'EFFECTIVE_BW', 'RESOLUTION'):
+                ms_spw.putcell(a_col, i, np.full(nchan, chanwidth))
+            ms_spw.putcell('REF_FREQUENCY', i, reffreq + i*bandwidth)
+            ms_spw.putcell('TOTAL_BANDWIDTH', i, bandwidth)
+            ms_spw.putcell('NAME', i, 'SB{}'.format(i+1))
+
+    with pt.table(ms.getkeyword('DATA_DESCRIPTION'), readonly=False, ack=False) as ms_dd:
+        ms_dd.addrows(nspw)
+        ms_dd.putcol('SPECTRAL_WINDOW_ID', np.arange(nspw, dtype=np.int32))
+        ms_dd.putcol('POLARIZATION_ID', np.zeros(nspw, dtype=np.int32))
+
+    with pt.table(ms.getkeyword('FIELD'), readonly=False, ack=False) as ms_field:
+        ms_field.addrows(1)
+        ms_field.putcell('NAME', 0, 'J0000+0000')
+
+    with pt.table(ms.getkeyword('OBSERVATION'), readonly=False, ack=False) as ms_obs:
+        ms_obs.addrows(1)
+        ms_obs.putcell('TIME_RANGE', 0, np.array(time_range))
+        ms_obs.putcell('TELESCOPE_NAME', 0, 'EVN')
+        ms_obs.putcell('OBSERVER', 0, 'SYNTHETIC')
+
+
+def make_ms(msdata, stations, nspw=8, nchan=32, npol=4, inttime=2.0, duration=600.0, scan_length=300.0,
+            weight_spectrum=False, storage='standard', starttime='2026/01/01/12:00:00', lowweights=0.02,
+            autocorr=True, seed=0):
+    """Creates the synthetic MS msdata (see the header for the description of the parameters).
+    Returns the number of rows.
+    """
+    nant = len(stations)
+    baselines = np.array([(a1, a2) for a1 in range(nant) for a2 in range(a1 if autocorr else a1+1, nant)])
+    nbl = len(baselines)
+    # Integrations of all scans, with 30 s gaps between them
+    t_on_source = np.arange(int(round(duration/inttime)))*inttime
+    times = timeconv.atime2mjds(starttime) + inttime/2.0 + t_on_source + 30.0*(t_on_source//scan_length)
+    scans = (t_on_source//scan_length).astype(np.int32) + 1
+    rows_per_time = nspw*nbl
+    nrow = len(times)*rows_per_time
+
+    desc, dminfo = table_description(nchan, npol, weight_spectrum, storage)
+    rng = np.random.default_rng(seed)
+    with pt.default_ms(msdata, desc, dminfo) as ms:
+        fill_subtables(ms, stations, nspw, nchan, npol, (times[0]-inttime/2.0, times[-1]+inttime/2.0))
+        ms.addrows(nrow)
+        ntimes = max(1, ROWS_PER_WRITE//rows_per_time)
+        for i in range(0, len(times), ntimes):
+            msstream.cli_progress_bar(i, len(times))
+            t = times[i:i+ntimes]
+            n = len(t)*rows_per_time
+            startrow = i*rows_per_time
+            # Rows ordered by time, subband and baseline
+            ms.putcol('TIME', np.repeat(t, rows_per_time), startrow, n)
+            ms.putcol('TIME_CENTROID', np.repeat(t, rows_per_time), startrow, n)
+            ms.putcol('INTERVAL', np.full(n, inttime), startrow, n)
+            ms.putcol('EXPOSURE', np.full(n, inttime), startrow, n)
+            ms.putcol('SCAN_NUMBER', np.repeat(scans[i:i+ntimes], rows_per_time), startrow, n)
+            ms.putcol('ANTENNA1', np.tile(baselines[:,0], n//nbl).astype(np.int32), startrow, n)
+            ms.putcol('ANTENNA2', np.tile(baselines[:,1], n//nbl).astype(np.int32), startrow, n)
+            ms.putcol('DATA_DESC_ID', np.tile(np.repeat(np.arange(nspw, dtype=np.int32), nbl), len(t)),
+                      startrow, n)
+            ms.putcol('UVW', rng.normal(scale=1e6, size=(n, 3)), startrow, n)
+            data = np.empty((n, nchan, npol), dtype=np.complex64)
+            data.real = rng.normal(size=data.shape)
+            data.imag = rng.normal(size=data.shape)
+            ms.putcol('DATA', data, startrow, n)
+            ms.putcol('FLAG', np.zeros((n, nchan, npol), dtype=bool), startrow, n)
+            ms.putcol('FLAG_ROW', np.zeros(n, dtype=bool), startrow, n)
+            # Weights per antenna and integration: ~1, with some periods of low weights
+            ant_weights = rng.uniform(0.9, 1.0, size=(len(t), nant))
+            low = rng.random(size=ant_weights.shape) < lowweights
+            ant_weights[low] = rng.uniform(0.0, 0.3, size=np.count_nonzero(low))
+            weights = (ant_weights[:, baselines[:,0]]*ant_weights[:, baselines[:,1]])
+            weights = np.tile(weights, (1, nspw)).reshape(n, 1)*np.ones((1, npol))
+            ms.putcol('WEIGHT', weights.astype(np.float32), startrow, n)
+            ms.putcol('SIGMA', (1.0/np.sqrt(np.maximum(weights, 1e-6))).astype(np.float32), startrow, n)
+            if weight_spectrum:
+                spectrum = weights[:, np.newaxis, :]*rng.uniform(0.98, 1.0, size=(n, nchan, npol))
+                ms.putcol('WEIGHT_SPECTRUM', spectrum.astype(np.float32), startrow, n)
+
+        msstream.cli_progress_bar(1, 1)
+        sys.stdout.write('\n')
+
+    return nrow
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=description, prog='make_test_ms.py', usage=usage)
+    parser.add_argument('msdata', type=str, help=help_msdata)
+    parser.add_argument('--stations', type=str, default=DEFAULT_STATIONS, help=help_stations)
+    parser.add_argument('--subbands', type=int, default=8, help=help_subbands)
+    parser.add_argument('--channels', type=int, default=32, help=help_channels)
+    parser.add_argument('--pols', type=int, default=4, choices=(1, 2, 4), help=help_pols)
+    parser.add_argument('--inttime', type=float, default=2.0, help=help_inttime)
+    parser.add_argument('--duration', type=float, default=600.0, help=help_duration)
+    parser.add_argument('--scan-length', type=float, default=300.0, help=help_scanlength)
+    parser.add_argument('--weight-spectrum', default=False, action='store_true', help=help_spectrum)
+    parser.add_argument('--storage', type=str, default='standard', choices=('standard', 'tiled'), help=help_storage)
+    parser.add_argument('--start', type=str, default='2026/01/01/12:00:00', help=help_start)
+    parser.add_argument('--low-weights', type=float, default=0.02, help=help_lowweights)
+    parser.add_argument('--no-autocorr', default=False, action='store_true', help=help_noautocorr)
+    parser.add_argument('--seed', type=int, default=0, help=help_seed)
+    parser.add_argument('--version', action='version', version='%(prog)s {}'.format(__version__))
+    arguments = parser.parse_args()
+
+    msdata = arguments.msdata[:-1] if arguments.msdata[-1]=='/' else arguments.msdata
+    if os.path.exists(msdata):
+        parser.error('{} already exists.'.format(msdata))
+
+    nrow = make_ms(msdata, arguments.stations.replace(' ', '').split(','), arguments.subbands,
+                   arguments.channels, arguments.pols, arguments.inttime, arguments.duration,
+                   arguments.scan_length, arguments.weight_spectrum, arguments.storage, arguments.start,
+                   arguments.low_weights, not arguments.no_autocorr, arguments.seed)
+    print('{} created with {} rows.'.format(msdata, nrow))
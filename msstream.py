@@ -0,0 +1,781 @@
+#!/usr/bin/env python3
+"""
+Shared chunked access to the columns of a Measurement Set, used by the tools that
+rewrite data in place (flag_weights.py, polswap.py, invert_subband.py).
+
+The MS is processed in chunks of rows. A background thread reads chunk N+1 while chunk N
+is being processed by the caller, and a second thread writes chunk N-1 back to the MS at
+the same time. All the accesses to the table are serialized through a lock (casacore tables
+are not thread safe), but disk I/O and the numpy work of the caller overlap, so the total
+time gets close to max(read+write, compute) instead of read+compute+write.
+
+Typical use:
+
+    with pt.table(msdata, readonly=False, ack=False) as ms:
+        with msstream.ChunkStreamer(ms, ['FLAG', 'WEIGHT']) as stream:
+            for chunk in stream:
+                flags = chunk['FLAG'] | ...
+                stream.write(chunk, FLAG=flags)
+
+SharedChunkSlots provides chunk-sized buffers in shared memory, so that the data read by
+one process can be processed by other ones without pickling the arrays.
+
+A Profiler can be attached to the streaming (or started for the whole tool, with the --profile
+option added by add_profile_arguments()) to measure the time, bytes and rows spent reading,
+computing and writing each column, and the peak memory.
+
+Tools that only modify a small part of the MS can resolve first the affected rows with a
+TaQL query (select_rows()) and only read and write the chunks around them (rows_to_chunks()).
+
+The chunk size is chosen by chunk_plan() from the size of the rows, within a memory budget (the
+--max-memory option added by add_memory_argument()), and aligned to the tiles of the tiled columns.
+
+Version: 1.8
+Date: Oct 2026
+
+version 1.8 changes
+- ChunkStreamer accepts a checkpoint.Checkpoint: only the rows not committed yet are processed,
+  and the processed chunks are committed to it once written (see checkpoint.py, --resume).
+- atime2mjds() moved to timeconv.py (vectorized time conversions shared with the ANTAB tools).
+version 1.7 changes
+- find_or_add_row() added (moved from polswap.py), to add relabeled subtable rows only once.
+version 1.6 changes
+- chunk_plan(): chunk size from the size of the rows and a memory budget, aligned to whole
+  tiles of the tiled columns, and table cache sized to the tiles of one chunk. column_storage() describes the data managers.
+- chunkert() and rows_to_chunks() can align the chunks to the tiles.
+
+version 1.5 changes
+- Profiler added: time/bytes/rows per phase and column, storage and cache configuration of the
+  columns, peak memory (tracemalloc and RSS), JSON report and optional cProfile output.
+version 1.4 changes
+- select_rows() and rows_to_chunks() added, to process only the rows matching a TaQL condition.
+- antenna_time_condition() added (TaQL condition for antennas within timeranges).
+- subband_ddids() added (moved from invert_subband.py).
+version 1.3 changes
+- atime2mjds() added to convert AIPS times to the MS TIME units.
+version 1.2 changes
+- ChunkStreamer.write() can write only some runs of rows of the chunk (see row_runs()).
+version 1.1 changes
+- SharedChunkSlots added (shared memory buffers for multi-process tools).
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import cProfile
+import threading
+import tracemalloc
+import datetime as dt
+import numpy as np
+from multiprocessing import shared_memory
+from pyrap import tables as pt
+import timeconv
+
+
+# Sentinel to mark the end of the reading/writing queues
+_END = object()
+
+# Default memory budget (MB) used to choose the chunk size (see chunk_plan())
+DEFAULT_MAX_MEMORY = 256
+# Default size of a chunk (MB). Larger chunks do not make the I/O faster (allocating and
+# filling the larger arrays is actually slower), they only use more memory
+CHUNK_MB = 4
+# Chunks held in memory by a ChunkStreamer (read-ahead, write-behind, the one being processed)
+# plus the table cache
+CHUNKS_IN_MEMORY = 6
+
+
+def chunkert(f, l, cs, verbose=True, align=1):
+    """Yields (startrow, nrow) for consecutive chunks of cs rows from row f to row l.
+    If align > 1 (cs must be a multiple of it), the first chunk is shortened so that all the
+    following chunks start at a multiple of align (e.g. at the first row of a tile).
+    """
+    while f<l:
+        n = min(cs - f % align, l-f)
+        yield (f, n)
+        f = f + n
+
+
+def cli_progress_bar(current_val, end_val, bar_length=40):
+        percent = current_val/end_val if end_val > 0 else 1.0
+        hashes = '#'*int(round(percent*bar_length))
+        spaces = ' '*(bar_length-len(hashes))
+        sys.stdout.write("\rProgress: [{0}] {1}%".format(hashes+spaces, int(round(percent*100))))
+        sys.stdout.flush()
+
+
+class Chunk(object):
+    """A chunk of consecutive rows read from the MS.
+
+    The arrays read for each column can be accessed as chunk[column].
+    """
+    def __init__(self, index, startrow, nrow, data):
+        self.index = index
+        self.startrow = startrow
+        self.nrow = nrow
+        self.data = data
+        # Set when the chunk is passed to ChunkStreamer.write()
+        self.scheduled = False
+
+    def __getitem__(self, column):
+        return self.data[column]
+
+    def __contains__(self, column):
+        return column in self.data
+
+    def __repr__(self):
+        return 'Chunk(startrow={}, nrow={}, columns={})'.format(self.startrow, self.nrow,
+                                                               list(self.data.keys()))
+
+
+class ChunkStreamer(object):
+    """Reads the given columns of a MS in chunks with read-ahead, and writes back the
+    modified arrays asynchronously.
+
+    Inputs
+    ------
+      ms : pyrap.tables.table
+            The (opened) Measurement Set. It must be writable if write() is called.
+      columns : list of str
+            Columns to read for every chunk.
+      chunks : list of (startrow, nrow) tuples (optional)
+            Row ranges to process. By default the full MS in chunks of chunksize rows.
+      chunksize : int
+            Number of rows per chunk if chunks is not provided. Default: 5000.
+      keycolumns : list of str (optional)
+            Columns that are read first for each chunk, to decide whether the chunk has to be
+            processed at all (see select).
+      select : callable (optional)
+            Function taking a dict {column: array} with the keycolumns of a chunk and returning
+            False if the chunk can be skipped. In that case the rest of the columns are not read.
+      readahead : int
+            Maximum number of chunks read in advance. Default: 2.
+      writebehind : int
+            Maximum number of chunks waiting to be written. Default: 2.
+      progress : bool
+            Show a progress bar. Default: True.
+      profiler : Profiler (optional)
+            Records the time spent in each phase. By default the profiler started with
+            Profiler.start(), if any.
+      checkpoint : checkpoint.Checkpoint (optional)
+            Only the rows of the chunks that are not committed in the checkpoint are processed.
+            Each chunk is committed once its arrays are written and the MS flushed (write() must
+            be called only once per chunk), or once the caller is done with it if it is not written.
+
+    Note that the memory used is around (readahead + writebehind + 1) chunks.
+    """
+    def __init__(self, ms, columns, chunks=None, chunksize=5000, keycolumns=None, select=None,
+                 readahead=2, writebehind=2, progress=True, profiler=None, checkpoint=None):
+        self.ms = ms
+        self.profiler = profiler if profiler is not None else _active_profiler
+        self.keycolumns = list(keycolumns) if keycolumns is not None else []
+        self.columns = [a_col for a_col in columns if a_col not in self.keycolumns]
+        self.chunks = list(chunks) if chunks is not None else list(chunkert(0, len(ms), chunksize))
+        self.checkpoint = checkpoint
+        if checkpoint is not None:
+            self.chunks = checkpoint.pending(self.chunks)
+        self.select = select
+        self.progress = progress
+        self.total_rows = sum([n for s, n in self.chunks])
+        self._lock = threading.Lock()
+        self._read_queue = queue.Queue(maxsize=max(1, readahead))
+        self._write_queue = queue.Queue(maxsize=max(1, writebehind))
+        self._stop = threading.Event()
+        self._error = None
+        self._reader_thread = None
+        self._writer_thread = None
+        self._rows_done = 0
+        self.rows_written = 0
+
+    def __enter__(self):
+        if self.profiler is not None:
+            self.profiler.describe_storage(self.ms, self.keycolumns + self.columns)
+        self._reader_thread = threading.Thread(target=self._reader, name='msstream-reader', daemon=True)
+        self._writer_thread = threading.Thread(target=self._writer, name='msstream-writer', daemon=True)
+        self._reader_thread.start()
+        self._writer_thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Chunks already passed to write() are still written (and committed) if the caller failed
+        self._close()
+        if self.progress and exc_type is None:
+            cli_progress_bar(1, 1)
+            sys.stdout.write('\n')
+        if exc_type is None and self._error is not None:
+            raise self._error
+        return False
+
+    def _put(self, a_queue, item):
+        """Puts an item in a bounded queue unless the streaming has been stopped."""
+        while not self._stop.is_set():
+            try:
+                a_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _flush(self):
+        with self._lock:
+            self.ms.flush()
+
+    def _done(self, chunk, written=False):
+        """Commits a chunk in the checkpoint (once all its writes are in the MS)."""
+        if self.checkpoint is not None:
+            self.checkpoint.done(chunk.startrow, chunk.nrow, self._flush if written else None)
+
+    def _getcols(self, columns, startrow, nrow):
+        with self._lock:
+            if self.profiler is None:
+                return {a_col: self.ms.getcol(a_col, startrow=startrow, nrow=nrow) for a_col in columns}
+            data = {}
+            for a_col in columns:
+                t0 = time.perf_counter()
+                data[a_col] = self.ms.getcol(a_col, startrow=startrow, nrow=nrow)
+                self.profiler.add('read', a_col, time.perf_counter()-t0, data[a_col].nbytes, nrow)
+            return data
+
+    def _reader(self):
+        try:
+            for i, (startrow, nrow) in enumerate(self.chunks):
+                if self._stop.is_set():
+                    break
+                data = self._getcols(self.keycolumns, startrow, nrow)
+                if (self.select is not None) and (not self.select(data)):
+                    data = None
+                else:
+                    data.update(self._getcols(self.columns, startrow, nrow))
+
+                if not self._put(self._read_queue, Chunk(i, startrow, nrow, data)):
+                    break
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._put(self._read_queue, _END)
+
+    def _writer(self):
+        while True:
+            item = self._write_queue.get()
+            if item is _END:
+                break
+            if self._error is not None:
+                # Something failed: drain the queue without writing
+                continue
+            chunk, arrays, runs = item
+            try:
+                written = (len(arrays) > 0) and (len(runs) > 0)
+                if written and (self.checkpoint is not None):
+                    self.checkpoint.writing(chunk.startrow, chunk.nrow)
+                with self._lock:
+                    for a_col, an_array in arrays.items():
+                        t0 = time.perf_counter()
+                        for offset, nrow in runs:
+                            self.ms.putcol(a_col, an_array[offset:offset+nrow],
+                                           startrow=chunk.startrow+offset, nrow=nrow)
+                        if self.profiler is not None:
+                            nrows = sum([n for o, n in runs])
+                            self.profiler.add('write', a_col, time.perf_counter()-t0,
+                                              an_array[:1].nbytes*nrows, nrows)
+                self._done(chunk, written)
+            except BaseException as e:
+                self._fail(e)
+
+    def _close(self):
+        # The writer must always receive the end mark to finish all the pending writes.
+        while True:
+            try:
+                self._write_queue.put(_END, timeout=0.1)
+                break
+            except queue.Full:
+                if not self._writer_thread.is_alive():
+                    break
+        self._writer_thread.join()
+        # Unblock the reader if it is still waiting to put chunks in the queue
+        self._stop.set()
+        while self._reader_thread.is_alive():
+            try:
+                self._read_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self._reader_thread.join()
+
+    def __iter__(self):
+        while True:
+            t0 = time.perf_counter()
+            try:
+                chunk = self._read_queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._error is not None:
+                    raise self._error
+                if self.profiler is not None:
+                    self.profiler.add('wait', None, time.perf_counter()-t0)
+                continue
+            if self.profiler is not None:
+                self.profiler.add('wait', None, time.perf_counter()-t0)
+            if self._error is not None:
+                raise self._error
+            if chunk is _END:
+                break
+            if self.progress:
+                cli_progress_bar(self._rows_done, self.total_rows)
+            self._rows_done += chunk.nrow
+            if chunk.data is None:
+                # Skipped by select
+                self._done(chunk)
+                continue
+            t0 = time.perf_counter()
+            yield chunk
+            if not chunk.scheduled:
+                # Nothing to write for this chunk
+                self._done(chunk)
+            if self.profiler is not None:
+                # Time spent by the caller with the chunk
+                self.profiler.add('compute', None, time.perf_counter()-t0, 0, chunk.nrow)
+
+    def write(self, chunk, arrays=None, runs=None, **kwargs):
+        """Schedules the writing of the given arrays (as a dict {column: array} or as keyword
+        arguments) into the rows of the chunk. The arrays must not be modified afterwards.
+
+        If runs is given (as returned by row_runs()), only those runs of rows of the chunk are
+        written. Nothing is written if runs is empty.
+        """
+        arrays = dict(arrays) if arrays is not None else {}
+        arrays.update(kwargs)
+        if self._error is not None:
+            raise self._error
+        if runs is None:
+            runs = [(0, chunk.nrow)]
+        if (len(arrays) > 0) and (len(runs) > 0):
+            chunk.scheduled = True
+            self._put(self._write_queue, (chunk, arrays, runs))
+            self.rows_written += sum([n for s, n in runs])
+
+
+# Moved to timeconv.py (vectorized). Kept here for the scripts that use it from msstream
+MJD_ORIGIN = timeconv.MJD_ORIGIN
+atime2mjds = timeconv.atime2mjds
+
+
+def row_runs(mask):
+    """Returns the runs of consecutive True values in a 1-D boolean array, as an array of
+    (offset, length) pairs.
+    """
+    edges = np.diff(np.concatenate(([0], np.asarray(mask, dtype=np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return np.stack((starts, ends - starts), axis=-1)
+
+
+def select_rows(ms, where):
+    """Returns the (sorted) row numbers of the MS that fulfill the TaQL condition where,
+    e.g. 'ANTENNA1 == 3 || ANTENNA2 == 3'. Only the columns used in the condition are read.
+    """
+    selection = ms.query(query=where)
+    try:
+        return np.asarray(selection.rownumbers(ms), dtype=np.int64)
+    finally:
+        selection.close()
+
+
+def antenna_time_condition(windows):
+    """TaQL condition selecting the rows with any of the antennas (as ANTENNA1 or ANTENNA2)
+    within its timerange. windows is a list of (antenna_number, starttime, endtime), with the
+    times in MJD seconds (exclusive).
+    """
+    return ' || '.join(['((ANTENNA1 == {0} || ANTENNA2 == {0}) && TIME > {1!r} && TIME < {2!r})'.format(
+                        int(antenna_number), float(starttime), float(endtime))
+                        for antenna_number, starttime, endtime in windows])
+
+
+def subband_ddids(ms, subbands):
+    """Returns the DATA_DESC_IDs of the given subbands (spectral windows, starting at 1)."""
+    with pt.table(ms.getkeyword('SPECTRAL_WINDOW'), readonly=True, ack=False) as ms_spw:
+        nspw = len(ms_spw)
+    for a_subband in subbands:
+        if not 1 <= a_subband <= nspw:
+            raise ValueError('Subband {} not found: the MS has {} subbands.'.format(a_subband, nspw))
+    with pt.table(ms.getkeyword('DATA_DESCRIPTION'), readonly=True, ack=False) as ms_dd:
+        spw_ids = ms_dd.getcol('SPECTRAL_WINDOW_ID')
+    return np.flatnonzero(np.isin(spw_ids, np.array(subbands) - 1))
+
+
+def find_or_add_row(table, values, template):
+    """Returns the row of the (sub)table with the given {column: value}, adding a copy of the
+    template row with those values if there is none yet. Used to add the relabeled POLARIZATION,
+    SPECTRAL_WINDOW and DATA_DESCRIPTION rows only once.
+    """
+    for a_row in range(len(table)):
+        if all([np.array_equal(table.getcell(a_col, a_row), a_value) for a_col, a_value in values.items()]):
+            return a_row
+    new_row = len(table)
+    table.addrows(1)
+    for a_col in table.colnames():
+        if table.iscelldefined(a_col, template):
+            table.putcell(a_col, new_row, values[a_col] if a_col in values else table.getcell(a_col, template))
+    return new_row
+
+
+def rows_to_chunks(rows, chunksize=5000, maxgap=100, align=1):
+    """Groups the given (sorted) row numbers into chunks of contiguous rows.
+
+    Rows closer than maxgap rows are kept in the same chunk (reading a few extra rows is
+    cheaper than one more access to the table), so the chunks can contain rows that were not
+    requested: the caller still needs to check which rows of each chunk have to be modified.
+    With align > 1 the chunks start at multiples of align rows whenever possible (see
+    chunk_plan()), and never overlap. Rows within align rows are then always kept together,
+    as they are likely stored in the same tile.
+
+    Outputs
+    -------
+      chunks : list of (startrow, nrow) tuples
+            With nrow <= chunksize. It can be passed to ChunkStreamer.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    if len(rows) == 0:
+        return []
+    maxgap = max(maxgap, align)
+    breaks = np.flatnonzero(np.diff(rows) > maxgap+1)
+    firsts = rows[np.concatenate(([0], breaks+1))]
+    lasts = rows[np.concatenate((breaks, [len(rows)-1]))]
+    chunks = []
+    end = 0
+    for first, last in zip(firsts, lasts):
+        first = max(end, int(first) - int(first) % align)
+        end = int(last) + 1
+        chunks += list(chunkert(first, end, chunksize, align=align))
+    return chunks
+
+
+def table_mtime(msdata):
+    """Returns the last modification time of the files of the main table of the MS (subtables are
+    not considered). Any change in the stored data or in the number of rows updates it.
+    """
+    return max([os.path.getmtime(os.path.join(msdata, a_file)) for a_file in os.listdir(msdata)
+                if os.path.isfile(os.path.join(msdata, a_file))])
+
+
+def column_layout(ms, columns):
+    """Returns a dict {column: (shape per row, dtype)} for the given (fixed-shape) columns,
+    taken from the first row of the MS.
+    """
+    layout = {}
+    for a_col in columns:
+        a_cell = np.asarray(ms.getcol(a_col, startrow=0, nrow=1))
+        layout[a_col] = (tuple(a_cell.shape[1:]), a_cell.dtype.str)
+    return layout
+
+
+def column_storage(ms, columns):
+    """Returns a dict {column: info} describing how the given columns are stored. info contains
+    the data manager ('manager', 'name') and, for the tiled columns, 'tile_shape' (casacore
+    order, with the rows last), 'tile_rows', 'bucket_bytes' (bytes per tile) and 'cell_tiles'
+    (number of tiles needed to cover the cells of one range of tile_rows rows).
+    Only the first hypercube is considered (the MS columns have fixed shapes).
+    """
+    dminfo = {}
+    for a_dm in ms.getdminfo().values():
+        for a_col in a_dm['COLUMNS']:
+            dminfo[a_col] = a_dm
+    storage = {}
+    for a_col in columns:
+        if a_col not in dminfo:
+            continue
+        a_dm = dminfo[a_col]
+        info = {'manager': a_dm['TYPE'], 'name': a_dm['NAME']}
+        hypercubes = a_dm.get('SPEC', {}).get('HYPERCUBES', {})
+        if len(hypercubes) > 0:
+            a_cube = list(hypercubes.values())[0]
+            tile_shape = np.asarray(a_cube['TileShape'], dtype=np.int64)
+            cell_shape = np.asarray(a_cube['CellShape'], dtype=np.int64)
+            info['tile_shape'] = [int(i) for i in tile_shape]
+            info['tile_rows'] = int(tile_shape[-1])
+            info['bucket_bytes'] = int(a_cube['BucketSize'])
+            info['cell_tiles'] = int(np.prod(-(-cell_shape // tile_shape[:-1])))
+        elif 'BUCKETSIZE' in a_dm.get('SPEC', {}):
+            info['bucket_bytes'] = int(a_dm['SPEC']['BUCKETSIZE'])
+        storage[a_col] = info
+    return storage
+
+
+def chunk_plan(ms, columns, chunksize=None, max_memory=None, nchunks=CHUNKS_IN_MEMORY):
+    """Chooses the number of rows per chunk to stream the given columns of the MS, and sets the
+    cache of the tiled columns to hold the tiles of one chunk.
+
+    The chunks are aligned to whole tiles of the tiled columns (TiledShapeStMan,
+    TiledColumnStMan...), so each tile is read and decoded only once instead of once for each
+    chunk that cuts across it.
+
+    Inputs
+    ------
+      ms : pyrap.tables.table
+            The (opened) Measurement Set.
+      columns : list of str
+            Columns that are read for every chunk.
+      chunksize : int (optional)
+            Number of rows requested. It is rounded down to whole tiles. By default the rows
+            that fit in CHUNK_MB, given the size of each row of the columns (so it adapts to
+            the number of channels and polarizations).
+      max_memory : float (optional)
+            Memory budget, in MB, for the chunks held at the same time (and the table cache).
+            Default: DEFAULT_MAX_MEMORY. The chunk size is reduced to fit in it.
+      nchunks : int
+            Number of chunks held in memory at the same time (by default the ones from a
+            ChunkStreamer with the default read-ahead and write-behind, plus the cache).
+
+    Outputs
+    -------
+      chunksize : int
+            Number of rows per chunk.
+      align : int
+            Number of rows of the tiles (1 if no column is tiled). The chunks produced by
+            chunkert() and rows_to_chunks() with this align start at the first row of a tile.
+    """
+    layout = column_layout(ms, columns)
+    row_bytes = sum([int(np.prod(shape))*np.dtype(dtype).itemsize for shape, dtype in layout.values()])
+    storage = column_storage(ms, columns)
+    tiled = {a_col: info for a_col, info in storage.items() if 'tile_rows' in info}
+    row_bytes = max(1, row_bytes)
+    max_rows = int((max_memory or DEFAULT_MAX_MEMORY)*1e6 // (max(1, nchunks)*row_bytes))
+    if chunksize is None:
+        chunksize = int(CHUNK_MB*1e6 // row_bytes)
+    chunksize = max(1, min(chunksize, max_rows, len(ms)))
+
+    align = 1
+    if len(tiled) > 0:
+        align = int(np.lcm.reduce([info['tile_rows'] for info in tiled.values()]))
+        if align > chunksize:
+            # Columns with different tiles: at least keep the largest ones whole
+            align = max([info['tile_rows'] for info in tiled.values()])
+        if align <= chunksize:
+            chunksize -= chunksize % align
+        else:
+            # Chunks smaller than one tile: the cache keeps the tile between chunks
+            align = 1
+
+    for a_col, info in tiled.items():
+        # Tiles spanned by one chunk (one more in case it does not start at the beginning of a tile)
+        ntiles = (-(-chunksize // info['tile_rows']) + 1)*info['cell_tiles']
+        ms.setmaxcachesize(a_col, ntiles*info['bucket_bytes'])
+
+    return chunksize, align
+
+
+def add_memory_argument(parser):
+    """Adds the --max-memory option to the argparse parser of a tool."""
+    parser.add_argument('--max-memory', type=float, default=None, metavar='MB',
+                        help='Memory budget for the data held at the same time, in MB (default: {}). '
+                             'By default chunks of ~{} MB are read, aligned to the tiles of the data '
+                             'columns, as long as they fit in the budget.'.format(DEFAULT_MAX_MEMORY, CHUNK_MB))
+
+
+class SharedChunkSlots(object):
+    """A set of slots in shared memory, each one able to hold the arrays of one chunk of
+    (up to) chunksize rows for the given columns.
+
+    The process that creates them (create=True) owns the memory and must call unlink() at the
+    end. Other processes attach to the same slots by creating the object with the same
+    arguments and create=False.
+
+    Inputs
+    ------
+      layout : dict
+            {column: (shape per row, dtype)} as returned by column_layout().
+      nslots : int
+            Number of chunks that can be held at the same time.
+      chunksize : int
+            Maximum number of rows per chunk.
+      names : dict (optional)
+            {column: name of the shared memory block}. Required when create=False.
+    """
+    def __init__(self, layout, nslots, chunksize, names=None, create=True):
+        self.layout = layout
+        self.nslots = nslots
+        self.chunksize = chunksize
+        self._blocks = {}
+        self._arrays = {}
+        for a_col, (rowshape, dtype) in layout.items():
+            shape = (nslots, chunksize) + tuple(rowshape)
+            nbytes = max(1, int(np.prod(shape))*np.dtype(dtype).itemsize)
+            if create:
+                self._blocks[a_col] = shared_memory.SharedMemory(create=True, size=nbytes)
+            else:
+                self._blocks[a_col] = shared_memory.SharedMemory(name=names[a_col])
+            self._arrays[a_col] = np.ndarray(shape, dtype=dtype, buffer=self._blocks[a_col].buf)
+
+    @property
+    def names(self):
+        return {a_col: a_block.name for a_col, a_block in self._blocks.items()}
+
+    def arrays(self, slot, nrow):
+        """Returns {column: array} with the (contiguous) views for the first nrow rows of the slot."""
+        return {a_col: an_array[slot, :nrow] for a_col, an_array in self._arrays.items()}
+
+    def close(self):
+        self._arrays = {}
+        for a_block in self._blocks.values():
+            a_block.close()
+
+    def unlink(self):
+        self.close()
+        for a_block in self._blocks.values():
+            a_block.unlink()
+
+
+# Profiler used by default by ChunkStreamer (see Profiler.start())
+_active_profiler = None
+
+
+def peak_rss():
+    """Returns the peak resident memory of this process, in bytes (or None if not available)."""
+    try:
+        with open('/proc/self/status', 'r') as status:
+            for a_line in status:
+                if a_line.startswith('VmHWM'):
+                    return int(a_line.split()[1])*1024
+    except OSError:
+        return None
+
+
+class Profiler(object):
+    """Collects the wall time, bytes and rows of each phase (read, compute, write, and wait for
+    the data being read) per column while a tool runs, plus the peak memory.
+
+    Inputs
+    ------
+      tool : str
+            Name of the tool, stored in the report.
+      report : str (optional)
+            JSON file where the report is written by stop().
+      cprofile : str (optional)
+            File where the cProfile statistics (of the main thread) are dumped by stop().
+    """
+    def __init__(self, tool, report=None, cprofile=None):
+        self.tool = tool
+        self.report_file = report
+        self.cprofile_file = cprofile
+        self.phases = {}
+        self.storage = {}
+        self._lock = threading.Lock()
+        self._cprofile = None
+        self._t0 = None
+
+    def start(self):
+        """Starts the timing and memory tracing, and makes this profiler the default one for
+        all ChunkStreamers."""
+        global _active_profiler
+        _active_profiler = self
+        tracemalloc.start()
+        if self.cprofile_file is not None:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        self._t0 = time.perf_counter()
+        return self
+
+    def add(self, phase, column, seconds, nbytes=0, nrows=0):
+        """Adds an interval to the totals of the phase and column (None if not column-specific)."""
+        with self._lock:
+            totals = self.phases.setdefault((phase, column), [0.0, 0, 0, 0])
+            totals[0] += float(seconds)
+            totals[1] += int(nbytes)
+            totals[2] += int(nrows)
+            totals[3] += 1
+
+    def describe_storage(self, ms, columns):
+        """Stores the data manager, tile/bucket shape and cache size of the given columns."""
+        columns = [a_col for a_col in columns if a_col not in self.storage]
+        for a_col, info in column_storage(ms, columns).items():
+            try:
+                info['cache'] = {k: int(v) for k, v in ms.getdmprop(a_col).items()}
+            except RuntimeError:
+                pass
+            self.storage[a_col] = info
+
+    def stop(self):
+        """Stops the profiling, writes the report and cProfile files (if requested), prints a
+        one-line summary and returns the report as a dict."""
+        global _active_profiler
+        elapsed = time.perf_counter() - self._t0
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.cprofile_file)
+        current, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if _active_profiler is self:
+            _active_profiler = None
+
+        report = {'tool': self.tool, 'date': dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                  'wall_seconds': elapsed, 'peak_traced_bytes': traced_peak, 'peak_rss_bytes': peak_rss(),
+                  'phases': {}, 'columns': [], 'storage': self.storage}
+        for (phase, column), (seconds, nbytes, nrows, calls) in sorted(self.phases.items(),
+                                                                      key=lambda x: (x[0][0], str(x[0][1]))):
+            totals = report['phases'].setdefault(phase, {'seconds': 0.0, 'bytes': 0, 'rows': 0})
+            totals['seconds'] += seconds
+            totals['bytes'] += nbytes
+            if column is not None:
+                report['columns'].append({'phase': phase, 'column': column, 'seconds': seconds,
+                                          'bytes': nbytes, 'rows': nrows, 'calls': calls,
+                                          'mb_per_s': nbytes/1e6/seconds if seconds > 0 else None})
+            else:
+                totals['rows'] += nrows
+        # Rows read or written by the tool, and tiles accessed per call for the tiled columns
+        for an_entry in report['columns']:
+            totals = report['phases'][an_entry['phase']]
+            totals['rows'] = max(totals['rows'], an_entry['rows'])
+            tile_shape = self.storage.get(an_entry['column'], {}).get('tile_shape')
+            if tile_shape is not None:
+                an_entry['tiles_per_call'] = an_entry['rows']/max(1, an_entry['calls'])/tile_shape[-1]
+
+        if self.report_file is not None:
+            with open(self.report_file, 'w') as reportf:
+                json.dump(report, reportf, indent=1)
+        print('\n' + self.summary(report))
+        return report
+
+    def summary(self, report):
+        """One-line summary of a report."""
+        parts = ['Profile: {:.2f} s'.format(report['wall_seconds'])]
+        for phase in ('read', 'compute', 'write', 'wait'):
+            if phase in report['phases']:
+                totals = report['phases'][phase]
+                a_part = '{} {:.2f} s'.format(phase, totals['seconds'])
+                if totals['bytes'] > 0:
+                    a_part += ' ({:.1f} MB, {:.1f} MB/s)'.format(totals['bytes']/1e6,
+                              totals['bytes']/1e6/max(totals['seconds'], 1e-9))
+                parts.append(a_part)
+        if report['peak_rss_bytes'] is not None:
+            parts.append('peak RSS {:.0f} MB'.format(report['peak_rss_bytes']/1e6))
+        parts.append('peak traced {:.0f} MB'.format(report['peak_traced_bytes']/1e6))
+        if self.report_file is not None:
+            parts.append('report in {}'.format(self.report_file))
+        return ' | '.join(parts)
+
+
+def active_profiler():
+    """Returns the profiler started with Profiler.start() (or None)."""
+    return _active_profiler
+
+
+def add_profile_arguments(parser):
+    """Adds the --profile and --cprofile options to the argparse parser of a tool."""
+    parser.add_argument('--profile', type=str, nargs='?', default=None, const='', metavar='REPORT',
+                        help='Measure the time, bytes and rows spent reading, computing and writing each '
+                             'column, and the peak memory. The JSON report is written to REPORT '
+                             '(default: <msdata>.<tool>.profile.json).')
+    parser.add_argument('--cprofile', type=str, default=None, metavar='FILE',
+                        help='Also dump the cProfile statistics of the execution to FILE (implies --profile).')
+
+
+def start_profiler(arguments, msdata, tool):
+    """Starts a Profiler if --profile or --cprofile were given. Returns it (or None)."""
+    if (arguments.profile is None) and (arguments.cprofile is None):
+        return None
+    report = arguments.profile if arguments.profile else '{}.{}.profile.json'.format(msdata, tool)
+    return Profiler(tool, report, arguments.cprofile).start()
@@ -2,7 +2,8 @@
 """
 Swap polarizations for specified antennas and for a specific timerange.
 
-Usage: polswap.py msdata antennas [-sb SUBBANDS]
+Usage: polswap.py msdata antenna [-t1 STARTTIME] [-t2 ENDTIME] [--metadata] [--resume]
+       polswap.py msdata --spec SPECFILE [--metadata] [--resume]
 Options:
     msdata : str          MS data set containing the data to be swapged.
     antennas : str        Antenna or list of antennas that require to be
@@ -10,11 +11,53 @@ Options:
                           or Jb2). In case of more than one station, please
                           use either string 'Ef, Mc' or a non-spaced str:
                           Ef,Mc,Ys.
-
-Version: 3.0
-Date: March 2020
+    --spec SPECFILE       Text file with one antenna and (optionally) its start and
+                          end time per line, e.g.:
+                              Ef  2020/03/01/10:00:00  2020/03/01/12:30:00
+                              Mc  2020/061/11:00:00    2020/061/11:20:00
+                              Jb2
+                          A '-' can be used for an open start or end. All lines
+                          are applied in a single pass over the data.
+    --metadata            Relabel the data instead of moving them: new
+                          POLARIZATION rows with the swapped products (and the
+                          DATA_DESCRIPTION rows using them) are added, and only
+                          the DATA_DESC_ID of the affected rows is rewritten.
+    --resume              Continue an interrupted execution (same parameters):
+                          only the rows not committed yet are processed.
+
+Version: 3.5
+Date: October 2026
 Written by Benito Marcote (marcote@jive.eu)
 
+version 3.5 changes (October 2026)
+- --resume option: the committed rows are recorded in a checkpoint next to the MS while it is
+  modified, and an interrupted execution continues from there (see checkpoint.py).
+- Times parsed with the shared time conversions from timeconv.py.
+- The rows to modify are taken from the row index of the MS if it is up to date (see rowindex.py),
+  instead of scanning ANTENNA1/ANTENNA2/TIME. The index is kept up to date.
+- Metadata-only mode (--metadata): the affected rows point to new POLARIZATION/DATA_DESCRIPTION
+  rows with the swapped CORR_TYPE and CORR_PRODUCT, instead of permuting the data columns.
+  Rows with both antennas swapped get their own relabeling, and existing rows are reused
+  (so swapping again goes back to the original DATA_DESC_ID).
+version 3.4 changes (October 2026)
+- --max-memory option. The chunk size is computed from the size of the rows (within that
+  memory budget), and the chunks are aligned to the tiles of the data columns.
+- --profile and --cprofile options (time, bytes and rows per phase and column, peak memory).
+version 3.3 changes (October 2026)
+- Spec file mode (--spec): several antennas and timeranges are corrected in the same pass.
+  Baselines where both antennas are swapped get both permutations.
+- --chunksize option (number of rows read at a time).
+version 3.2 changes (October 2026)
+- Times compared directly as MJD seconds (no datetime objects per row).
+- The rows to swap for ANTENNA1 and ANTENNA2 are computed together, and each side is
+  swapped with a single np.take per column. Only the modified rows are written back.
+- The polswap can be imported (polswap() function) from other scripts.
+- Only the rows with the antenna in the timerange are read and written (resolved first with
+  a TaQL query), instead of scanning the full MS.
+version 3.1 changes (October 2026)
+- Uses the shared chunk streaming from msstream.py (read-ahead and background writing).
+- Each data column is read and written only once per chunk, and chunks without the
+  antenna in the timerange are skipped without reading the data columns.
 version 3.0 changes (March 2020)
 - Columns with different dimensions grouped together in code.
 - Fix memory bug.
@@ -30,17 +73,18 @@ version 1.2 changes (July 2018)
 
 """
 
-import sys
-import copy
-import time
 import argparse
 from enum import IntEnum
-import datetime as dt
 import numpy as np
 from pyrap import tables as pt
+import msstream
+import timeconv
+import rowindex
+import checkpoint
 
 
-usage = "%(prog)s [-h] [-v] [-t1 STARTTIME] [-t2 ENDTIME]  <measurement set>  <antenna>"
+usage = "%(prog)s [-h] [-v] [-t1 STARTTIME] [-t2 ENDTIME] [--metadata] [--resume]  <measurement set>  <antenna>\n"\
+        "       %(prog)s [-h] [-v] --spec SPECFILE [--metadata] [--resume]  <measurement set>"
 description="""Swap polarizations for specified antennas.
 
 Fixes the polarizations of an antenna that have been labeled incorrectly (R or X corresponds to L or Y,
@@ -55,28 +99,13 @@ help_t1 = 'Start time of the data that need to be corrected. By default the begi
           +'In Aips format: YYYY/MM/DD/hh:mm:ss or YYYY/DOY/hh:mm:ss'
 help_t2 = 'Ending time of the data that need to be corrected. By default the ending of the observation.'\
           +'In Aips format: YYYY/MM/DD/hh:mm:ss or YYYY/DOY/hh:mm:ss'
-
-parser = argparse.ArgumentParser(description=description, prog='polswap.py', usage=usage)
-parser.add_argument('msdata', type=str, help=help_msdata)
-parser.add_argument('antenna', type=str, help=help_antenna)
-parser.add_argument('-t1', '--starttime', default=None, type=str, help=help_t1)
-parser.add_argument('-t2', '--endtime', default=None, type=str, help=help_t2)
-parser.add_argument('-v', '--version', action='version', version='%(prog)s 1.0')
-# parser.add_argument('--verbose', default=False, action='store_true')
-# parser.add_argument('--timing', default=False, action='store_true')
-
-arguments = parser.parse_args()
-
-msdata = arguments.msdata[:-1] if arguments.msdata[-1]=='/' else arguments.msdata
-
-
-
-def cli_progress_bar(current_val, end_val, bar_length=40):
-        percent = current_val/end_val
-        hashes = '#'*int(round(percent*bar_length))
-        spaces = ' '*(bar_length-len(hashes))
-        sys.stdout.write("\rProgress: [{0}] {1}%".format(hashes+spaces, int(round(percent*100))))
-        sys.stdout.flush()
+help_chunksize = 'Number of rows read at a time (default: ~4 MB of data, see --max-memory).'
+help_metadata = 'Do not modify the data: add POLARIZATION and DATA_DESCRIPTION rows with the swapped '\
+                +'products and only change the DATA_DESC_ID of the affected rows (much faster for large data '\
+                +'sets, e.g. when an antenna is mislabeled for the whole observation).'
+help_spec = 'File with one antenna to correct per line, optionally followed by the start and end time '\
+            +'(Aips format, or - for the beginning/ending of the observation). All of them are '\
+            +'corrected in a single pass over the data.'
 
 
 class Stokes(IntEnum):
@@ -118,25 +147,6 @@ class Stokes(IntEnum):
 
 
 
-def chunkert(f, l, cs, verbose=True):
-    while f<l:
-        n = min(cs, l-f)
-        yield (f, n)
-        f = f + n
-
-
-def atime2datetime(atime):
-    """Converts a string with the form YYYY/MM/DD/hh:mm:ss or YYYY/DOY/hh:mm:ss to datetime"""
-    if atime.count('/') == 3:
-        # Format: YYYY/MM/DD/hh:mm:ss
-        return dt.datetime.strptime(atime, '%Y/%m/%d/%H:%M:%S')
-    if atime.count('/') == 2:
-        # Format: YYYY/DOY/hh:mm:ss
-        return dt.datetime.strptime(atime, '%Y/%j/%H:%M:%S')
-    else:
-        raise ValueError('Date format must be YYYY/MM/DD/hh:mm:ss or YYYY/DOY/hh:mm:ss')
-
-
 def get_nedded_move(products, ant_order):
     """Returns the transposing necessary to do a polswap in one of the stations.
     Inputs
@@ -166,12 +176,10 @@ def get_nedded_move(products, ant_order):
     return np.array([pols_prod.index(i) for i in pols_prod_mod])
 
 
-with pt.table(msdata, readonly=False, ack=False) as ms:
-    # Get CORR_TYPE, the polarization entries in the data
-    changes = None
-    with pt.table(ms.getkeyword('ANTENNA'), readonly=True, ack=False) as ms_ant:
-        antenna_number = [i.upper() for i in ms_ant.getcol('NAME')].index(arguments.antenna.upper())
-
+def polswap_changes(ms):
+    """Returns the transposition of the polarizations (see get_nedded_move()) needed to swap
+    the polarizations of the antenna when it is ANTENNA1 and ANTENNA2 in the given MS.
+    """
     with pt.table(ms.getkeyword('POLARIZATION'), readonly=True, ack=False) as ms_pol:
         pols_order = [Stokes(i) for i in ms_pol.getcol('CORR_TYPE')[0]]
         # Check that the stokes are the correct ones to do a cross pol.
@@ -184,60 +192,333 @@ with pt.table(msdata, readonly=False, ack=False) as ms:
 
                 print('Polswap only works for circular or linear pols (or both combined).')
                 print('These data contain the following stokes: {}'.format(pols_order))
-                ms.close()
                 raise ValueError('Wrong stokes type.')
 
         # Get the column changes that are necessary
         pols_prod = ms_pol.getcol('CORR_PRODUCT')[0]
-        # print(pols_prod)
-        changes = [get_nedded_move(pols_prod, i) for i in (0, 1)]
+        return [get_nedded_move(pols_prod, i) for i in (0, 1)]
 
-    # transpose data for columns DATA, WEIGHT_SPECTRUM (if exists)
-    # ants = [ms.getcol('ANTENNA1'), ms.getcol('ANTENNA2')]
+
+def read_spec(specfile):
+    """Reads a polswap spec file (antenna [starttime [endtime]] per line, with '#' comments).
+
+    Returns a list of (antenna, starttime, endtime) with the times as str (None for '-' or
+    if not given).
+    """
+    windows = []
+    with open(specfile, 'r') as spec:
+        for a_line in spec:
+            fields = a_line.split('#')[0].split()
+            if len(fields) == 0:
+                continue
+            if len(fields) > 3:
+                raise ValueError('Wrong line in {}: {}'.format(specfile, a_line.strip()))
+            fields = [None if a_field == '-' else a_field for a_field in fields] + [None]*(3-len(fields))
+            windows.append(tuple(fields))
+    return windows
+
+
+def resolve_windows(ms, windows):
+    """Converts a list of (antenna, starttime, endtime) as in read_spec() into a list of
+    (antenna_number, starttime, endtime) with the times in MJD seconds. Missing times are
+    set to the beginning or ending of the observation.
+    """
+    with pt.table(ms.getkeyword('ANTENNA'), readonly=True, ack=False) as ms_ant:
+        antenna_names = [i.upper() for i in ms_ant.getcol('NAME')]
 
     with pt.table(ms.getkeyword('OBSERVATION'), readonly=True, ack=False) as ms_obs:
-        time_range = (dt.datetime(1858, 11, 17, 0, 0, 2) + \
-                     ms_obs.getcol('TIME_RANGE')*dt.timedelta(seconds=1))[0]
+        time_range = ms_obs.getcol('TIME_RANGE')[0]
 
-    # Get the timerange to apply to polswap
-    if arguments.starttime is not None:
-        datetimes_start = atime2datetime(arguments.starttime)
-    else:
-        datetimes_start = time_range[0] - dt.timedelta(seconds=1)
+    mjd_windows = []
+    for antenna, starttime, endtime in windows:
+        if antenna.upper() not in antenna_names:
+            raise ValueError('Antenna {} not found in the MS (antennas: {}).'.format(antenna,
+                             ', '.join(antenna_names)))
+        starttime = timeconv.atime2mjds(starttime) if starttime is not None else time_range[0] - 1.0
+        endtime = timeconv.atime2mjds(endtime) if endtime is not None else time_range[1] + 1.0
+        mjd_windows.append((antenna_names.index(antenna.upper()), float(starttime), float(endtime)))
+    return mjd_windows
+
+
+def rows_to_swap(chunk_data, windows):
+    """Rows of the chunk where any of the antennas is ANTENNA1 and ANTENNA2 within its timerange.
+
+    Inputs
+    ------
+      chunk_data : dict
+            Must contain the ANTENNA1, ANTENNA2 and TIME columns of the chunk.
+      windows : list of (antenna_number, starttime, endtime)
+            Number (row in the ANTENNA table) of each antenna to swap, and its timerange
+            (exclusive), in MJD seconds as in the TIME column.
+
+    Outputs
+    -------
+      rows : 2-D bool array
+            (2, nrow) array with the rows to swap for ANTENNA1 and for ANTENNA2.
+            Rows where both antennas are swapped are True in both.
+    """
+    antennas = np.stack((chunk_data['ANTENNA1'], chunk_data['ANTENNA2']))
+    rows = np.zeros(antennas.shape, dtype=bool)
+    for antenna_number, starttime, endtime in windows:
+        in_time = (chunk_data['TIME'] > starttime) & (chunk_data['TIME'] < endtime)
+        rows |= (antennas == antenna_number) & in_time
+    return rows
 
-    if arguments.endtime is not None:
-        datetimes_end = atime2datetime(arguments.endtime)
-    else:
-        datetimes_end = time_range[1] + dt.timedelta(seconds=1)
 
-    # shapes of DATA, FLOAT_DATA, FLAG, SIGMA_SPECTRUM, WEIGHT_SPECTRUM: (nrow, npol, nfreq)
+def swap_chunk(chunk_data, columns, rows, changes):
+    """Swaps (in place) the polarizations of the given columns of a chunk.
+
+    rows and changes are the outputs of rows_to_swap() and polswap_changes(), respectively.
+    The polarization is always the last axis of the columns. Rows swapped on both sides get
+    both permutations, one after the other (they act on different antennas of the products).
+    """
+    for side_rows, changei in zip(rows, changes):
+        side_rows = np.flatnonzero(side_rows)
+        if len(side_rows) > 0:
+            for a_col in columns:
+                chunk_data[a_col][side_rows] = np.take(chunk_data[a_col][side_rows], changei, axis=-1)
+
+
+def polswap(ms, antenna, starttime=None, endtime=None, chunksize=None, max_memory=None):
+    """Swaps the polarizations of an antenna in the given timerange.
+
+    Inputs
+    ------
+      ms : pyrap.tables.table
+            The MS, opened with readonly=False.
+      antenna : str
+            Name of the antenna as it appears in the MS (case insensitive).
+      starttime, endtime : str
+            Timerange to swap, in AIPS format (YYYY/MM/DD/hh:mm:ss or YYYY/DOY/hh:mm:ss).
+            By default the beginning and end of the observation.
+      chunksize : int (optional)
+            Number of rows to process at a time. By default computed from max_memory.
+      max_memory : float (optional)
+            Memory budget in MB (see msstream.chunk_plan()).
+
+    Outputs
+    -------
+      nrows : int
+            Number of rows that have been modified.
+    """
+    return polswap_windows(ms, [(antenna, starttime, endtime)], chunksize=chunksize, max_memory=max_memory)
+
+
+def polswap_windows(ms, windows, chunksize=None, max_memory=None, checkpoint=None):
+    """Swaps the polarizations of several antennas, each one in its timerange, in a single pass.
+
+    Inputs
+    ------
+      ms : pyrap.tables.table
+            The MS, opened with readonly=False.
+      windows : list of (antenna, starttime, endtime)
+            As the inputs of polswap() (e.g. from read_spec()). The same antenna can appear
+            several times.
+      chunksize : int (optional)
+            Number of rows to process at a time. By default computed from max_memory.
+      max_memory : float (optional)
+            Memory budget in MB (see msstream.chunk_plan()).
+      checkpoint : checkpoint.Checkpoint (optional)
+            Only the rows not committed in it are processed, and the processed ones are committed.
+
+    Outputs
+    -------
+      nrows : int
+            Number of rows that have been modified.
+    """
+    changes = polswap_changes(ms)
+    mjd_windows = resolve_windows(ms, windows)
+
+    # shapes of DATA, FLOAT_DATA, FLAG, SIGMA_SPECTRUM, WEIGHT_SPECTRUM: (nrow, nfreq, npol)
     # shapes of WEIGHT, SIGMA: (nrow, npol)
     columns = ('DATA', 'FLOAT_DATA', 'FLAG', 'SIGMA_SPECTRUM', 'WEIGHT_SPECTRUM',
                'WEIGHT', 'SIGMA')
     # Only leave the ones that are in the MS. Not all of them are always present.
     columns = [a_col for a_col in columns if a_col in ms.colnames()]
     print('\nThe following columns will be modified: {}.\n'.format(', '.join(columns)))
-    for (start, nrow) in chunkert(0, len(ms), 5000):
-        cli_progress_bar(start, len(ms), bar_length=40)
-        for changei, antpos in zip(changes, ('ANTENNA1','ANTENNA2')):
-            ants = ms.getcol(antpos, startrow=start, nrow=nrow)
-            datetimes = dt.datetime(1858, 11, 17, 0, 0, 2) + \
-                        ms.getcol('TIME', startrow=start, nrow=nrow)*dt.timedelta(seconds=1)
-            cond = np.where((ants == antenna_number) & (datetimes > datetimes_start) & (datetimes < datetimes_end))
-            if len(cond[0]) > 0:
-                for a_col in columns:
-                    ms_col = ms.getcol(a_col, startrow=start, nrow=nrow)
-                    if len(ms_col.shape) == 3:
-                        ms_col[cond,] = ms_col[cond,][:,:,:,changei,]
-                    elif len(ms_col.shape) == 2:
-                        ms_col[cond,] = ms_col[cond,][:,:,changei,]
-                    elif len(ms_col.shape) == 1:
-                        ms_col[cond,] = ms_col[cond,][:,changei,]
-                    else:
-                        raise ValueError('Unexpected dimensions for {} column.'.format(a_col))
-
-                    ms.putcol(a_col, ms_col, startrow=start, nrow=nrow)
-
-
-print('\n{} modified correctly.'.format(msdata))
 
+    # Only the chunks around the affected rows are read, aligned to the tiles of the columns
+    keycolumns = ('ANTENNA1', 'ANTENNA2', 'TIME')
+    chunksize, align = msstream.chunk_plan(ms, list(keycolumns) + columns, chunksize, max_memory)
+    index = rowindex.load_index(ms)
+    rows = rowindex.select_rows(ms, index, msstream.antenna_time_condition(mjd_windows), windows=mjd_windows)
+    print('{} rows to modify ({:.2f}% of the MS).'.format(len(rows), 100.0*len(rows)/max(1, len(ms))))
+    with msstream.ChunkStreamer(ms, columns, chunks=msstream.rows_to_chunks(rows, chunksize, align=align),
+                                keycolumns=keycolumns, checkpoint=checkpoint) as stream:
+        for chunk in stream:
+            rows = rows_to_swap(chunk.data, mjd_windows)
+            swap_chunk(chunk.data, columns, rows, changes)
+            # Each column is written only once per chunk, and only the modified rows
+            stream.write(chunk, {a_col: chunk[a_col] for a_col in columns},
+                         runs=msstream.row_runs(rows.any(axis=0)))
+
+    rowindex.update_index(ms, index)
+
+    return stream.rows_written
+
+
+def swapped_labels(corr_type, corr_product, side):
+    """Returns the CORR_TYPE and CORR_PRODUCT that describe the data of a baseline once the
+    polarizations of one or both of its antennas are swapped, without moving the data.
+
+    Inputs
+    ------
+      corr_type : 1-D array-like
+            CORR_TYPE of the original POLARIZATION row.
+      corr_product : 2-D array-like
+            CORR_PRODUCT of the original POLARIZATION row, with shape (ncorr, 2).
+      side : int
+            1 if ANTENNA1 is swapped, 2 if ANTENNA2 is swapped, 3 if both are swapped.
+
+    Outputs
+    -------
+      corr_type, corr_product : arrays
+            The product stored in each position is now the one with the receptor of the swapped
+            antenna(s) changed, e.g. for ANTENNA1 the data labeled RL are actually LL.
+    """
+    corr_type, corr_product = np.asarray(corr_type), np.asarray(corr_product)
+    order = np.arange(len(corr_type))
+    for i in (0, 1):
+        if side & (i+1):
+            order = order[get_nedded_move(corr_product, i)]
+    return corr_type[order], corr_product[order]
+
+
+def polswap_metadata(ms, windows, chunksize=None, max_memory=None, checkpoint=None):
+    """Swaps the polarizations of several antennas, each one in its timerange, by only relabeling the
+    data: new POLARIZATION rows with the swapped products and DATA_DESCRIPTION rows pointing to them
+    are added (or reused if they already exist), and the DATA_DESC_ID of the affected rows is changed.
+    The data columns are not read or written.
+
+    Inputs
+    ------
+      ms : pyrap.tables.table
+            The MS, opened with readonly=False.
+      windows : list of (antenna, starttime, endtime)
+            As in polswap_windows().
+      chunksize : int (optional)
+            Number of rows to process at a time. By default computed from max_memory.
+      max_memory : float (optional)
+            Memory budget in MB (see msstream.chunk_plan()).
+      checkpoint : checkpoint.Checkpoint (optional)
+            Only the rows not committed in it are processed, and the processed ones are committed.
+
+    Outputs
+    -------
+      nrows : int
+            Number of rows that have been modified.
+    """
+    polswap_changes(ms)  # Only to check that the polarizations can be swapped
+    mjd_windows = resolve_windows(ms, windows)
+    keycolumns = ['ANTENNA1', 'ANTENNA2', 'TIME']
+    chunksize, align = msstream.chunk_plan(ms, keycolumns + ['DATA_DESC_ID'], chunksize, max_memory)
+    index = rowindex.load_index(ms)
+    rows = rowindex.select_rows(ms, index, msstream.antenna_time_condition(mjd_windows), windows=mjd_windows)
+    print('{} rows to modify ({:.2f}% of the MS).'.format(len(rows), 100.0*len(rows)/max(1, len(ms))))
+    chunks = msstream.rows_to_chunks(rows, chunksize, align=align)
+    if checkpoint is not None:
+        # The rows already relabeled are left out of both passes
+        chunks = checkpoint.pending(chunks)
+
+    def sides(chunk):
+        """Side of each row to swap: 1 (ANTENNA1), 2 (ANTENNA2), 3 (both) or 0 (none)."""
+        side_rows = rows_to_swap(chunk.data, mjd_windows)
+        return side_rows[0] + 2*side_rows[1]
+
+    # First pass on the (small) key columns: which DATA_DESC_ID need relabeled versions
+    with pt.table(ms.getkeyword('DATA_DESCRIPTION'), readonly=True, ack=False) as ms_dd:
+        ndd = len(ms_dd)
+    needed = np.zeros((ndd, 4), dtype=bool)
+    with msstream.ChunkStreamer(ms, ['DATA_DESC_ID'], chunks=chunks, keycolumns=keycolumns) as stream:
+        for chunk in stream:
+            needed[chunk['DATA_DESC_ID'], sides(chunk)] = True
+
+    # New POLARIZATION and DATA_DESCRIPTION rows
+    ddid_map = np.tile(np.arange(ndd), (4, 1)).T
+    with pt.table(ms.getkeyword('POLARIZATION'), readonly=False, ack=False) as ms_pol, \
+         pt.table(ms.getkeyword('DATA_DESCRIPTION'), readonly=False, ack=False) as ms_dd:
+        for ddid, side in zip(*np.nonzero(needed)):
+            ddid, side = int(ddid), int(side)
+            if side == 0:
+                continue
+            spw_id, pol_id = ms_dd.getcell('SPECTRAL_WINDOW_ID', ddid), ms_dd.getcell('POLARIZATION_ID', ddid)
+            corr_type, corr_product = swapped_labels(ms_pol.getcell('CORR_TYPE', pol_id),
+                                                     ms_pol.getcell('CORR_PRODUCT', pol_id), side)
+            new_pol = msstream.find_or_add_row(ms_pol, {'CORR_TYPE': corr_type, 'CORR_PRODUCT': corr_product},
+                                               pol_id)
+            ddid_map[ddid, side] = msstream.find_or_add_row(ms_dd, {'SPECTRAL_WINDOW_ID': spw_id,
+                                                                    'POLARIZATION_ID': new_pol}, ddid)
+            print('DATA_DESC_ID {} -> {} for the rows with {} swapped ({}).'.format(ddid, ddid_map[ddid, side],
+                  {1: 'ANTENNA1', 2: 'ANTENNA2', 3: 'both antennas'}[side],
+                  ','.join([Stokes(i).name for i in corr_type])))
+
+    # Second pass: only DATA_DESC_ID is written
+    new_rows, new_ddids = [], []
+    with msstream.ChunkStreamer(ms, ['DATA_DESC_ID'], chunks=chunks, keycolumns=keycolumns,
+                                checkpoint=checkpoint) as stream:
+        for chunk in stream:
+            chunk_sides = sides(chunk)
+            chunk['DATA_DESC_ID'][:] = ddid_map[chunk['DATA_DESC_ID'], chunk_sides]
+            stream.write(chunk, {'DATA_DESC_ID': chunk['DATA_DESC_ID']},
+                         runs=msstream.row_runs(chunk_sides > 0))
+            if index is not None:
+                new_rows.append(chunk.startrow + np.flatnonzero(chunk_sides > 0))
+                new_ddids.append(chunk['DATA_DESC_ID'][chunk_sides > 0])
+
+    if index is not None:
+        rowindex.update_index(ms, index, np.concatenate([[]] + new_rows).astype(np.int64),
+                              np.concatenate([[]] + new_ddids))
+    return stream.rows_written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=description, prog='polswap.py', usage=usage)
+    parser.add_argument('msdata', type=str, help=help_msdata)
+    parser.add_argument('antenna', type=str, nargs='?', default=None, help=help_antenna)
+    parser.add_argument('-t1', '--starttime', default=None, type=str, help=help_t1)
+    parser.add_argument('-t2', '--endtime', default=None, type=str, help=help_t2)
+    parser.add_argument('--spec', default=None, type=str, help=help_spec)
+    parser.add_argument('--metadata', default=False, action='store_true', help=help_metadata)
+    parser.add_argument('--chunksize', default=None, type=int, help=help_chunksize)
+    msstream.add_memory_argument(parser)
+    msstream.add_profile_arguments(parser)
+    checkpoint.add_resume_argument(parser)
+    parser.add_argument('-v', '--version', action='version', version='%(prog)s 1.0')
+    # parser.add_argument('--verbose', default=False, action='store_true')
+    # parser.add_argument('--timing', default=False, action='store_true')
+
+    arguments = parser.parse_args()
+
+    msdata = arguments.msdata[:-1] if arguments.msdata[-1]=='/' else arguments.msdata
+
+    if (arguments.antenna is None) == (arguments.spec is None):
+        parser.error('either an antenna or a spec file (--spec) must be provided')
+
+    profiler = msstream.start_profiler(arguments, msdata, 'polswap')
+
+    if arguments.spec is not None:
+        windows = read_spec(arguments.spec)
+    else:
+        windows = [(arguments.antenna, arguments.starttime, arguments.endtime)]
+
+    with pt.table(msdata, readonly=False, ack=False) as ms:
+        try:
+            # The inputs are checked before the checkpoint is created
+            resolve_windows(ms, windows)
+            ckpt = checkpoint.Checkpoint(msdata, 'polswap', {'windows': windows, 'metadata': arguments.metadata},
+                                         len(ms), resume=arguments.resume)
+        except ValueError as e:
+            parser.error(str(e))
+
+        with ckpt:
+            if ckpt.rows_committed > 0:
+                print('Resuming the interrupted execution ({} rows already done).'.format(ckpt.rows_committed))
+            if arguments.metadata:
+                polswap_metadata(ms, windows, arguments.chunksize, arguments.max_memory, ckpt)
+            else:
+                polswap_windows(ms, windows, arguments.chunksize, arguments.max_memory, ckpt)
+
+    if profiler is not None:
+        profiler.stop()
+
+    print('\n{} modified correctly.'.format(msdata))
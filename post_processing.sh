@@ -77,6 +77,9 @@ function post_process_eee() {
 
     ysfocus.py ${exp}.ms
 
+    # Flagged data for a range of thresholds, from a single read of the weights
+    flag_weights.py ${exp}.ms --sweep
+
     read "THRESHOLD?Which weight threshold should be applied to the data? tConvert will run later "
 
     flag_weights.py ${exp}.ms $THRESHOLD
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Applies a repair plan (a list of corrections) to a MS in a single pass over the data.
+
+The corrections are the ones from ysfocus.py, polswap.py, invert_subband.py, scale1bit.py
+and flag_weights.py. Instead of running them one after the other (each one reading and
+writing the data columns), every chunk of the MS is read once, transformed in memory by
+all the steps, and written once.
+
+Usage: repair_ms.py [--resume] msdata planfile
+
+The plan file contains one step per line ('#' starts a comment):
+
+    ysfocus
+    polswap ANTENNA [t1=STARTTIME] [t2=ENDTIME]
+    invert_subband ANTENNA [t1=STARTTIME] [t2=ENDTIME] [sb=SUBBANDS]
+    scale1bit ANTENNA [ANTENNA ...] [weights] [undo]
+    flag_weights THRESHOLD
+
+with the times in AIPS format (YYYY/MM/DD/hh:mm:ss or YYYY/DOY/hh:mm:ss) and the subbands
+as a comma-separated list (first subband is 1). The options have the same meaning as in
+the individual scripts.
+
+Whatever the order in the file, the steps are always applied in the order above: the metadata
+fixes (ysfocus) first, then the polarization swaps, the subband inversions, the 1-bit scaling
+and finally the flagging of low weights (so it sees the corrected weights). All polswap lines
+are combined in a single step (as polswap.py --spec). The result is the same as running the
+scripts one after the other in that order.
+
+Version: 1.2
+Date: Oct 2026
+Written by Benito Marcote (marcote@jive.eu)
+
+version 1.2 changes (Oct 2026)
+- --resume option: the committed rows are recorded in a checkpoint next to the MS while it is
+  modified, and an interrupted execution continues from there with the same plan (see checkpoint.py).
+
+version 1.1 changes (Oct 2026)
+- --max-memory option. The chunk size is computed from the size of the rows (within that
+  memory budget), and the chunks are aligned to the tiles of the data columns.
+- --profile and --cprofile options (time, bytes and rows per phase and column, peak memory).
+- The rows modified by the steps are taken from the row index of the MS if it is up to date
+  (see rowindex.py), and the index is kept up to date.
+"""
+
+import argparse
+import numpy as np
+from pyrap import tables as pt
+import msstream
+import flagjournal
+import checkpoint
+import rowindex
+import ysfocus
+import polswap
+import invert_subband
+import scale1bit
+import flag_weights
+
+
+__version__ = 1.2
+
+usage = "%(prog)s [-h] [--chunksize N] [--max-memory MB] [--no-journal] [--resume] <measurement set> <plan file>"
+description = """Applies all the corrections listed in a plan file to a MS in a single pass over the data.
+
+Steps (one per line): ysfocus, polswap, invert_subband, scale1bit, flag_weights.
+See the header of the script for the syntax.
+"""
+help_msdata = 'Measurement Set containing the data to be corrected.'
+help_plan = 'File with the corrections to apply, one per line.'
+help_chunksize = 'Number of rows read at a time (default: ~4 MB of data, see --max-memory).'
+help_nojournal = 'Do not record the new flags in the flag journal (they could not be restored ' \
+                 'with flag_weights.py --restore).'
+
+# Order in which the steps are applied
+STEP_ORDER = ('ysfocus', 'polswap', 'invert_subband', 'scale1bit', 'flag_weights')
+
+# Columns used to decide which rows each step modifies
+KEY_COLUMNS = ['ANTENNA1', 'ANTENNA2', 'TIME', 'DATA_DESC_ID']
+
+
+def read_plan(planfile):
+    """Reads a plan file. Returns a list of (step name, arguments, options), where options
+    is a dict with the key=value arguments.
+    """
+    plan = []
+    with open(planfile, 'r') as planf:
+        for a_line in planf:
+            fields = a_line.split('#')[0].split()
+            if len(fields) == 0:
+                continue
+            if fields[0] not in STEP_ORDER:
+                raise ValueError('Unknown step in {}: {}'.format(planfile, a_line.strip()))
+            arguments = [a_field for a_field in fields[1:] if '=' not in a_field]
+            options = dict([a_field.split('=', 1) for a_field in fields[1:] if '=' in a_field])
+            plan.append((fields[0], arguments, options))
+    return sorted(plan, key=lambda a_step: STEP_ORDER.index(a_step[0]))
+
+
+class PolswapStep(object):
+    """Swaps the polarizations of antennas within timeranges (polswap.py)."""
+    def __init__(self, ms, windows):
+        self.changes = polswap.polswap_changes(ms)
+        self.windows = polswap.resolve_windows(ms, windows)
+        self.columns = [a_col for a_col in ('DATA', 'FLOAT_DATA', 'FLAG', 'SIGMA_SPECTRUM',
+                        'WEIGHT_SPECTRUM', 'WEIGHT', 'SIGMA') if a_col in ms.colnames()]
+        self.written = self.columns
+        self.where = msstream.antenna_time_condition(self.windows)
+        self.conditions = {'windows': self.windows}
+        self.name = 'polswap ({})'.format(', '.join([a_window[0] for a_window in windows]))
+        self.nrows = 0
+
+    def __call__(self, chunk):
+        rows = polswap.rows_to_swap(chunk.data, self.windows)
+        polswap.swap_chunk(chunk.data, self.columns, rows, self.changes)
+        rows = rows.any(axis=0)
+        self.nrows += np.count_nonzero(rows)
+        return rows
+
+
+class InvertSubbandStep(object):
+    """Inverts the channel order of the subbands of an antenna within a timerange (invert_subband.py)."""
+    def __init__(self, ms, antenna, starttime=None, endtime=None, subbands=None):
+        self.window = polswap.resolve_windows(ms, [(antenna, starttime, endtime)])[0]
+        self.ddids = msstream.subband_ddids(ms, subbands) if subbands is not None else None
+        self.columns = [a_col for a_col in ('DATA', 'FLOAT_DATA', 'FLAG', 'SIGMA_SPECTRUM',
+                        'WEIGHT_SPECTRUM') if a_col in ms.colnames()]
+        self.written = self.columns
+        self.where = msstream.antenna_time_condition([self.window])
+        if self.ddids is not None:
+            self.where += ' && DATA_DESC_ID IN [{}]'.format(','.join([str(i) for i in self.ddids]))
+        self.conditions = {'windows': [self.window], 'ddids': self.ddids}
+        self.name = 'invert_subband ({})'.format(antenna)
+        self.nrows = 0
+
+    def __call__(self, chunk):
+        rows = invert_subband.rows_to_invert(chunk.data, *self.window, ddids=self.ddids)
+        runs = msstream.row_runs(rows)
+        for a_col in self.columns:
+            invert_subband.reverse_channels(chunk[a_col], runs)
+        self.nrows += np.count_nonzero(rows)
+        return rows
+
+
+class Scale1bitStep(object):
+    """Scales the data of the baselines with 1-bit antennas (scale1bit.py)."""
+    def __init__(self, ms, msdata, antennas, scale_weights=False, undo=False):
+        self.antenna_ids = scale1bit.antenna_ids(msdata, antennas)
+        if len(self.antenna_ids) != len(antennas):
+            raise ValueError('Not all the antennas {} are in the MS.'.format(antennas))
+        self.undo = undo
+        self.columns = ['DATA', 'WEIGHT'] if scale_weights else ['DATA']
+        self.written = self.columns
+        self.where = '(ANTENNA1 IN {0} || ANTENNA2 IN {0}) && ANTENNA1 != ANTENNA2'.format(self.antenna_ids)
+        self.conditions = {'windows': [(a, -np.inf, np.inf) for a in self.antenna_ids], 'autocorr': False}
+        self.name = 'scale1bit ({})'.format(', '.join(antennas))
+        self.nrows = 0
+
+    def __call__(self, chunk):
+        factors = scale1bit.row_factors(chunk['ANTENNA1'], chunk['ANTENNA2'], self.antenna_ids, self.undo)
+        rows = factors != 1.0
+        for a_col in self.columns:
+            ms_col = chunk[a_col]
+            factor = factors[rows].reshape((-1,) + (1,)*(ms_col.ndim-1))
+            ms_col[rows] = ms_col[rows]*factor
+        self.nrows += np.count_nonzero(rows)
+        return rows
+
+
+class FlagWeightsStep(object):
+    """Flags the visibilities with weights below a threshold (flag_weights.py)."""
+    def __init__(self, ms, threshold, journal=None):
+        self.weightcol = 'WEIGHT_SPECTRUM' if 'WEIGHT_SPECTRUM' in ms.colnames() else 'WEIGHT'
+        self.predicates = [flag_weights.WeightThreshold(self.weightcol, threshold)]
+        self.columns = flag_weights.needed_columns(ms, self.weightcol, self.predicates)
+        self.written = [a_col for a_col in ('FLAG', 'FLAG_ROW') if a_col in self.columns]
+        # All rows need to be checked
+        self.where = None
+        self.conditions = None
+        self.journal = journal
+        self.name = 'flag_weights ({})'.format(threshold)
+        self.counts = np.zeros(5, dtype=np.int64)
+        self.nrows = 0
+
+    def __call__(self, chunk):
+        counts, runs, to_flag = flag_weights.flag_chunk(chunk.data, self.weightcol, self.predicates)
+        self.counts += counts
+        if self.journal is not None:
+            self.journal.add(chunk.startrow, flagjournal.encode_runs(to_flag, runs))
+        rows = np.any(to_flag, axis=(1, 2))
+        self.nrows += np.count_nonzero(rows)
+        return rows
+
+
+def build_steps(ms, msdata, plan, journal=None):
+    """Creates the data steps (in the order to apply them) from a plan (see read_plan()).
+    The MS is not modified, so the inputs of the plan (antennas, times, subbands) can be checked
+    before applying anything. The ysfocus step only modifies metadata, so it is not a data step
+    (see apply_metadata_steps()).
+    """
+    steps = []
+    windows = []
+    for name, arguments, options in plan:
+        if name == 'polswap':
+            windows.append((arguments[0], options.get('t1'), options.get('t2')))
+        elif name == 'invert_subband':
+            subbands = [int(i) for i in options['sb'].split(',')] if 'sb' in options else None
+            steps.append(InvertSubbandStep(ms, arguments[0], options.get('t1'), options.get('t2'), subbands))
+        elif name == 'scale1bit':
+            antennas = [a for a in arguments if a not in ('weights', 'undo')]
+            steps.append(Scale1bitStep(ms, msdata, antennas, 'weights' in arguments, 'undo' in arguments))
+        elif name == 'flag_weights':
+            steps.append(FlagWeightsStep(ms, float(arguments[0]), journal))
+
+    if len(windows) > 0:
+        # All swaps in one step, before the rest of data steps
+        steps.insert(0, PolswapStep(ms, windows))
+    return steps
+
+
+def apply_metadata_steps(ms, plan):
+    """Applies the steps of the plan that only modify metadata (ysfocus), before the data steps."""
+    for name, arguments, options in plan:
+        if name == 'ysfocus':
+            ysfocus.fix_mounts(ms)
+
+
+def repair(ms, steps, chunksize=None, max_memory=None, checkpoint=None):
+    """Applies all steps to the MS in a single pass. Returns the number of rows written.
+    The chunk size is chosen by msstream.chunk_plan() (from max_memory if chunksize is not given).
+    If a checkpoint.Checkpoint is given, the rows already committed on it are skipped.
+
+    Only the chunks with rows modified by any step are read, unless one of the steps needs to
+    check all rows (flag_weights). The rows are taken from the row index of the MS if it is up to
+    date (with the conditions of each step), or else selected with the TaQL conditions of the steps.
+    """
+    columns = list(KEY_COLUMNS)
+    written = []
+    for a_step in steps:
+        columns += [a_col for a_col in a_step.columns if a_col not in columns]
+        written += [a_col for a_col in a_step.written if a_col not in written]
+
+    chunksize, align = msstream.chunk_plan(ms, columns, chunksize, max_memory)
+    if any([a_step.where is None for a_step in steps]):
+        chunks = None
+    else:
+        index = rowindex.load_index(ms)
+        if index is not None:
+            rows = np.unique(np.concatenate([index.rows(**a_step.conditions) for a_step in steps]))
+        else:
+            rows = msstream.select_rows(ms, ' || '.join(['({})'.format(a_step.where) for a_step in steps]))
+        chunks = msstream.rows_to_chunks(rows, chunksize, align=align)
+
+    with msstream.ChunkStreamer(ms, columns, chunks=chunks, chunksize=chunksize,
+                                keycolumns=KEY_COLUMNS, checkpoint=checkpoint) as stream:
+        for chunk in stream:
+            modified = np.zeros(chunk.nrow, dtype=bool)
+            for a_step in steps:
+                modified |= a_step(chunk)
+            # Each column is written once per chunk, and only the modified rows
+            stream.write(chunk, {a_col: chunk[a_col] for a_col in written}, runs=msstream.row_runs(modified))
+
+    return stream.rows_written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=description, prog='repair_ms.py', usage=usage)
+    parser.add_argument('msdata', type=str, help=help_msdata)
+    parser.add_argument('planfile', type=str, help=help_plan)
+    parser.add_argument('--chunksize', type=int, default=None, help=help_chunksize)
+    msstream.add_memory_argument(parser)
+    parser.add_argument('--no-journal', default=False, action='store_true', help=help_nojournal)
+    checkpoint.add_resume_argument(parser)
+    msstream.add_profile_arguments(parser)
+    parser.add_argument('--version', action='version', version='%(prog)s {}'.format(__version__))
+    arguments = parser.parse_args()
+
+    msdata = arguments.msdata[:-1] if arguments.msdata[-1]=='/' else arguments.msdata
+    plan = read_plan(arguments.planfile)
+    profiler = msstream.start_profiler(arguments, msdata, 'repair_ms')
+    print('Steps to apply: {}\n'.format(', '.join([a_step[0] for a_step in plan])))
+
+    with pt.table(msdata, readonly=False, ack=False) as ms:
+        try:
+            # The steps (and so the inputs of the plan) are checked before the checkpoint is created
+            steps = build_steps(ms, msdata, plan)
+            # Only flagging (and the metadata fixes) can be applied twice to the same rows
+            ckpt = checkpoint.Checkpoint(msdata, 'repair_ms', {'plan': plan}, len(ms), resume=arguments.resume,
+                                         idempotent=all([name in ('ysfocus', 'flag_weights') for name, a, o in plan]))
+        except ValueError as e:
+            parser.error(str(e))
+        if ckpt.rows_committed > 0:
+            print('Resuming the interrupted execution ({} rows already done).\n'.format(ckpt.rows_committed))
+        journal = None
+        thresholds = [step_args[0] for name, step_args, options in plan if name == 'flag_weights']
+        with ckpt:
+            if (len(thresholds) > 0) and (not arguments.no_journal):
+                # A resumed execution continues the interrupted version of the journal
+                journal = flagjournal.FlagJournal(msdata, len(ms), msstream.column_layout(ms, ['FLAG'])['FLAG'][0],
+                                                  {'flagged': ['weight < {}'.format(t) for t in thresholds],
+                                                   'plan': arguments.planfile}, resume=arguments.resume)
+                for a_step in steps:
+                    if isinstance(a_step, FlagWeightsStep):
+                        a_step.journal = journal
+            try:
+                index = rowindex.load_index(ms)
+                apply_metadata_steps(ms, plan)
+                rows_written = repair(ms, steps, arguments.chunksize, arguments.max_memory,
+                                      ckpt) if len(steps) > 0 else 0
+            except BaseException:
+                if journal is not None:
+                    journal.close(completed=False)
+                raise
+            if journal is not None:
+                journal.close()
+        rowindex.update_index(ms, index)
+
+        print('\n')
+        for a_step in steps:
+            print('{}: {} rows modified.'.format(a_step.name, a_step.nrows))
+            if isinstance(a_step, FlagWeightsStep):
+                total_number, flagged_before, flagged_after = a_step.counts[:3]
+                print('    {} of {} visibilities flagged ({:.2f}% in total).'.format(flagged_after-flagged_before,
+                      total_number, 100.0*flagged_after/max(1, total_number)))
+
+        print('\n{} rows written ({:.2f}% of the MS).'.format(rows_written, 100.0*rows_written/max(1, len(ms))))
+        if journal is not None:
+            print('New flags recorded in {}. Use flag_weights.py --restore to undo them.'.format(journal.filename))
+
+    if profiler is not None:
+        profiler.stop()
+
+    print('\nDone.')
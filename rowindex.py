@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Persistent row index of a Measurement Set, so the tools can find the rows of some antennas,
+baselines, subbands, scans or timerange without reading ANTENNA1/ANTENNA2/TIME/DATA_DESC_ID
+from the whole table on every execution.
+
+The index is a sidecar file next to the MS (<msdata>.rowindex.npz), built once with:
+
+    rowindex.py msdata
+
+It stores:
+- ANTENNA1, ANTENNA2 and DATA_DESC_ID of each row, with the smallest integer type that holds
+  them (the file is compressed, so the periodic pattern of baselines and subbands of each
+  integration takes very little space),
+- TIME and SCAN_NUMBER as runs of consecutive rows with the same value (one run per
+  integration and per scan in a time-ordered MS).
+
+A selection is resolved in memory and returned as sorted row numbers (or runs of consecutive
+rows), which the tools read directly with msstream.rows_to_chunks().
+
+The index is only used if the number of rows and the modification time of the MS (see
+msstream.table_mtime()) are the ones stored in it. The tools that modify the MS update the
+stored time after writing (and the indexed columns they change, e.g. DATA_DESC_ID), so the
+index stays valid. Any other change of the MS makes it stale: it is then ignored until it is
+built again.
+
+Version: 1.0
+Date: Oct 2026
+"""
+
+import os
+import sys
+import argparse
+import numpy as np
+from pyrap import tables as pt
+import msstream
+
+
+usage = "%(prog)s [-h] [--chunksize N] <measurement set>"
+description = """Builds the row index of a Measurement Set (<msdata>.rowindex.npz).
+
+polswap.py, invert_subband.py, scale1bit.py and flag_weights.py use it (when it is up to date) to
+read only the rows they need, instead of scanning the full MS to find them. All the tools that
+modify the MS keep it up to date.
+"""
+help_msdata = 'Measurement Set to index.'
+help_chunksize = 'Number of rows read at a time (default: 100000).'
+
+# Columns that are stored in the index
+INDEXED_COLUMNS = ('ANTENNA1', 'ANTENNA2', 'DATA_DESC_ID', 'TIME', 'SCAN_NUMBER')
+
+
+def index_name(msdata):
+    return msdata.rstrip('/') + '.rowindex.npz'
+
+
+def _runs(values):
+    """Run-length encoding of a 1-D array: (value, length) of each run of equal values."""
+    if len(values) == 0:
+        return values[:0], np.zeros(0, dtype=np.int64)
+    starts = np.concatenate(([0], np.flatnonzero(values[1:] != values[:-1]) + 1))
+    return values[starts], np.diff(np.append(starts, len(values)))
+
+
+def _smallest_int(values):
+    """values as the smallest (unsigned if possible) integer type that holds them."""
+    values = np.asarray(values)
+    if len(values) == 0:
+        return values.astype(np.uint8)
+    for a_type in (np.uint8, np.uint16, np.int32, np.int64):
+        info = np.iinfo(a_type)
+        if (values.min() >= info.min) and (values.max() <= info.max):
+            return values.astype(a_type)
+
+
+class RowIndex(object):
+    """Index of the rows of a MS (see build(), load() and rows()).
+
+    Attributes
+    ----------
+      nrow : int
+            Number of rows of the MS.
+      mtime : float
+            Modification time of the MS when the index was (last) saved.
+      antenna1, antenna2, ddid : 1-D int arrays
+            ANTENNA1, ANTENNA2 and DATA_DESC_ID of each row.
+      time_values, time_lengths : 1-D arrays
+            Runs of consecutive rows with the same TIME.
+      scan_values, scan_lengths : 1-D arrays
+            Runs of consecutive rows with the same SCAN_NUMBER.
+    """
+    def __init__(self, nrow, mtime, antenna1, antenna2, ddid, time_values, time_lengths,
+                 scan_values, scan_lengths):
+        self.nrow = int(nrow)
+        self.mtime = float(mtime)
+        self.antenna1, self.antenna2, self.ddid = antenna1, antenna2, ddid
+        self.time_values, self.time_lengths = time_values, time_lengths
+        self.scan_values, self.scan_lengths = scan_values, scan_lengths
+
+    @classmethod
+    def build(cls, ms, chunksize=100000):
+        """Reads the indexed columns of the (opened) MS in chunks and returns its RowIndex."""
+        columns = {a_col: [] for a_col in INDEXED_COLUMNS}
+        for (startrow, nrow) in msstream.chunkert(0, len(ms), chunksize):
+            msstream.cli_progress_bar(startrow, len(ms))
+            for a_col in ('ANTENNA1', 'ANTENNA2', 'DATA_DESC_ID'):
+                columns[a_col].append(_smallest_int(ms.getcol(a_col, startrow=startrow, nrow=nrow)))
+            for a_col in ('TIME', 'SCAN_NUMBER'):
+                # Runs are merged below (a run can continue in the next chunk)
+                columns[a_col].append(_runs(ms.getcol(a_col, startrow=startrow, nrow=nrow)))
+        msstream.cli_progress_bar(1, 1)
+        sys.stdout.write('\n')
+
+        def concatenate(chunks):
+            if len(chunks) == 0:
+                return np.zeros(0, dtype=np.uint8)
+            return _smallest_int(np.concatenate([a_chunk.astype(np.int64) for a_chunk in chunks]))
+
+        def merge_runs(chunks):
+            if len(chunks) == 0:
+                return np.zeros(0), np.zeros(0, dtype=np.int64)
+            values = np.concatenate([v for v, l in chunks])
+            lengths = np.concatenate([l for v, l in chunks])
+            starts = np.concatenate(([0], np.flatnonzero(values[1:] != values[:-1]) + 1))
+            return values[starts], np.add.reduceat(lengths, starts)
+
+        time_values, time_lengths = merge_runs(columns['TIME'])
+        scan_values, scan_lengths = merge_runs(columns['SCAN_NUMBER'])
+        return cls(len(ms), msstream.table_mtime(ms.name()), concatenate(columns['ANTENNA1']),
+                   concatenate(columns['ANTENNA2']), concatenate(columns['DATA_DESC_ID']),
+                   time_values, time_lengths, scan_values, scan_lengths)
+
+    def save(self, msdata):
+        """Writes the index next to the MS, with the current modification time of the MS."""
+        self.mtime = msstream.table_mtime(msdata)
+        with open(index_name(msdata), 'wb') as indexfile:
+            np.savez_compressed(indexfile, nrow=self.nrow, mtime=self.mtime, antenna1=self.antenna1,
+                                antenna2=self.antenna2, ddid=self.ddid, time_values=self.time_values,
+                                time_lengths=self.time_lengths, scan_values=self.scan_values,
+                                scan_lengths=self.scan_lengths)
+
+    @classmethod
+    def load(cls, msdata, nrow=None):
+        """Returns the RowIndex of the MS, or None if there is none or if it is not up to date.
+        nrow is the number of rows of the MS (read from the MS if not given).
+        """
+        if not os.path.isfile(index_name(msdata)):
+            return None
+        with np.load(index_name(msdata)) as arrays:
+            index = cls(**{k: arrays[k] for k in arrays.files})
+        if nrow is None:
+            with pt.table(msdata, readonly=True, ack=False) as ms:
+                nrow = len(ms)
+        if (index.nrow != nrow) or (index.mtime != msstream.table_mtime(msdata)):
+            return None
+        return index
+
+    def time_mask(self, starttime, endtime):
+        """Rows with starttime < TIME < endtime (MJD seconds)."""
+        in_time = (self.time_values > starttime) & (self.time_values < endtime)
+        return np.repeat(in_time, self.time_lengths)
+
+    def rows(self, windows=None, ddids=None, scans=None, baselines=None, autocorr=None):
+        """Returns the (sorted) row numbers that fulfill all the given conditions.
+
+        Inputs
+        ------
+          windows : list of (antenna_number, starttime, endtime) (optional)
+                Rows with any of the antennas (as ANTENNA1 or ANTENNA2) within its timerange
+                (MJD seconds, exclusive). The same as msstream.antenna_time_condition().
+          ddids : list of int (optional)
+                Rows with these DATA_DESC_IDs.
+          scans : list of int (optional)
+                Rows with these SCAN_NUMBERs.
+          baselines : list of (antenna1, antenna2) (optional)
+                Rows of these baselines (in any order of the antennas).
+          autocorr : bool (optional)
+                If True only the autocorrelations, if False only the cross-correlations.
+        """
+        mask = np.ones(self.nrow, dtype=bool)
+        if windows is not None:
+            in_windows = np.zeros(self.nrow, dtype=bool)
+            for antenna_number, starttime, endtime in windows:
+                in_windows |= ((self.antenna1 == antenna_number) | (self.antenna2 == antenna_number)) & \
+                              self.time_mask(starttime, endtime)
+            mask &= in_windows
+        if ddids is not None:
+            mask &= np.isin(self.ddid, ddids)
+        if scans is not None:
+            mask &= np.repeat(np.isin(self.scan_values, scans), self.scan_lengths)
+        if baselines is not None:
+            in_baselines = np.zeros(self.nrow, dtype=bool)
+            for ant1, ant2 in baselines:
+                in_baselines |= ((self.antenna1 == ant1) & (self.antenna2 == ant2)) | \
+                                ((self.antenna1 == ant2) & (self.antenna2 == ant1))
+            mask &= in_baselines
+        if autocorr is not None:
+            mask &= (self.antenna1 == self.antenna2) == autocorr
+        return np.flatnonzero(mask)
+
+    def runs(self, **conditions):
+        """As rows(), but returns the (startrow, nrow) runs of consecutive selected rows."""
+        mask = np.zeros(self.nrow, dtype=bool)
+        mask[self.rows(**conditions)] = True
+        return msstream.row_runs(mask)
+
+
+def load_index(ms):
+    """Returns the up-to-date RowIndex of an opened MS, or None."""
+    return RowIndex.load(ms.name(), len(ms))
+
+
+def select_rows(ms, index, where, **conditions):
+    """Returns the (sorted) row numbers of the MS matching a selection: from the index if given
+    (with the conditions of RowIndex.rows()), or else with the equivalent TaQL condition where
+    (see msstream.select_rows()).
+    """
+    if index is not None:
+        return index.rows(**conditions)
+    return msstream.select_rows(ms, where)
+
+
+def update_index(ms, index, ddid_rows=None, ddid_values=None):
+    """To be called by the tools after modifying the MS, if they used its index: stores the new
+    modification time of the MS (flushing the table first), so the index is still valid.
+    If DATA_DESC_ID was modified, the new values for the given rows are stored too.
+    """
+    if index is None:
+        return
+    if ddid_rows is not None:
+        ddid = index.ddid.astype(np.int64)
+        ddid[ddid_rows] = ddid_values
+        index.ddid = _smallest_int(ddid)
+    ms.flush()
+    index.save(ms.name())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=description, prog='rowindex.py', usage=usage)
+    parser.add_argument('msdata', type=str, help=help_msdata)
+    parser.add_argument('--chunksize', type=int, default=100000, help=help_chunksize)
+    arguments = parser.parse_args()
+
+    msdata = arguments.msdata[:-1] if arguments.msdata[-1]=='/' else arguments.msdata
+    with pt.table(msdata, readonly=True, ack=False) as ms:
+        index = RowIndex.build(ms, arguments.chunksize)
+    index.save(msdata)
+
+    print('\n{} rows indexed: {} antennas, {} DATA_DESC_IDs, {} scans, {} time runs.'.format(index.nrow,
+          len(np.union1d(index.antenna1, index.antenna2)), len(np.unique(index.ddid)),
+          len(np.unique(index.scan_values)), len(index.time_values)))
+    print('Index written to {} ({:.1f} kB).'.format(index_name(msdata),
+          os.path.getsize(index_name(msdata))/1024.))
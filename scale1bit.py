@@ -3,8 +3,30 @@
 ### JMB Oct 2018 ###
 ### TACL by HV Oct 2018 ###
 ### Scales 1 bit data to account for quantization loss factors    
+### Oct 2026: functions can be imported (e.g. row_factors() to apply the
+###           same scaling to chunks of data already in memory)
+### Oct 2026: streaming mode (--stream, default with -t1/-t2/-sb): the data
+###           are scaled in chunks with the factors gathered from an
+###           antenna x antenna matrix, so memory does not grow with the MS.
+###           Optional time range and subbands.
+### Oct 2026: --max-memory option: in streaming mode the chunk size is
+###           computed from the size of the rows (within the memory budget),
+###           aligned to the data tiles.
+### Oct 2026: --profile/--cprofile options (time, bytes and rows per phase
+###           and column in streaming mode, peak memory).
+### Oct 2026: in streaming mode the rows to scale are taken from the row index
+###           of the MS if it is up to date (see rowindex.py). Both modes keep
+###           the index up to date.
+### Oct 2026: --resume option (streaming mode): the committed rows are recorded
+###           in a checkpoint next to the MS, and an interrupted execution
+###           continues from there (see checkpoint.py).
 
 import pyrap.tables
+import numpy as np
+import msstream
+import timeconv
+import rowindex
+import checkpoint
 import math
 import argparse
 import sys #for exit
@@ -29,46 +51,175 @@ def debug(*msg, **kwargs):
         print (*msg, file=sys.stderr, **kwargs)
 
 
-#handle command line arguments: ms, antenna
-
-parser = argparse.ArgumentParser(description='Scale 1 bit data to correct quantization losses')
-parser.add_argument('ms', help="The measurement set to be corrected")
-parser.add_argument('ant',nargs='+', help="The antenna(s) to correct (space delimited)")
-parser.add_argument('-v', '--verbose', help="Print debug information", action="store_true")
-parser.add_argument('-u', '--undo', help="Undo a previous run, take care to specify the same stations!", action="store_true")
-parser.add_argument('-w', '--scale-weights', help="Also scale the weights", dest='to_scale', default=['DATA'], action='append_const', const='WEIGHT')
-args = parser.parse_args()
-
-if not os.path.exists(args.ms):
-    print("Error, no such ms found!")
-    sys.exit(1)
-
-try:
-    # query antenna table to translate 1 or more antenna names into antenna id's
-    aList   = list(pyrap.tables.taql("""SELECT ROWID() AS ANTENNAS FROM {table}::ANTENNA
-                                      WHERE UPCASE(NAME) IN {0}""".format(
-                                          list(map(str.upper, args.ant)),table=args.ms)
-                                    ).getcol('ANTENNAS'))
-
-except Exception as e:
-    print(e, "AAAAAAAAAARGH we have no such dishes, abort fail die :'(")
-    sys.exit(1)
-
-debug("Antenna list:", aList)
-# depending on length of the result, use "ANTENNAx == <id>" or "ANTENNAx IN [<id>, <id>,...]" 
-# because "==" is faster than "IN [<id>]" when only one <id> is present
-antcond = ("== {0[0]}".format if len(aList)==1 else "IN {0}".format)(aList)
-# and let taql do the real work ...
-factor1, factor2 = (factor1b1b, factor1b2b) if not args.undo else (1/factor1b1b, 1/factor1b2b)
-
-scale_it = "{{0}} = {{0}} * IIF(apply.ant1bit AND apply.ant2bit, {factor1b1b}, {factor1b2b})".format(factor1b1b=factor1, factor1b2b=factor2).format
-
-#to_scale = ['DATA'] + (['WEIGHT'] if args.scale_weights else [])
-
-t = pyrap.tables.taql("""
-    UPDATE {table}
-    SET  {todo}
-    FROM [SELECT ANTENNA1 {condition} AS ant1bit, ANTENNA2 {condition} AS ant2bit
-          FROM {table} GIVING AS memory] apply
-    WHERE ((apply.ant1bit OR apply.ant2bit) and ANTENNA1 != ANTENNA2)
-""".format(condition=antcond, table=args.ms, todo=",".join(map(scale_it, args.to_scale))))
+def antenna_ids(msname, antennas):
+    """Translates 1 or more antenna names (case insensitive) into antenna id's"""
+    # as python ints, numpy integers are not formatted as plain numbers in the TaQL commands
+    return list(map(int, pyrap.tables.taql("""SELECT ROWID() AS ANTENNAS FROM {table}::ANTENNA
+                                           WHERE UPCASE(NAME) IN {0}""".format(
+                                               list(map(str.upper, antennas)),table=msname)
+                                         ).getcol('ANTENNAS')))
+
+
+def factor_matrix(nant, aList, undo=False):
+    """Returns the (nant, nant) matrix with the scaling factor for each baseline, with aList
+    the id's of the 1 bit antennas. It is the same factor applied by scale1bit():
+    factor1b1b if both antennas are 1 bit, factor1b2b if only one of them, and 1 otherwise
+    (also for autocorrelations).
+    """
+    factor1, factor2 = (factor1b1b, factor1b2b) if not undo else (1/factor1b1b, 1/factor1b2b)
+    is1bit = np.zeros(nant, dtype=bool)
+    is1bit[aList] = True
+    factors = np.where(np.logical_and.outer(is1bit, is1bit), factor1,
+                       np.where(np.logical_or.outer(is1bit, is1bit), factor2, 1.0))
+    np.fill_diagonal(factors, 1.0)
+    return factors
+
+
+def row_factors(ant1, ant2, aList, undo=False):
+    """Returns the scaling factor for each row given its ANTENNA1 and ANTENNA2 (arrays)"""
+    nant = max(np.max(ant1, initial=0), np.max(ant2, initial=0), max(aList, default=0)) + 1
+    return factor_matrix(nant, aList, undo)[ant1, ant2]
+
+
+def scale1bit_stream(ms, aList, to_scale=['DATA'], undo=False, starttime=None, endtime=None,
+                     subbands=None, chunksize=None, max_memory=None, checkpoint=None):
+    """Scales the to_scale columns of the baselines with the 1 bit antennas (id's in aList),
+    reading and writing the (opened) MS in chunks of chunksize rows (by default from the
+    max_memory budget in MB, see msstream.chunk_plan()).
+
+    Only the rows within starttime-endtime (AIPS format, by default the full observation) and
+    in the given subbands (first subband is 1, by default all) are scaled. If a checkpoint.Checkpoint
+    is given, only the rows not committed in it are scaled.
+    Returns the number of rows scaled.
+    """
+    with pyrap.tables.table(ms.getkeyword('ANTENNA'), readonly=True, ack=False) as ms_ant:
+        factors = factor_matrix(len(ms_ant), aList, undo)
+
+    # only the chunks around the rows to scale are read
+    where = '(ANTENNA1 IN {0} || ANTENNA2 IN {0}) && ANTENNA1 != ANTENNA2'.format(list(aList))
+    if starttime is not None:
+        starttime = timeconv.atime2mjds(starttime)
+        where += ' && TIME > {!r}'.format(starttime)
+    if endtime is not None:
+        endtime = timeconv.atime2mjds(endtime)
+        where += ' && TIME < {!r}'.format(endtime)
+    ddids = None
+    if subbands is not None:
+        ddids = msstream.subband_ddids(ms, subbands)
+        where += ' && DATA_DESC_ID IN [{}]'.format(','.join([str(i) for i in ddids]))
+
+    keycolumns = ['ANTENNA1', 'ANTENNA2', 'TIME', 'DATA_DESC_ID']
+    chunksize, align = msstream.chunk_plan(ms, keycolumns + list(to_scale), chunksize, max_memory)
+    index = rowindex.load_index(ms)
+    rows = rowindex.select_rows(ms, index, where, autocorr=False, ddids=ddids,
+                                windows=[(a, starttime if starttime is not None else -np.inf,
+                                          endtime if endtime is not None else np.inf) for a in aList])
+    with msstream.ChunkStreamer(ms, to_scale, chunks=msstream.rows_to_chunks(rows, chunksize, align=align),
+                                keycolumns=keycolumns, checkpoint=checkpoint) as stream:
+        for chunk in stream:
+            # factor per row, 1.0 for the rows out of the selection
+            row_factor = factors[chunk['ANTENNA1'], chunk['ANTENNA2']]
+            if starttime is not None:
+                row_factor[chunk['TIME'] <= starttime] = 1.0
+            if endtime is not None:
+                row_factor[chunk['TIME'] >= endtime] = 1.0
+            if ddids is not None:
+                row_factor[~np.isin(chunk['DATA_DESC_ID'], ddids)] = 1.0
+
+            runs = msstream.row_runs(row_factor != 1.0)
+            for a_col in to_scale:
+                ms_col = chunk[a_col]
+                for offset, n in runs:
+                    # in place, on views of each run of rows
+                    ms_col[offset:offset+n] *= row_factor[offset:offset+n].reshape((-1,) + (1,)*(ms_col.ndim-1))
+
+            stream.write(chunk, {a_col: chunk[a_col] for a_col in to_scale}, runs=runs)
+
+    rowindex.update_index(ms, index)
+    return stream.rows_written
+
+
+def scale1bit(msname, aList, to_scale=['DATA'], undo=False):
+    """Scales the to_scale columns of the baselines with the 1 bit antennas (id's in aList)"""
+    # depending on length of the result, use "ANTENNAx == <id>" or "ANTENNAx IN [<id>, <id>,...]" 
+    # because "==" is faster than "IN [<id>]" when only one <id> is present
+    antcond = ("== {0[0]}".format if len(aList)==1 else "IN {0}".format)(aList)
+    # and let taql do the real work ...
+    factor1, factor2 = (factor1b1b, factor1b2b) if not undo else (1/factor1b1b, 1/factor1b2b)
+
+    scale_it = "{{0}} = {{0}} * IIF(apply.ant1bit AND apply.ant2bit, {factor1b1b}, {factor1b2b})".format(factor1b1b=factor1, factor1b2b=factor2).format
+
+    t = pyrap.tables.taql("""
+        UPDATE {table}
+        SET  {todo}
+        FROM [SELECT ANTENNA1 {condition} AS ant1bit, ANTENNA2 {condition} AS ant2bit
+              FROM {table} GIVING AS memory] apply
+        WHERE ((apply.ant1bit OR apply.ant2bit) and ANTENNA1 != ANTENNA2)
+    """.format(condition=antcond, table=msname, todo=",".join(map(scale_it, to_scale))))
+
+
+if __name__ == '__main__':
+    #handle command line arguments: ms, antenna
+
+    parser = argparse.ArgumentParser(description='Scale 1 bit data to correct quantization losses')
+    parser.add_argument('ms', help="The measurement set to be corrected")
+    parser.add_argument('ant',nargs='+', help="The antenna(s) to correct (space delimited)")
+    parser.add_argument('-v', '--verbose', help="Print debug information", action="store_true")
+    parser.add_argument('-u', '--undo', help="Undo a previous run, take care to specify the same stations!", action="store_true")
+    parser.add_argument('-w', '--scale-weights', help="Also scale the weights", dest='to_scale', default=['DATA'], action='append_const', const='WEIGHT')
+    parser.add_argument('-s', '--stream', help="Scale the data in chunks (memory does not grow with the MS size)", action="store_true")
+    parser.add_argument('-t1', '--starttime', help="Only scale data after this time (YYYY/MM/DD/hh:mm:ss or YYYY/DOY/hh:mm:ss), implies --stream", default=None)
+    parser.add_argument('-t2', '--endtime', help="Only scale data before this time (YYYY/MM/DD/hh:mm:ss or YYYY/DOY/hh:mm:ss), implies --stream", default=None)
+    parser.add_argument('-sb', '--subbands', help="Only scale these subbands (comma-separated, first is 1), implies --stream", default=None)
+    parser.add_argument('--chunksize', help="Number of rows per chunk in streaming mode (default: ~4 MB of data, see --max-memory)", type=int, default=None)
+    msstream.add_memory_argument(parser)
+    msstream.add_profile_arguments(parser)
+    parser.add_argument('--resume', help=checkpoint.help_resume + " Implies --stream", action="store_true")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.ms):
+        print("Error, no such ms found!")
+        sys.exit(1)
+
+    try:
+        # query antenna table to translate 1 or more antenna names into antenna id's
+        aList = antenna_ids(args.ms, args.ant)
+    except Exception as e:
+        print(e, "AAAAAAAAAARGH we have no such dishes, abort fail die :'(")
+        sys.exit(1)
+
+    debug("Antenna list:", aList)
+    profiler = msstream.start_profiler(args, args.ms.rstrip('/'), 'scale1bit')
+
+    #to_scale = ['DATA'] + (['WEIGHT'] if args.scale_weights else [])
+    if args.stream or args.resume or (args.starttime is not None) or (args.endtime is not None) or (args.subbands is not None):
+        subbands = [int(i) for i in args.subbands.split(',')] if args.subbands is not None else None
+        with pyrap.tables.table(args.ms, readonly=False, ack=False) as ms:
+            params = {'antennas': aList, 'columns': args.to_scale, 'undo': args.undo, 'starttime': args.starttime,
+                      'endtime': args.endtime, 'subbands': subbands}
+            try:
+                # The inputs are checked before the checkpoint is created
+                for a_time in (args.starttime, args.endtime):
+                    if a_time is not None:
+                        timeconv.atime2mjds(a_time)
+                if subbands is not None:
+                    msstream.subband_ddids(ms, subbands)
+                ckpt = checkpoint.Checkpoint(args.ms, 'scale1bit', params, len(ms), resume=args.resume)
+            except ValueError as e:
+                parser.error(str(e))
+            with ckpt:
+                nrows = scale1bit_stream(ms, aList, args.to_scale, args.undo, args.starttime, args.endtime,
+                                         subbands, args.chunksize, args.max_memory, ckpt)
+        debug("\nRows scaled:", nrows)
+    else:
+        if os.path.isfile(checkpoint.checkpoint_name(args.ms)):
+            parser.error('{} exists: a previous execution was interrupted. Use --resume to continue it.'.format(
+                         checkpoint.checkpoint_name(args.ms)))
+        index = rowindex.RowIndex.load(args.ms.rstrip('/'))
+        scale1bit(args.ms, aList, args.to_scale, args.undo)
+        if index is not None:
+            with pyrap.tables.table(args.ms, readonly=False, ack=False) as ms:
+                rowindex.update_index(ms, index)
+
+    if profiler is not None:
+        profiler.stop()
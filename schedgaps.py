@@ -2,11 +2,13 @@
 #Prints the gaps between each scan for each telescope, along with a summary
 #Supports python2.7 and python3.4
 #V1.0 14/10/2016 JMB
+#V1.1 Oct 2026: scan times parsed once (all together, with timeconv.py) and the gaps of each
+#                telescope computed as array operations, instead of strptime in nested loops
 from __future__ import print_function
-#import numpy as np #np.array and nm.linspace
+import numpy as np
 import argparse #command line parsing
 import sys #for sys.exit()
-from datetime import datetime,timedelta
+import timeconv
 
 #parse inputs
 parser = argparse.ArgumentParser(description='List gaps for each telescope in a SCHED keyin file. Note, stations with continuous cal will be reported but have an asterix in front of them')
@@ -55,44 +57,48 @@ earlyTimes = earlyTimes[1::2] #every second line
 #     print (item.rjust(5), end="")
 #   print('')
 
-# lots of loops now, first for each telescope. This could be easily optimised but I'm going to be lazy I think
+def earlyValue(value):
+  """seconds on source as a float, NaN if it is not a number (e.g. ---D)"""
+  try:
+    return float(value)
+  except ValueError:
+    return np.nan
+
+# the times of all scans are parsed only once (DOY/HH:MM:SS, scans without a valid time are skipped)
+scanTimes = np.array([scan[0] + '/' + scan[1] for scan in earlyTimes])
+hasTime = np.array([':' in scan[1] for scan in earlyTimes])
+times = np.full(len(earlyTimes), np.datetime64('NaT'), dtype='M8[us]')
+times[hasTime] = timeconv.parse_times(scanTimes[hasTime])
+# seconds on source (and dropped scans) for all scans and telescopes
+early = np.array([[earlyValue(value) for value in scan[4:4+len(telescopes)]] for scan in earlyTimes])
+dropped = np.array([[value == '---D' for value in scan[4:4+len(telescopes)]] for scan in earlyTimes])
+
+scan = earlyTimes[-1]
+if ':' in scan[1]:
+  endTime = (scan[0]+'/'+scan[1])
+else:
+  endTime = (scan[1]+'/'+scan[2])
+endTime = (endTime, timeconv.parse_times(endTime))
+
+continuousCal = ('O8', 'Ys', 'Ef', 'Ro', 'Jb', 'Tr')
 for i,scope in enumerate(telescopes):
-  #loop through the early times and keep track of gaps
-  #print(earlyTimes[0][0] + '/' + (earlyTimes[0][1]))
-  lastGap = (earlyTimes[0][0] + '/' + earlyTimes[0][1])
-  foundGap = False
-  continuousCal = ('O8', 'Ys', 'Ef', 'Ro', 'Jb', 'Tr')
   contStationText = ''
   if scope in continuousCal:
     contStationText = '*'
-  for scan in earlyTimes:
-    try:
-      if float((scan[4+i])) >= args.early:
-        #print (scope, map(int,scan[1].split(':')))
-        currentTime=(scan[0]+'/'+scan[1])
-        # print(lastGap, currentTime)
-        tDiff = datetime.strptime(currentTime, '%j/%H:%M:%S') - datetime.strptime(lastGap, '%j/%H:%M:%S')
-        if tDiff.total_seconds()/60.0 > 15.0:
-          print("%s%s, %s to %s,  Interval = %.1f minutes" % (contStationText, scope, lastGap, currentTime,  (tDiff.total_seconds()/60)))
-        lastGap = currentTime
-        foundGap = True
-    except ValueError:
-      if (scan[4+i] == '---D'):
-        currentTime=(scan[0]+'/'+scan[1])
-        lastGap = currentTime
-      else:
-        pass
-
-
-  if ':' in scan[1]:
-    currentTime=(scan[0]+'/'+scan[1])
-  else:
-    currentTime=(scan[1]+'/'+scan[2])
-  # print(lastGap, currentTime)
-  tDiff = datetime.strptime(currentTime, '%j/%H:%M:%S') - datetime.strptime(lastGap, '%j/%H:%M:%S')
-  if tDiff.total_seconds()/60.0 > 15.0:
-    print("%s%s, %s to %s,  Interval = %.1f minutes" % (contStationText, scope, lastGap, currentTime,  (tDiff.total_seconds()/60)))
-  if foundGap == False:
+  # scans with enough time on source (Tsys measured), and dropped scans: both start a new interval
+  onSource = (early[:, i] >= args.early) & hasTime
+  events = np.flatnonzero(onSource | (dropped[:, i] & hasTime))
+  # interval from the previous event (or the first scan) to each scan on source
+  previous = np.concatenate(([0], events[:-1])).astype(int)
+  intervals = (times[events] - times[previous])/np.timedelta64(60, 's')
+  for j in np.flatnonzero(onSource[events] & (intervals > 15.0)):
+    print("%s%s, %s to %s,  Interval = %.1f minutes" % (contStationText, scope, scanTimes[previous[j]], scanTimes[events[j]], intervals[j]))
+
+  lastGap = events[-1] if len(events) > 0 else 0
+  interval = (endTime[1] - times[lastGap])/np.timedelta64(60, 's')
+  if interval > 15.0:
+    print("%s%s, %s to %s,  Interval = %.1f minutes" % (contStationText, scope, scanTimes[lastGap], endTime[0], interval))
+  if not np.any(onSource):
     print ("No Tsys at all for %s" % scope)
 
 print()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Reader of the scans of an experiment from its vex file ($SCHED block), optionally restricted to
+the scans listed in the .lis file (the lines starting with '+', the scans that are correlated),
+shared by the tools that need to know when each station was observing.
+
+The whole $SCHED block is split in statements at once, and all the scan start times are parsed
+together (timeconv.py). For each station, the scans are returned as arrays of start/end times
+(MJD seconds, as in the MS and antab.py) and sources, taking into account the data_good and
+data_stop offsets of the station in each scan.
+
+Typical use:
+
+    scans = schedule.read_vex('n17c3.vix', lisfile='n17c3.lis')
+    starts, ends, sources = schedule.station_scans(scans, 'Ef')
+
+Version: 1.0
+Date: Oct 2026
+"""
+
+import re
+import sys
+import argparse
+import numpy as np
+import timeconv
+
+
+usage = "%(prog)s [-h] [-l LISFILE] [-s STATION] <vex file>"
+description = """Reads the scans of a vex file and prints, per station, the number of scans, sources and
+time on source.
+"""
+help_vexfile = 'The vex file of the experiment.'
+help_lisfile = 'Only the scans in this .lis file (lines starting with +) are considered.'
+help_station = 'Only print this station (two-letter code).'
+
+# Vex comments: from '*' to the end of the line
+_COMMENT = re.compile(r'\*.*$', re.M)
+# Vex times: 2017y117d09h00m00s (seconds can have decimals)
+_VEX_TIME = re.compile(r'^\s*(\d{4})y(\d{1,3})d(\d{1,2})h(\d{1,2})m(\d{1,2}(?:\.\d*)?)s?\s*$')
+
+
+class Scan(object):
+    """A scan of the schedule.
+
+    Attributes
+    ----------
+      name : str
+            Name of the scan (e.g. No0001).
+      start : float
+            Start time of the scan (MJD seconds).
+      source : str
+            Source of the scan (the first one if the scan has several phase centres).
+      stations : dict
+            Station code -> (start, end) offsets of the valid data of the station from the start
+            of the scan (seconds), from the data_good and data_stop fields.
+    """
+    def __init__(self, name, start, source, stations):
+        self.name = name
+        self.start = start
+        self.source = source
+        self.stations = stations
+
+    def __repr__(self):
+        return 'Scan({}, {} stations)'.format(self.name, len(self.stations))
+
+
+def _vex_time(value):
+    """Converts a vex time (2017y117d09h00m00s) into 'YYYY/DOY/hh:mm:ss' (see timeconv)."""
+    match = _VEX_TIME.match(value)
+    if match is None:
+        raise ValueError('Wrong vex time: {}'.format(value))
+    year, doy, hour, minute, second = match.groups()
+    second = second.split('.')
+    second[0] = second[0].zfill(2)
+    return '{}/{:0>3}/{:0>2}:{:0>2}:{}'.format(year, doy, hour, minute, '.'.join(second))
+
+
+def _seconds(value):
+    """Value of an offset ('120 sec', '120')."""
+    value = value.replace('sec', '').strip()
+    return float(value) if value != '' else 0.0
+
+
+def parse_vex(text):
+    """Reads the scans ($SCHED block) of the vex file contents. Returns a list of Scan."""
+    text = _COMMENT.sub('', text)
+    start = text.find('$SCHED;')
+    if start == -1:
+        raise ValueError('No $SCHED block in the vex file')
+    block = text[start+len('$SCHED;'):]
+    end = block.find('$')
+    if end != -1:
+        block = block[:end]
+
+    names, starts, sources, stations = [], [], [], []
+    for statement in block.split(';'):
+        statement = statement.strip()
+        if statement.startswith('scan ') or statement.startswith('scan\t'):
+            names.append(statement[5:].strip())
+            starts.append(None)
+            sources.append(None)
+            stations.append({})
+            continue
+        if (len(names) == 0) or ('=' not in statement):
+            continue
+        keyword, value = [a_value.strip() for a_value in statement.split('=', 1)]
+        if keyword == 'start':
+            starts[-1] = _vex_time(value)
+        elif (keyword == 'source') and (sources[-1] is None):
+            sources[-1] = value
+        elif keyword == 'station':
+            fields = value.split(':')
+            if len(fields) < 3:
+                raise ValueError('Wrong station in scan {}: {}'.format(names[-1], statement))
+            stations[-1][fields[0].strip()] = (_seconds(fields[1]), _seconds(fields[2]))
+
+    for name, a_start in zip(names, starts):
+        if a_start is None:
+            raise ValueError('Scan {} has no start time'.format(name))
+    mjds = timeconv.datetime642mjds(timeconv.parse_times(starts)) if len(starts) > 0 else []
+    return [Scan(*a_scan) for a_scan in zip(names, mjds, sources, stations)]
+
+
+def read_lis(lisfile):
+    """Names of the scans in a .lis file (the lines starting with '+')."""
+    with open(lisfile, 'r') as the_lisfile:
+        return [a_line.split()[3] for a_line in the_lisfile if a_line.startswith('+')]
+
+
+def read_vex(vexfile, lisfile=None):
+    """Reads the scans of a vex file (see parse_vex()). If a .lis file is given, only the scans
+    listed there are returned."""
+    with open(vexfile, 'r') as the_vexfile:
+        scans = parse_vex(the_vexfile.read())
+    if lisfile is not None:
+        in_lis = set(read_lis(lisfile))
+        scans = [a_scan for a_scan in scans if a_scan.name in in_lis]
+    return scans
+
+
+def station_scans(scans, station):
+    """Scans of a station (case-insensitive code, e.g. 'Ef' or 'EF'), sorted by time.
+
+    Outputs
+    -------
+      starts, ends : 1-D float arrays
+            Start and end times of the valid data of the station in each scan (MJD seconds).
+      sources : 1-D str array
+            Source of each scan.
+    """
+    station = station.upper()
+    starts, ends, sources = [], [], []
+    for a_scan in scans:
+        for a_station, (good, stop) in a_scan.stations.items():
+            if (a_station.upper() == station) and (stop > good):
+                starts.append(a_scan.start + good)
+                ends.append(a_scan.start + stop)
+                sources.append(a_scan.source)
+    order = np.argsort(starts, kind='stable')
+    return np.array(starts)[order], np.array(ends)[order], np.array(sources, dtype=str)[order]
+
+
+def schedule_year(scans):
+    """Year of the first scan (the ANTAB times only have the day of the year). For the sessions
+    crossing New Year, the ANTAB times are moved to the right year with the start of the first
+    scan (see antab.read_antab())."""
+    return int(str(timeconv.mjds2datetime64(scans[0].start).astype('M8[Y]')))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=description, prog='schedule.py', usage=usage)
+    parser.add_argument('vexfile', type=str, help=help_vexfile)
+    parser.add_argument('-l', '--lis', type=str, default=None, dest='lisfile', help=help_lisfile)
+    parser.add_argument('-s', '--station', type=str, default=None, help=help_station)
+    arguments = parser.parse_args()
+
+    try:
+        scans = read_vex(arguments.vexfile, arguments.lisfile)
+    except ValueError as error:
+        sys.exit('{}: {}'.format(arguments.vexfile, error))
+    all_stations = sorted(set([a_station for a_scan in scans for a_station in a_scan.stations]))
+    if arguments.station is not None:
+        all_stations = [a_station for a_station in all_stations if a_station.upper() == arguments.station.upper()]
+    print('{}: {} scans'.format(arguments.vexfile, len(scans)))
+    for a_station in all_stations:
+        starts, ends, sources = station_scans(scans, a_station)
+        print('  {:4} {:5d} scans  {:4d} sources  {:7.2f} h on source'.format(a_station, len(starts),
+              len(set(sources)), (ends - starts).sum()/3600.))
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Vectorized time conversions shared by the MS and ANTAB tools.
+
+Times are handled as numpy datetime64 arrays (microsecond resolution). All the functions take a
+single value or a list/array of them, and parse or format all the values with array operations
+(no strptime/strftime/timedelta per value), so millions of timestamps are converted at once.
+
+Supported formats:
+- AIPS times: YYYY/MM/DD/hh:mm:ss, YYYY/DOY/hh:mm:ss and DOY/hh:mm:ss (for the latter the year is
+  an argument).
+- ANTAB times: DOY hh:mm.mm and DOY hh:mm:ss (as in the Tsys lines of the ANTAB files).
+- MS times: MJD in seconds, as in the TIME column of a Measurement Set.
+When parsing, the time of the day can always be hh:mm, hh:mm.mm, hh:mm:ss or hh:mm:ss.ss.
+
+Typical use:
+
+    times = timeconv.parse_times(['117 09:05.50', '117 09:06.00'], year=2017)
+    mjds = timeconv.datetime642mjds(times)
+    lines = timeconv.format_times(times, 'antab')
+
+Version: 1.1
+Date: Oct 2026
+
+version 1.1 changes
+- format_time_chars(): the formatted times as an array of characters, for bulk writers.
+"""
+
+import numpy as np
+
+
+# Origin of the TIME column in the MS (MJD in seconds), as used by polswap.py and invert_subband.py
+MJD_ORIGIN = np.datetime64('1858-11-17T00:00:02', 'us')
+# Year of the times given only with the day of the year (the same as datetime.strptime('%j'))
+DEFAULT_YEAR = 1900
+
+# Output formats of format_times(): (date part, separator before the time, time part)
+FORMATS = {'aips': ('YYYY/DOY', '/', 'hh:mm:ss'),
+           'aips_date': ('YYYY/MM/DD', '/', 'hh:mm:ss'),
+           'doy': ('DOY', '/', 'hh:mm:ss'),
+           'antab': ('DOY', ' ', 'hh:mm.mm'),
+           'antab_seconds': ('DOY', ' ', 'hh:mm:ss')}
+
+# Classes of the characters of the strings to parse (lookup table by ASCII code)
+_DIGIT, _DOT, _COLON, _SEPARATOR = 0, 1, 2, 3
+_CHAR_CLASSES = np.full(256, _SEPARATOR, dtype=np.uint8)
+_CHAR_CLASSES[ord('0'):ord('9')+1] = _DIGIT
+_CHAR_CLASSES[ord('.')] = _DOT
+_CHAR_CLASSES[ord(':')] = _COLON
+
+
+def _scalar_or_array(values, scalar):
+    """values[0] as a Python/numpy scalar if the input was a scalar, else values."""
+    if not scalar:
+        return values
+    return values[0].item() if values.dtype.kind == 'f' else values[0]
+
+
+def _char_matrix(strings):
+    """(nstrings, width) uint8 array with the ASCII characters of the strings (zero padded)."""
+    strings = np.ascontiguousarray(np.asarray(strings).astype('S'))
+    return strings.view(np.uint8).reshape(len(strings), strings.dtype.itemsize)
+
+
+def _layouts(chars):
+    """Groups the strings by layout (the positions of the digits, decimal points and separators).
+    Returns the character classes of each layout and the layout of each string.
+    """
+    classes = _CHAR_CLASSES[chars]
+    if np.all(classes == classes[0]):
+        return classes[:1], np.zeros(len(chars), dtype=np.int64)
+    # 2 bits per character packed in numbers (26 characters each, exact as float64), so the layouts
+    # are compared as a few numbers (as a single one for the usual strings)
+    keys = np.stack([classes[:, i:i+26].astype(np.float64) @ 4.0**np.arange(classes[:, i:i+26].shape[1])
+                     for i in range(0, classes.shape[1], 26)], axis=1)
+    keys = keys[:, 0] if keys.shape[1] == 1 else np.ascontiguousarray(keys).view('V{}'.format(keys.itemsize*keys.shape[1])).ravel()
+    keys, first, layout = np.unique(keys, return_index=True, return_inverse=True)
+    return classes[first], layout.ravel()
+
+
+def _fields(pattern):
+    """Fields (start, end, dot position or end) of the strings with the given character classes,
+    and the index of the first field of the time of the day (the first one followed by ':').
+    """
+    is_number = pattern <= _DOT
+    edges = np.diff(np.concatenate(([False], is_number, [False])).astype(np.int8))
+    fields = []
+    for start, end in zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)):
+        dots = start + np.flatnonzero(pattern[start:end] == _DOT)
+        if (len(dots) > 1) or (end - start == len(dots)):
+            return None, None
+        fields.append((start, end, dots[0] if len(dots) == 1 else end))
+
+    first_time = len(fields)
+    for i, (start, end, dot) in enumerate(fields):
+        if (end < len(pattern)) and (pattern[end] == _COLON):
+            first_time = i
+            break
+    return fields, first_time
+
+
+def _field_values(chars, start, end, dot):
+    """Numeric value of the field chars[:, start:end] (with the decimal point at dot)."""
+    digits = chars[:, start:dot].astype(np.int64) - ord('0')
+    values = (digits @ 10**np.arange(dot-start-1, -1, -1, dtype=np.int64)).astype(np.float64)
+    if end > dot + 1:
+        decimals = chars[:, dot+1:end].astype(np.float64) - ord('0')
+        values += decimals @ 10.0**-np.arange(1, end-dot)
+    return values
+
+
+def _dates(date_fields, year, nvalues):
+    """datetime64[D] from the date fields: (year, month, day), (year, doy) or (doy,)."""
+    if len(date_fields) == 3:
+        years, months, days = [a_field.astype(np.int64) for a_field in date_fields]
+        if np.any((months < 1) | (months > 12) | (days < 1) | (days > 31)):
+            raise ValueError('Month or day out of range.')
+        first_days = ((years - 1970).astype('M8[Y]').astype('M8[M]') + (months - 1).astype('m8[M]')).astype('M8[D]')
+        dates = first_days + (days - 1).astype('m8[D]')
+        if np.any(dates.astype('M8[M]') != first_days.astype('M8[M]')):
+            raise ValueError('Day out of range for the month.')
+        return dates
+    elif len(date_fields) in (1, 2):
+        years = date_fields[0].astype(np.int64) if len(date_fields) == 2 else np.full(nvalues, year)
+        doys = date_fields[-1].astype(np.int64)
+        if np.any((doys < 1) | (doys > 366)):
+            raise ValueError('Day of the year out of range.')
+        return (years - 1970).astype('M8[Y]').astype('M8[D]') + (doys - 1).astype('m8[D]')
+    raise ValueError('The date must be YYYY/MM/DD, YYYY/DOY or DOY.')
+
+
+def _seconds_of_day(time_fields):
+    """Seconds since midnight from the time fields: (hh, mm.mm) or (hh, mm, ss.ss)."""
+    if len(time_fields) not in (2, 3):
+        raise ValueError('The time must be hh:mm, hh:mm.mm or hh:mm:ss.')
+    hours, minutes = time_fields[:2]
+    seconds = time_fields[2] if len(time_fields) == 3 else np.zeros(len(hours))
+    if np.any((hours >= 24) | (minutes >= 60) | (seconds >= 61)):
+        raise ValueError('Hours, minutes or seconds out of range.')
+    return 3600.0*hours + 60.0*minutes + seconds
+
+
+def parse_times(strings, year=DEFAULT_YEAR):
+    """Parses AIPS or ANTAB time strings into datetime64[us].
+
+    Inputs
+    ------
+      strings : str or list/array of str
+            Times as YYYY/MM/DD/hh:mm:ss, YYYY/DOY/hh:mm:ss, DOY/hh:mm:ss or DOY hh:mm.mm (any of
+            them with the time of the day as hh:mm, hh:mm.mm, hh:mm:ss or hh:mm:ss.ss). Different
+            formats can be mixed.
+      year : int
+            Year of the times given only with the day of the year.
+
+    Outputs
+    -------
+      times : datetime64[us] (array if strings is a list/array)
+    """
+    scalar = np.ndim(strings) == 0
+    strings = np.atleast_1d(strings)
+    times = np.empty(len(strings), dtype='M8[us]')
+    if len(strings) == 0:
+        return times
+
+    chars = _char_matrix(strings.ravel())
+    # The values are parsed together for all strings with the same layout of digits and separators
+    patterns, layout = _layouts(chars)
+    for i, a_pattern in enumerate(patterns):
+        in_layout = np.flatnonzero(layout == i) if len(patterns) > 1 else np.arange(len(chars))
+        fields, first_time = _fields(a_pattern)
+        if fields is None:
+            raise ValueError('Time format not supported: {}'.format(strings.ravel()[in_layout[0]]))
+        values = [_field_values(chars[in_layout], *a_field) for a_field in fields]
+        try:
+            dates = _dates(values[:first_time], year, len(in_layout))
+            seconds = _seconds_of_day(values[first_time:]) if first_time < len(fields) else 0.0
+        except ValueError as error:
+            raise ValueError('{} ({})'.format(error, strings.ravel()[in_layout[0]]))
+        times[in_layout] = dates.astype('M8[us]') + np.round(seconds*1e6).astype(np.int64).astype('m8[us]')
+
+    return _scalar_or_array(times.reshape(strings.shape), scalar)
+
+
+def _digits(values, ndigits):
+    """(n, ndigits) uint8 array with the ASCII digits of non-negative integers (zero padded)."""
+    powers = 10**np.arange(ndigits-1, -1, -1, dtype=np.int64)
+    return ((values[:, np.newaxis] // powers) % 10 + ord('0')).astype(np.uint8)
+
+
+def _chars(text, n):
+    return np.tile(np.frombuffer(text.encode(), dtype=np.uint8), (n, 1))
+
+
+def format_times(times, form='aips'):
+    """Formats datetime64 times as strings (rounded to the last digit of the format).
+
+    Inputs
+    ------
+      times : datetime64 or array of datetime64
+      form : str
+            One of FORMATS: 'aips' (YYYY/DOY/hh:mm:ss), 'aips_date' (YYYY/MM/DD/hh:mm:ss),
+            'doy' (DOY/hh:mm:ss), 'antab' (DOY hh:mm.mm) or 'antab_seconds' (DOY hh:mm:ss).
+
+    Outputs
+    -------
+      strings : str (array of str if times is an array)
+    """
+    scalar = np.ndim(times) == 0
+    times = np.atleast_1d(np.asarray(times, dtype='M8[us]'))
+    chars = format_time_chars(times.ravel(), form)
+    strings = chars.view('S{}'.format(chars.shape[1])).ravel().astype('U').reshape(times.shape)
+    return _scalar_or_array(strings, scalar)
+
+
+def format_time_chars(times, form='aips'):
+    """Formats a 1-D array of datetime64 times as a (n, length) uint8 array with the ASCII
+    characters of each time (see format_times()), to be written directly in bulk."""
+    date_part, separator, time_part = FORMATS[form]
+    times = np.asarray(times, dtype='M8[us]')
+    n = len(times)
+    # Rounding to the resolution of the format (it can move the time to the next day)
+    resolution = 600000 if time_part == 'hh:mm.mm' else 1000000
+    microseconds = times.astype(np.int64)
+    times = (((microseconds + resolution//2) // resolution) * resolution).astype('M8[us]')
+
+    days = times.astype('M8[D]')
+    years = times.astype('M8[Y]')
+    columns = []
+    if date_part.startswith('YYYY'):
+        columns += [_digits(years.astype(np.int64) + 1970, 4), _chars('/', n)]
+    if date_part.endswith('DOY'):
+        columns.append(_digits((days - years.astype('M8[D]')).astype(np.int64) + 1, 3))
+    else:
+        months = times.astype('M8[M]')
+        columns += [_digits((months - years.astype('M8[M]')).astype(np.int64) + 1, 2), _chars('/', n),
+                    _digits((days - months.astype('M8[D]')).astype(np.int64) + 1, 2)]
+
+    columns.append(_chars(separator, n))
+    seconds = (times - days.astype('M8[us]')).astype(np.int64) // 1000000
+    columns += [_digits(seconds // 3600, 2), _chars(':', n)]
+    if time_part == 'hh:mm.mm':
+        hundredths = ((times - days.astype('M8[us]')).astype(np.int64) // resolution) % 6000
+        columns += [_digits(hundredths // 100, 2), _chars('.', n), _digits(hundredths % 100, 2)]
+    else:
+        columns += [_digits((seconds // 60) % 60, 2), _chars(':', n), _digits(seconds % 60, 2)]
+
+    return np.ascontiguousarray(np.hstack(columns))
+
+
+def mjds2datetime64(mjds):
+    """Converts MS times (MJD in seconds) into datetime64[us]."""
+    scalar = np.ndim(mjds) == 0
+    offsets = np.round(np.atleast_1d(mjds)*1e6).astype(np.int64).astype('m8[us]')
+    return _scalar_or_array(MJD_ORIGIN + offsets, scalar)
+
+
+def datetime642mjds(times):
+    """Converts datetime64 times into MS times (MJD in seconds, float)."""
+    scalar = np.ndim(times) == 0
+    mjds = (np.atleast_1d(np.asarray(times, dtype='M8[us]')) - MJD_ORIGIN) / np.timedelta64(1, 's')
+    return _scalar_or_array(mjds, scalar)
+
+
+def atime2mjds(atimes, year=DEFAULT_YEAR):
+    """Converts AIPS times (YYYY/MM/DD/hh:mm:ss or YYYY/DOY/hh:mm:ss, a string or an array of them)
+    to the MS TIME units (MJD in seconds).
+    """
+    return datetime642mjds(parse_times(atimes, year))
+
+
+def timedelta64(seconds):
+    """Converts a duration in seconds (float) into timedelta64[us]."""
+    return np.timedelta64(int(round(seconds*1e6)), 'us')